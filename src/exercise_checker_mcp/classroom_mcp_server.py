@@ -5,13 +5,44 @@ Provides an interactive menu-driven interface for managing GitHub Classroom oper
 """
 
 import asyncio
+import hashlib
 import json
-import subprocess
+import os
+import re
+import shlex
+import shutil
+import signal
+import sqlite3
 import sys
+import time
+import uuid
+import zlib
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Any, Dict, List, Optional
-from dataclasses import dataclass, field
-from datetime import datetime
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+from dataclasses import dataclass, field, fields, replace
+from datetime import datetime, timedelta
+
+import httpx
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; checks then run without limits
+    resource = None
 
 from mcp.server import Server
 from mcp.server.models import InitializationOptions
@@ -30,519 +61,4450 @@ from mcp.types import (
 server = Server("github-classroom-mcp")
 
 
+@dataclass
+class Job:
+    """A long-running operation executing in the background for a session"""
+
+    job_id: str
+    kind: str
+    description: str
+    status: str = "running"
+    created_at: datetime = field(default_factory=datetime.now)
+    finished_at: Optional[datetime] = None
+    completed: int = 0
+    total: int = 0
+    events: List[str] = field(default_factory=list)
+    result: Optional[str] = None
+    error: Optional[str] = None
+    task: Optional["asyncio.Task"] = field(default=None, repr=False, compare=False)
+
+    def record_progress(self, event: Dict[str, Any]) -> None:
+        """Track a clone progress event as partial results"""
+        self.completed = event["completed"]
+        self.total = event["total"]
+        self.events.append(format_progress_event(event))
+
+
 @dataclass
 class UserSession:
     """User session state for tracking progress through the workflow"""
 
     session_id: str
+    classrooms: List[Dict] = field(default_factory=list)
+    assignments: List[Dict] = field(default_factory=list)
     selected_classroom: Optional[Dict] = None
     selected_assignment: Optional[Dict] = None
     cloned_repos: List[Dict] = field(default_factory=list)
     current_step: str = "selecting_classroom"
     created_at: datetime = field(default_factory=datetime.now)
+    last_accessed: datetime = field(default_factory=datetime.now)
+    clone_profile: Optional[str] = None
+    sparse_paths: List[str] = field(default_factory=list)
+    repo_index: Dict[str, int] = field(default_factory=dict)
+    workspace: Optional[str] = None
+    check_command: Optional[str] = None
+    check_results: Dict[str, Dict] = field(default_factory=dict)
+    pages: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    jobs: Dict[str, Job] = field(default_factory=dict, metadata={"persist": False})
+
+
+def session_to_dict(session: UserSession) -> Dict[str, Any]:
+    """Serialize a session to JSON-compatible data
+
+    Fields marked with metadata {"persist": False} hold runtime-only state and
+    are skipped.
+    """
+    data = {}
+    for session_field in fields(session):
+        if not session_field.metadata.get("persist", True):
+            continue
+        value = getattr(session, session_field.name)
+        data[session_field.name] = (
+            value.isoformat() if isinstance(value, datetime) else value
+        )
+    return data
+
+
+def session_from_dict(data: Dict[str, Any]) -> UserSession:
+    """Rebuild a session serialized by session_to_dict, ignoring unknown keys"""
+    kwargs = {}
+    for session_field in fields(UserSession):
+        if session_field.name not in data:
+            continue
+        value = data[session_field.name]
+        if session_field.type is datetime and isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        kwargs[session_field.name] = value
+    return UserSession(**kwargs)
+
+
+class SQLiteSessionBackend:
+    """Persists serialized sessions in a SQLite database
+
+    The database is opened on first use, so server startup does not touch it.
+    Rows untouched for longer than prune_after seconds are deleted on open.
+    """
+
+    def __init__(self, path: Path, prune_after: Optional[float] = None):
+        self.path = path
+        self.prune_after = prune_after
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path))
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at TEXT NOT NULL)"
+            )
+            if self.prune_after is not None:
+                cutoff = datetime.now() - timedelta(seconds=self.prune_after)
+                self._conn.execute(
+                    "DELETE FROM sessions WHERE updated_at < ?", (cutoff.isoformat(),)
+                )
+            self._conn.commit()
+        return self._conn
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Return the stored session data, or None if it was never saved"""
+        row = (
+            self._connection()
+            .execute("SELECT data FROM sessions WHERE session_id = ?", (session_id,))
+            .fetchone()
+        )
+        return json.loads(row[0]) if row else None
+
+    def save(self, session_id: str, data: Dict[str, Any]) -> None:
+        """Insert or replace the stored session data"""
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?)",
+            (session_id, json.dumps(data), datetime.now().isoformat()),
+        )
+        conn.commit()
+
+    def delete(self, session_id: str) -> None:
+        """Forget a stored session"""
+        conn = self._connection()
+        conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        conn.commit()
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# Optional SQLite file that keeps sessions across server restarts
+SESSION_DB_PATH = os.environ.get("CLASSROOM_SESSION_DB")
+
+# Session store bounds: the most sessions kept at once, and how long an
+# untouched session survives
+MAX_SESSIONS = int(os.environ.get("CLASSROOM_MAX_SESSIONS", "100"))
+SESSION_IDLE_TTL = float(os.environ.get("CLASSROOM_SESSION_IDLE_TTL", "86400"))
+
+
+class SessionStore:
+    """Bounded store of user sessions with LRU eviction and an idle timeout
+
+    Sessions are kept in least-recently-used order. Every get_or_create drops
+    sessions idle for longer than idle_ttl seconds, and creating a session when
+    the store is full evicts the least recently used one. Sessions in use by a
+    tool call or a running background job are never evicted, so the store may
+    briefly hold more than max_sessions. Eviction counts are kept in metrics.
+
+    With a backend, sessions missing from memory are loaded from it on first
+    access, persist() writes a session back, and deleting a session removes it
+    from the backend too. Eviction only frees memory; the stored copy remains.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = MAX_SESSIONS,
+        idle_ttl: float = SESSION_IDLE_TTL,
+        clock: Callable[[], datetime] = datetime.now,
+        backend: Optional[SQLiteSessionBackend] = None,
+    ):
+        self.max_sessions = max_sessions
+        self.idle_ttl = timedelta(seconds=idle_ttl)
+        self._clock = clock
+        self.backend = backend
+        self._sessions: "OrderedDict[str, UserSession]" = OrderedDict()
+        self.metrics = {
+            "created": 0,
+            "loaded": 0,
+            "evicted_lru": 0,
+            "evicted_idle": 0,
+            "removed": 0,
+        }
+
+    def get_or_create(self, session_id: str) -> UserSession:
+        """Return the session, creating it (and evicting others) if needed"""
+        now = self._clock()
+        self.evict_idle(now)
+
+        session = self._sessions.get(session_id)
+        if session is None:
+            for candidate in list(self._sessions):
+                if len(self._sessions) < self.max_sessions:
+                    break
+                if not self.in_use(candidate):
+                    del self._sessions[candidate]
+                    self.metrics["evicted_lru"] += 1
+            session = self._load(session_id)
+            if session is None:
+                session = UserSession(session_id=session_id)
+                self.metrics["created"] += 1
+            else:
+                self.metrics["loaded"] += 1
+            self._sessions[session_id] = session
+        else:
+            self._sessions.move_to_end(session_id)
+
+        session.last_accessed = now
+        return session
+
+    def evict_idle(self, now: Optional[datetime] = None) -> int:
+        """Drop sessions idle for longer than the TTL and return how many were dropped"""
+        cutoff = (now or self._clock()) - self.idle_ttl
+        evicted = 0
+        # Sessions are in LRU order, so idle ones are all at the front
+        for session_id, session in list(self._sessions.items()):
+            if session.last_accessed > cutoff:
+                break
+            if not self.in_use(session_id):
+                del self._sessions[session_id]
+                evicted += 1
+        self.metrics["evicted_idle"] += evicted
+        return evicted
+
+    def in_use(self, session_id: str) -> bool:
+        """Whether a tool call holds the session or one of its jobs is running"""
+        if session_id in session_locks:
+            return True
+        session = self._sessions.get(session_id)
+        return session is not None and any(
+            job.task is not None and not job.task.done()
+            for job in session.jobs.values()
+        )
+
+    def _load(self, session_id: str) -> Optional[UserSession]:
+        if self.backend is None:
+            return None
+        data = self.backend.load(session_id)
+        if not data:
+            return None
+        session = session_from_dict(data)
+        # Background jobs do not survive a restart
+        for repo in session.cloned_repos:
+            if repo.get("status") == "pending":
+                repo["status"] = "failed"
+                repo["error"] = "clone interrupted by a server restart"
+        return session
+
+    def persist(self, session_id: str) -> None:
+        """Write an in-memory session to the backend, if there is one"""
+        session = self._sessions.get(session_id)
+        if self.backend is not None and session is not None:
+            self.backend.save(session_id, session_to_dict(session))
+
+    def get(self, session_id: str) -> Optional[UserSession]:
+        """Return the session without marking it as used"""
+        return self._sessions.get(session_id)
+
+    def remove(self, session_id: str) -> None:
+        """Forget a session in memory and in the backend, even if it is not loaded"""
+        self._sessions.pop(session_id, None)
+        if self.backend is not None:
+            self.backend.delete(session_id)
+        self.metrics["removed"] += 1
+
+    def clear(self) -> None:
+        self._sessions.clear()
+
+    def __contains__(self, session_id: object) -> bool:
+        return session_id in self._sessions
+
+    def __getitem__(self, session_id: str) -> UserSession:
+        return self._sessions[session_id]
+
+    def __delitem__(self, session_id: str) -> None:
+        if session_id not in self._sessions:
+            raise KeyError(session_id)
+        self.remove(session_id)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._sessions)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SessionLocks:
+    """One asyncio lock per session so tool calls on a session run one at a time
+
+    Calls on different sessions never wait for each other. A session's lock
+    exists only while a call holds or waits for it. How often and how long
+    calls waited is kept in metrics.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._holders: Dict[str, int] = {}
+        self.metrics = {
+            "acquired": 0,
+            "contended": 0,
+            "wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+
+    @asynccontextmanager
+    async def hold(self, session_id: str) -> AsyncIterator[float]:
+        """Hold the session's lock, yielding how long the call waited for it"""
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        self._holders[session_id] = self._holders.get(session_id, 0) + 1
+        if lock.locked():
+            self.metrics["contended"] += 1
+        started = self._clock()
+        try:
+            async with lock:
+                waited = self._clock() - started
+                self.metrics["acquired"] += 1
+                self.metrics["wait_seconds"] += waited
+                self.metrics["max_wait_seconds"] = max(
+                    self.metrics["max_wait_seconds"], waited
+                )
+                yield waited
+        finally:
+            self._holders[session_id] -= 1
+            if not self._holders[session_id]:
+                del self._holders[session_id]
+                del self._locks[session_id]
+
+    def __contains__(self, session_id: object) -> bool:
+        """Whether a call holds or waits for the session's lock"""
+        return session_id in self._locks
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._locks))
 
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+# Tools that only read job state or act on the whole host; they must stay
+# usable while a long call such as a synchronous clone holds the session
+UNLOCKED_TOOLS = {"job_status", "cancel_job", "workspace_usage"}
 
 # Global session storage
-user_sessions: Dict[str, UserSession] = {}
+user_sessions = SessionStore(
+    backend=(
+        SQLiteSessionBackend(Path(SESSION_DB_PATH), prune_after=SESSION_IDLE_TTL)
+        if SESSION_DB_PATH
+        else None
+    )
+)
+session_locks = SessionLocks()
+
+# How long classroom and assignment listings are reused before asking gh again
+LISTING_CACHE_TTL = float(os.environ.get("CLASSROOM_LISTING_CACHE_TTL", "600"))
+
+
+class TTLCache:
+    """In-memory cache whose entries expire a fixed number of seconds after being set"""
+
+    def __init__(self, ttl: float, clock=time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: Dict[Tuple[Hashable, ...], Tuple[float, Any]] = {}
+
+    def get(self, key: Tuple[Hashable, ...]) -> Optional[Any]:
+        """Return the cached value, or None if it is missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if self._clock() >= expires_at:
+            del self._entries[key]
+            return None
+        return value
+
+    def set(self, key: Tuple[Hashable, ...], value: Any) -> None:
+        """Store a value for the cache's TTL"""
+        self._entries[key] = (self._clock() + self.ttl, value)
+
+    def invalidate(self, prefix: Tuple[Hashable, ...] = ()) -> int:
+        """Drop every entry whose key starts with prefix and return how many were dropped"""
+        stale = [key for key in self._entries if key[: len(prefix)] == prefix]
+        for key in stale:
+            del self._entries[key]
+        return len(stale)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Shared by every session, so a reset_session restart still finds warm listings
+gh_cache = TTLCache(LISTING_CACHE_TTL)
+
+# While the user reads one step's output, the data the next step needs is
+# fetched in the background: assignment listings of the classrooms shown, and
+# open pull requests of freshly cloned repositories
+PREFETCH_ENABLED = os.environ.get("CLASSROOM_PREFETCH", "1") != "0"
+PREFETCH_CONCURRENCY = 4
+PREFETCH_PR_TTL = 120.0
+
+# Prefetched open pull requests by (owner/repo, state); select_student uses
+# an entry once, so a later selection of the same student asks GitHub again
+pr_prefetch_cache = TTLCache(PREFETCH_PR_TTL)
+
+# Pacing for GitHub API calls: steady requests per second and burst size, how
+# often a throttled call is retried, and how many requests of the hourly quota
+# bulk calls leave for interactive ones
+GH_REQUESTS_PER_SECOND = float(os.environ.get("CLASSROOM_GH_RATE", "10"))
+GH_BURST = 10
+GH_MAX_RETRIES = 4
+GH_BACKOFF_BASE = 1.0
+GH_BACKOFF_MAX = 60.0
+GH_INTERACTIVE_RESERVE = 100
+
+# Longest an interactive call waits for a drained quota to reset; beyond it
+# the call fails at once and says when the quota resets. Bulk calls wait.
+GH_INTERACTIVE_MAX_WAIT = 30.0
+
+# "interactive" calls answer a user waiting on a tool; "bulk" calls batch work
+# across a cohort and yield to them
+GH_PRIORITIES = ["interactive", "bulk"]
+
+# gh reports primary (hourly quota) and secondary (abuse detection) limits
+# on stderr with a message that mentions the rate limit
+GH_RATE_LIMITED_PATTERN = re.compile(
+    r"rate limit|HTTP 429|abuse detection", re.IGNORECASE
+)
+
+
+class GitHubRateLimiter:
+    """Token bucket pacing the GitHub API calls of every session
+
+    Each call takes a token; tokens refill at rate per second up to burst.
+    Bulk calls wait while interactive calls are queued and, once the known
+    quota of an API resource ("core" or "graphql") runs low, leave the last
+    reserve requests to interactive calls until the quota resets. A throttled
+    call pauses everyone with exponential backoff and halves the rate, which
+    then grows back toward the configured rate as calls succeed.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = GH_BURST,
+        reserve: int = GH_INTERACTIVE_RESERVE,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.reserve = reserve
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(self.burst)
+        self._refilled_at = clock()
+        self._paused_until = 0.0
+        self._waiting = {priority: 0 for priority in GH_PRIORITIES}
+        # resource -> [remaining, monotonic time the quota resets]
+        self._quotas: Dict[str, List[float]] = {}
+        self.metrics = {
+            "calls": 0,
+            "throttled": 0,
+            "wait_seconds": 0.0,
+        }
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._refilled_at) * self.rate
+        )
+        self._refilled_at = now
+
+    def _delay(self, priority: str, resource: str) -> float:
+        """Seconds a call must still wait, or 0 if it may go now"""
+        now = self._clock()
+        if now < self._paused_until:
+            return self._paused_until - now
+
+        quota_wait = self.quota_wait(priority, resource)
+        if quota_wait:
+            return quota_wait
+
+        self._refill()
+        if priority == "bulk" and self._waiting["interactive"]:
+            return 1 / self.rate
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    async def acquire(
+        self, priority: str = "interactive", resource: str = "core"
+    ) -> float:
+        """Wait until a call may be made and return how long that took"""
+        started = self._clock()
+        self._waiting[priority] += 1
+        try:
+            while True:
+                delay = self._delay(priority, resource)
+                if delay <= 0:
+                    break
+                await self._sleep(delay)
+        finally:
+            self._waiting[priority] -= 1
+
+        self._tokens -= 1
+        quota = self._quotas.get(resource)
+        if quota is not None:
+            quota[0] -= 1
+        waited = self._clock() - started
+        self.metrics["calls"] += 1
+        self.metrics["wait_seconds"] += waited
+        return waited
+
+    def update_quota(self, resource: str, remaining: float, reset_in: float) -> None:
+        """Record the quota GitHub reports for a resource and when it resets"""
+        self._quotas[resource] = [remaining, self._clock() + max(0.0, reset_in)]
+
+    def quota_wait(self, priority: str, resource: str) -> float:
+        """Seconds until the resource's quota resets if it is used up for priority, else 0"""
+        quota = self._quotas.get(resource)
+        now = self._clock()
+        if quota is None or now >= quota[1]:
+            return 0.0
+        floor = self.reserve if priority == "bulk" else 0
+        return quota[1] - now if quota[0] <= floor else 0.0
+
+    def quota_known(self, resource: str) -> bool:
+        """Whether the resource's quota is known for its current window"""
+        quota = self._quotas.get(resource)
+        return quota is not None and self._clock() < quota[1]
+
+    def succeeded(self) -> None:
+        """Grow the rate back toward its configured value after a call went through"""
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+    def throttled(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Back off after GitHub throttled a call and return the pause in seconds"""
+        self.metrics["throttled"] += 1
+        self.rate = max(self.max_rate / 16, self.rate / 2)
+        pause = retry_after
+        if pause is None:
+            pause = min(GH_BACKOFF_MAX, GH_BACKOFF_BASE * 2**attempt)
+        self._paused_until = max(self._paused_until, self._clock() + pause)
+        self._tokens = min(self._tokens, 0.0)
+        return pause
+
+
+gh_rate_limiter = GitHubRateLimiter(GH_REQUESTS_PER_SECOND)
+_rate_limit_lock: Optional[asyncio.Lock] = None
+
+# "cli" spawns gh for every query; "http" answers the queries the workflow
+# makes with direct API calls over a pool of keep-alive connections, using
+# the token gh is logged in with. Commands the HTTP backend does not know
+# still go to gh.
+GH_BACKEND = os.environ.get("CLASSROOM_GH_BACKEND", "cli")
+GH_API_URL = os.environ.get("CLASSROOM_GH_API_URL", "https://api.github.com")
+GH_HTTP_MAX_CONNECTIONS = 16
+GH_HTTP_TIMEOUT = 30.0
+GH_HTTP_PER_PAGE = 100
+
+# GET responses remembered with their ETag / Last-Modified validators, so a
+# repeated query is sent as a conditional request and a 304 answer (which
+# GitHub does not count against the quota) is served from memory
+GH_HTTP_CACHE_ENTRIES = 512
+
+# REST endpoints behind the gh classroom subcommands, with the flag holding
+# the id that goes into the path
+CLASSROOM_ENDPOINTS = {
+    "list": ("/classrooms", None),
+    "list-assignments": ("/classrooms/{}/assignments", "--classroom-id"),
+    "accepted-assignments": (
+        "/assignments/{}/accepted_assignments",
+        "--assignment-id",
+    ),
+}
+
+# gh classroom names some fields differently from the REST API; a requested
+# field missing from an API object is taken from its counterpart
+CLASSROOM_FIELD_FALLBACKS = {"title": "name", "name": "slug"}
+
+# Listings are returned a page at a time, and a page is cut short once its
+# text reaches the byte budget, so large cohorts do not flood the client
+DEFAULT_PAGE_SIZE = 50
+OUTPUT_BYTE_BUDGET = int(os.environ.get("CLASSROOM_OUTPUT_BUDGET", "16000"))
+LISTINGS = ["classrooms", "assignments", "students", "pull_requests", "checks"]
+
+# Workflow tools can return compact JSON records instead of prose for clients
+# that chain calls programmatically
+OUTPUT_FORMATS = ["text", "json"]
+
+# Number of pull request queries in flight at once
+DEFAULT_PR_CONCURRENCY = 8
+
+# Repositories aliased into one GraphQL request, and pull requests per repository page
+GRAPHQL_REPOS_PER_QUERY = 25
+GRAPHQL_PRS_PER_PAGE = 100
+PR_STATES = ["OPEN", "CLOSED", "MERGED"]
+
+# Clone engine defaults
+DEFAULT_CLONE_CONCURRENCY = 8
+DEFAULT_CLONE_RETRIES = 2
+DEFAULT_CLONE_TIMEOUT = 300.0
+DEFAULT_CLONE_RETRY_DELAY = 2.0
+
+# Awaited with a progress event each time a repository finishes cloning
+ProgressCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# Sync modes: "incremental" reuses repos already on disk, "full" re-clones them
+SYNC_MODES = ["incremental", "full"]
+
+# Each session/assignment clones into its own directory under the workspace
+# root, next to a manifest listing exactly the repositories it holds
+WORKSPACE_ROOT = os.environ.get("CLASSROOM_WORKSPACE")
+WORKSPACE_MANIFEST = "manifest.json"
+
+# Bare mirrors of assignment template repositories, shared by every workspace.
+# Student clones borrow the template's objects from them through git alternates.
+MIRROR_DIR = ".mirrors"
+# Student checkouts keep borrowing a mirror's objects, so the mirror must never
+# garbage collect objects a force-pushed template no longer references
+MIRROR_GIT_CONFIG = ["gc.auto=0", "gc.pruneExpire=never"]
+USE_REFERENCE_MIRRORS = os.environ.get("CLASSROOM_REFERENCE_MIRRORS", "1") != "0"
+
+# Disk quota for all workspaces together; least recently used assignment
+# workspaces are removed once it is exceeded. 0 disables the quota.
+WORKSPACE_QUOTA_MB = float(os.environ.get("CLASSROOM_WORKSPACE_QUOTA_MB", "0"))
+
+# Extra `git clone` arguments for each clone profile. Grading usually only needs
+# the latest submission tree, so the lighter profiles skip history or blobs.
+CLONE_PROFILES = {
+    "full": [],
+    "shallow": ["--depth=1"],
+    "blobless": ["--filter=blob:none"],
+    "sparse": ["--filter=blob:none", "--sparse"],
+}
+
+
+@dataclass
+class CloneOptions:
+    """Tuning knobs for cloning an assignment's student repositories"""
+
+    concurrency: int = DEFAULT_CLONE_CONCURRENCY
+    retries: int = DEFAULT_CLONE_RETRIES
+    timeout: float = DEFAULT_CLONE_TIMEOUT
+    retry_delay: float = DEFAULT_CLONE_RETRY_DELAY
+    sync_mode: str = "incremental"
+    profile: str = "full"
+    sparse_paths: List[str] = field(default_factory=list)
+    # Local repository whose objects new clones borrow instead of downloading
+    reference: Optional[str] = None
+
+
+def validate_clone_options(options: CloneOptions) -> Optional[str]:
+    """Return an error message if the clone options cannot be used"""
+    if options.profile not in CLONE_PROFILES:
+        return f"Unknown clone profile '{options.profile}'. Choose one of: {', '.join(CLONE_PROFILES)}"
+    if options.profile == "sparse" and not options.sparse_paths:
+        return "The sparse clone profile needs at least one path in 'sparse_paths'."
+    if options.sync_mode not in SYNC_MODES:
+        return f"Unknown sync mode '{options.sync_mode}'. Choose one of: {', '.join(SYNC_MODES)}"
+    if options.concurrency < 1:
+        return "concurrency must be at least 1"
+    if options.retries < 0:
+        return "retries must be 0 or more"
+    if options.timeout <= 0:
+        return "timeout must be greater than 0"
+    if options.retry_delay <= 0:
+        return "retry_delay must be greater than 0"
+    return None
+
+
+def clone_profile_key(options: CloneOptions) -> str:
+    """Describe the clone profile so checkouts made with another profile are detected"""
+    if options.profile == "sparse":
+        return f"sparse:{','.join(sorted(options.sparse_paths))}"
+    return options.profile
+
 
+# Exercise checks run one test process per repository, at most one per core
+DEFAULT_CHECK_COMMAND = os.environ.get("CLASSROOM_CHECK_COMMAND", "python -m pytest -q")
+DEFAULT_CHECK_CONCURRENCY = os.cpu_count() or 1
+DEFAULT_CHECK_TIMEOUT = 300.0
+CHECK_MEMORY_LIMIT_MB = float(os.environ.get("CLASSROOM_CHECK_MEMORY_MB", "2048"))
+CHECK_OUTPUT_TAIL = 2000
+# Check results per assignment, keyed by submission commit and test suite, so
+# unchanged submissions are not tested again
+CHECK_CACHE_DIR = ".check_cache"
 
-def run_gh_command(args: List[str], capture_output: bool = True) -> Dict[str, Any]:
-    """Run a GitHub CLI command and return the result"""
+
+@dataclass
+class CheckOptions:
+    """Limits for running an assignment's test command in student repositories"""
+
+    concurrency: int = DEFAULT_CHECK_CONCURRENCY
+    timeout: float = DEFAULT_CHECK_TIMEOUT
+    memory_mb: float = CHECK_MEMORY_LIMIT_MB
+
+
+def validate_check_options(options: CheckOptions) -> Optional[str]:
+    """Return an error message if the check options cannot be used"""
+    if options.concurrency < 1:
+        return "concurrency must be at least 1"
+    if options.timeout <= 0:
+        return "timeout must be greater than 0"
+    if options.memory_mb < 0:
+        return "memory_mb must be 0 or more"
+    return None
+
+
+# Similarity: source files are reduced to normalized tokens, hashed in k-grams
+# and winnowed to one fingerprint per window (as in MOSS)
+SIMILARITY_KGRAM = 5
+SIMILARITY_WINDOW = 4
+SIMILARITY_MAX_FILE_BYTES = 256 * 1024
+DEFAULT_SIMILARITY_TOP_K = 10
+# Fingerprints found in more repositories than this are not paired up (like
+# MOSS's -m), which bounds the pairs each fingerprint adds
+SIMILARITY_MAX_POSTINGS = 10
+SIMILARITY_EXTENSIONS = set("""
+    .c .cc .cpp .cs .go .h .hpp .java .js .jsx .kt .php .py .rb .rs .scala
+    .sh .sql .swift .ts .tsx
+    """.split())
+SIMILARITY_SKIP_DIRS = {
+    "node_modules",
+    "__pycache__",
+    "venv",
+    "build",
+    "dist",
+    "target",
+}
+SOURCE_KEYWORDS = set("""
+    and as async await break case catch class const continue def default do
+    elif else except export extends finally for from func function if import
+    in is lambda let new not or package pass private public raise return
+    static struct switch this throw try var void while with yield
+    """.split())
+
+
+# Friendlier messages for executables the workflow depends on
+COMMAND_NOT_FOUND_MESSAGES = {
+    "gh": "GitHub CLI (gh) not found. Please install it first.",
+    "git": "git not found. Please install it first.",
+}
+
+
+def _kill_process(process: asyncio.subprocess.Process) -> None:
+    """Kill a subprocess and every process it started, ignoring ones that exited
+
+    Commands run in their own session, so their process group holds any
+    children they left behind; those would otherwise keep the output pipes
+    open and the wait for the command going.
+    """
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def _kill_group_after_exit(process: asyncio.subprocess.Process) -> None:
+    """Kill what a command left running once the command itself has exited"""
+    while process.returncode is None:
+        await asyncio.sleep(0.05)
+    _kill_process(process)
+
+
+async def run_command_async(
+    cmd: List[str],
+    capture_output: bool = True,
+    timeout: Optional[float] = None,
+    cwd: Optional[str] = None,
+    preexec_fn: Optional[Callable[[], None]] = None,
+    kill_leftovers: bool = False,
+) -> Dict[str, Any]:
+    """Run a command without blocking the event loop and return the result
+
+    The result dict holds success, stdout, stderr and returncode. On timeout
+    the process and everything it started are killed and a failed result is
+    returned; if the awaiting task is cancelled they are killed before the
+    cancellation propagates.
+    preexec_fn runs in the child before the command starts, for example to set
+    resource limits. kill_leftovers also kills the processes a command leaves
+    behind when it exits normally, for untrusted commands such as tests.
+    """
+    stream = asyncio.subprocess.PIPE if capture_output else None
     try:
-        cmd = ["gh"] + args
-        result = subprocess.run(
-            cmd, capture_output=capture_output, text=True, check=True
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=stream,
+            stderr=stream,
+            cwd=cwd,
+            preexec_fn=preexec_fn,
+            start_new_session=True,
         )
-        return {
-            "success": True,
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "returncode": result.returncode,
-        }
-    except subprocess.CalledProcessError as e:
+    except FileNotFoundError:
+        # Raised both for a missing executable and a missing working directory
+        if cwd is not None and not os.path.isdir(cwd):
+            return {
+                "success": False,
+                "stdout": "",
+                "stderr": f"Working directory not found: {cwd}",
+                "returncode": 1,
+            }
         return {
             "success": False,
-            "stdout": e.stdout,
-            "stderr": e.stderr,
-            "returncode": e.returncode,
+            "stdout": "",
+            "stderr": COMMAND_NOT_FOUND_MESSAGES.get(
+                cmd[0], f"{cmd[0]} not found. Please install it first."
+            ),
+            "returncode": 1,
         }
-    except FileNotFoundError:
+
+    reaper = (
+        asyncio.ensure_future(_kill_group_after_exit(process))
+        if kill_leftovers
+        else None
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        _kill_process(process)
+        await process.wait()
         return {
             "success": False,
             "stdout": "",
-            "stderr": "GitHub CLI (gh) not found. Please install it first.",
-            "returncode": 1,
+            "stderr": f"Command timed out after {timeout} seconds: {' '.join(cmd)}",
+            "returncode": process.returncode,
         }
+    except asyncio.CancelledError:
+        _kill_process(process)
+        await process.wait()
+        raise
+    finally:
+        if reaper is not None:
+            reaper.cancel()
 
+    return {
+        "success": process.returncode == 0,
+        "stdout": stdout.decode(errors="replace") if stdout is not None else "",
+        "stderr": stderr.decode(errors="replace") if stderr is not None else "",
+        "returncode": process.returncode,
+    }
 
-def get_or_create_session(session_id: str = "default") -> UserSession:
-    """Get existing session or create a new one"""
-    if session_id not in user_sessions:
-        user_sessions[session_id] = UserSession(session_id=session_id)
-    return user_sessions[session_id]
 
+def gh_api_resource(args: List[str]) -> str:
+    """The GitHub rate limit resource a gh command draws from"""
+    return "graphql" if args[:2] == ["api", "graphql"] else "core"
 
-@server.list_tools()
-async def handle_list_tools() -> ListToolsResult:
-    """List available tools"""
-    tools = [
-        Tool(
-            name="start_classroom_workflow",
-            description="Start the interactive classroom workflow - lists classrooms and guides through the process",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "session_id": {
-                        "type": "string",
-                        "description": "Session ID (optional, defaults to 'default')",
-                    }
-                },
-                "required": [],
-            },
-        ),
-        Tool(
-            name="select_classroom",
-            description="Select a classroom by number from the list",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "classroom_number": {
-                        "type": "integer",
-                        "description": "The number of the classroom to select",
-                    },
-                    "session_id": {
-                        "type": "string",
-                        "description": "Session ID (optional, defaults to 'default')",
-                    },
-                },
-                "required": ["classroom_number"],
-            },
-        ),
-        Tool(
-            name="select_assignment",
-            description="Select an assignment by number from the list",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "assignment_number": {
-                        "type": "integer",
-                        "description": "The number of the assignment to select",
-                    },
-                    "session_id": {
-                        "type": "string",
-                        "description": "Session ID (optional, defaults to 'default')",
-                    },
-                },
-                "required": ["assignment_number"],
-            },
-        ),
-        Tool(
-            name="select_student",
-            description="Select a student by number to view their pull requests",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "student_number": {
-                        "type": "integer",
-                        "description": "The number of the student to select",
-                    },
-                    "session_id": {
-                        "type": "string",
-                        "description": "Session ID (optional, defaults to 'default')",
-                    },
-                },
-                "required": ["student_number"],
-            },
-        ),
-        Tool(
-            name="reset_session",
-            description="Reset the current session and start over",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "session_id": {
-                        "type": "string",
-                        "description": "Session ID to reset (optional, defaults to 'default')",
-                    }
-                },
-                "required": [],
-            },
-        ),
-    ]
-    return ListToolsResult(tools=tools)
 
+def is_rate_limited(result: Dict[str, Any]) -> bool:
+    """Whether a failed gh call was rejected by a GitHub rate limit
 
-@server.call_tool()
-async def handle_call_tool(name: str, arguments: Dict[str, Any]) -> CallToolResult:
-    """Handle tool calls"""
+    Only stderr and the type of GraphQL errors are looked at; stdout may hold
+    partial data such as pull request titles that mention rate limits.
+    """
+    if result["success"]:
+        return False
+    if GH_RATE_LIMITED_PATTERN.search(result["stderr"] or ""):
+        return True
+    try:
+        payload = json.loads(result["stdout"] or "{}")
+    except json.JSONDecodeError:
+        return False
+    errors = payload.get("errors") if isinstance(payload, dict) else None
+    return any(
+        isinstance(error, dict) and error.get("type") == "RATE_LIMITED"
+        for error in errors or []
+    )
 
-    if name == "start_classroom_workflow":
-        session_id = arguments.get("session_id", "default")
-        return await handle_start_workflow(session_id)
 
-    elif name == "select_classroom":
-        classroom_number = arguments["classroom_number"]
-        session_id = arguments.get("session_id", "default")
-        return await handle_select_classroom(classroom_number, session_id)
+def _command_result(
+    success: bool, stdout: str = "", stderr: str = ""
+) -> Dict[str, Any]:
+    """A result dict shaped like run_command_async's"""
+    return {
+        "success": success,
+        "stdout": stdout,
+        "stderr": stderr,
+        "returncode": 0 if success else 1,
+    }
 
-    elif name == "select_assignment":
-        assignment_number = arguments["assignment_number"]
-        session_id = arguments.get("session_id", "default")
-        return await handle_select_assignment(assignment_number, session_id)
 
-    elif name == "select_student":
-        student_number = arguments["student_number"]
-        session_id = arguments.get("session_id", "default")
-        return await handle_select_student(student_number, session_id)
+def _parse_flags(args: List[str]) -> Optional[Dict[str, str]]:
+    """Split ["--flag", "value", ...] into a dict, or None if it is not in that form"""
+    if len(args) % 2 or not all(flag.startswith("--") for flag in args[::2]):
+        return None
+    return dict(zip(args[::2], args[1::2]))
+
+
+def select_fields(item: Dict[str, Any], json_fields: Optional[str]) -> Dict[str, Any]:
+    """Keep the comma separated fields gh --json would print for an API object"""
+    if not json_fields:
+        return item
+    selected = {}
+    for name in json_fields.split(","):
+        if name in item:
+            selected[name] = item[name]
+        else:
+            selected[name] = item.get(CLASSROOM_FIELD_FALLBACKS.get(name, name))
+    return selected
+
+
+class GitHubHTTPClient:
+    """Answers gh queries with direct GitHub API calls over pooled connections
+
+    Covers the gh commands the workflow runs: the classroom listings and
+    `gh api` GET and GraphQL queries. Results have the same shape as
+    run_command_async's, with stdout holding the JSON gh would print; run()
+    returns None for any other command so the caller can spawn gh instead.
+    The quota headers of every response are passed on to gh_rate_limiter.
+
+    GraphQL queries go to base_url/graphql, except that on GitHub Enterprise
+    Server, whose REST root is https://host/api/v3, they go to
+    https://host/api/graphql.
+
+    GET responses carrying an ETag or Last-Modified header are kept, least
+    recently used first out, and later requests for the same URL are made
+    conditional; metrics counts how many were answered 304 Not Modified.
+    """
+
+    def __init__(
+        self, base_url: str, token: str, cache_entries: int = GH_HTTP_CACHE_ENTRIES
+    ):
+        base_url = base_url.rstrip("/")
+        self._graphql_url = (
+            base_url[: -len("/v3")] if base_url.endswith("/v3") else base_url
+        ) + "/graphql"
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={
+                "Authorization": f"Bearer {token}",
+                "Accept": "application/vnd.github+json",
+                "X-GitHub-Api-Version": "2022-11-28",
+            },
+            limits=httpx.Limits(
+                max_connections=GH_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=GH_HTTP_MAX_CONNECTIONS,
+            ),
+            timeout=GH_HTTP_TIMEOUT,
+        )
+        self.cache_entries = cache_entries
+        # url -> (validator request headers, body, Link header)
+        self._responses: "OrderedDict[str, Tuple[Dict[str, str], bytes, str]]" = (
+            OrderedDict()
+        )
+        self.metrics = {"requests": 0, "not_modified": 0}
+
+    async def run(
+        self, args: List[str], timeout: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Answer a gh command, or return None if it is not supported"""
+        try:
+            if args[:1] == ["classroom"] and len(args) >= 2:
+                return await self._classroom(args[1], args[2:], timeout)
+            if args[:3] == ["api", "graphql", "-f"] and len(args) == 4:
+                if not args[3].startswith("query="):
+                    return None
+                return await self._graphql(args[3][len("query=") :], timeout)
+            if args[:1] == ["api"] and len(args) == 2:
+                response = await self._send("GET", args[1], timeout)
+                if response.is_error:
+                    return self._error_result(response)
+                return _command_result(True, response.text)
+        except httpx.HTTPError as e:
+            return _command_result(False, stderr=f"gh: {e or type(e).__name__}")
+        except json.JSONDecodeError:
+            return _command_result(False, stderr="gh: invalid JSON in API response")
+        return None
+
+    async def _classroom(
+        self, subcommand: str, args: List[str], timeout: Optional[float]
+    ) -> Optional[Dict[str, Any]]:
+        if subcommand not in CLASSROOM_ENDPOINTS:
+            return None
+        path, id_flag = CLASSROOM_ENDPOINTS[subcommand]
+        flags = _parse_flags(args)
+        if flags is None or set(flags) - {id_flag, "--json"}:
+            return None
+        if id_flag is not None:
+            if id_flag not in flags:
+                return None
+            path = path.format(flags[id_flag])
+
+        items: List[Dict[str, Any]] = []
+        url: Optional[str] = path
+        params: Optional[Dict[str, Any]] = {"per_page": GH_HTTP_PER_PAGE}
+        while url:
+            response = await self._send("GET", url, timeout, params=params)
+            if response.is_error:
+                return self._error_result(response)
+            items.extend(response.json())
+            # The next link already carries the query parameters
+            url = response.links.get("next", {}).get("url")
+            params = None
+        fields_arg = flags.get("--json")
+        return _command_result(
+            True, json.dumps([select_fields(item, fields_arg) for item in items])
+        )
+
+    async def _graphql(self, query: str, timeout: Optional[float]) -> Dict[str, Any]:
+        response = await self._send(
+            "POST", self._graphql_url, timeout, json={"query": query}
+        )
+        if response.is_error:
+            return self._error_result(response)
+        # Like gh, report failure when any part of the query failed but keep
+        # the partial data on stdout
+        errors = response.json().get("errors") or []
+        stderr = "\n".join(f"gh: {error.get('message')}" for error in errors)
+        return _command_result(not errors, response.text, stderr)
+
+    async def _send(
+        self, method: str, url: str, timeout: Optional[float], **kwargs: Any
+    ) -> httpx.Response:
+        if not url.startswith(("/", "http://", "https://")):
+            url = f"/{url}"
+        request = self._client.build_request(
+            method, url, timeout=timeout or GH_HTTP_TIMEOUT, **kwargs
+        )
+        key = str(request.url)
+        cached = self._responses.get(key) if method == "GET" else None
+        if cached is not None:
+            request.headers.update(cached[0])
+
+        response = await self._client.send(request)
+        self.metrics["requests"] += 1
+        self._record_quota(response)
+
+        if cached is not None and response.status_code == 304:
+            self.metrics["not_modified"] += 1
+            self._responses.move_to_end(key)
+            _, content, link = cached
+            return httpx.Response(
+                200,
+                headers={"Link": link} if link else None,
+                content=content,
+                request=request,
+            )
+        if method == "GET" and response.status_code == 200:
+            self._remember(key, response)
+        return response
+
+    def _remember(self, key: str, response: httpx.Response) -> None:
+        """Keep a response that can be revalidated later"""
+        validators = {}
+        if "etag" in response.headers:
+            validators["If-None-Match"] = response.headers["etag"]
+        if "last-modified" in response.headers:
+            validators["If-Modified-Since"] = response.headers["last-modified"]
+        if not validators:
+            self._responses.pop(key, None)
+            return
+        self._responses[key] = (
+            validators,
+            response.content,
+            response.headers.get("link", ""),
+        )
+        self._responses.move_to_end(key)
+        while len(self._responses) > self.cache_entries:
+            self._responses.popitem(last=False)
+
+    def _record_quota(self, response: httpx.Response) -> None:
+        headers = response.headers
+        if "x-ratelimit-remaining" not in headers:
+            return
+        try:
+            remaining = int(headers["x-ratelimit-remaining"])
+            reset_in = float(headers["x-ratelimit-reset"]) - time.time()
+        except (KeyError, ValueError):
+            return
+        resource = headers.get("x-ratelimit-resource", "core")
+        gh_rate_limiter.update_quota(resource, remaining, reset_in)
+
+    @staticmethod
+    def _error_result(response: httpx.Response) -> Dict[str, Any]:
+        """Describe an error response the way gh does"""
+        try:
+            message = response.json().get("message")
+        except (json.JSONDecodeError, AttributeError):
+            message = None
+        message = message or response.reason_phrase
+        return _command_result(
+            False, response.text, f"gh: {message} (HTTP {response.status_code})"
+        )
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+_gh_http_client: Optional[GitHubHTTPClient] = None
+
+
+async def github_token() -> Optional[str]:
+    """The token gh authenticates with, from the environment or `gh auth token`"""
+    token = os.environ.get("GH_TOKEN") or os.environ.get("GITHUB_TOKEN")
+    if token:
+        return token
+    result = await run_command_async(["gh", "auth", "token"])
+    if not result["success"]:
+        return None
+    return result["stdout"].strip() or None
+
+
+async def get_gh_http_client() -> Optional[GitHubHTTPClient]:
+    """The shared HTTP client when the http backend is enabled, created on first use"""
+    global _gh_http_client
+    if GH_BACKEND != "http":
+        return None
+    if _gh_http_client is None:
+        token = await github_token()
+        if not token:
+            # gh then runs the query itself and reports the missing login
+            return None
+        if _gh_http_client is None:
+            _gh_http_client = GitHubHTTPClient(GH_API_URL, token)
+    return _gh_http_client
+
+
+async def close_gh_http_client() -> None:
+    """Close the shared HTTP client's connections"""
+    global _gh_http_client
+    if _gh_http_client is not None:
+        await _gh_http_client.aclose()
+        _gh_http_client = None
+
+
+async def _call_gh(
+    args: List[str],
+    capture_output: bool = True,
+    timeout: Optional[float] = None,
+    cwd: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Run one gh command through the configured backend"""
+    client = await get_gh_http_client()
+    if client is not None:
+        result = await client.run(args, timeout)
+        if result is not None:
+            return result
+    return await run_command_async(
+        ["gh"] + args, capture_output=capture_output, timeout=timeout, cwd=cwd
+    )
+
+
+async def refresh_rate_limit() -> None:
+    """Ask GitHub for the current quota of each API resource
+
+    The rate_limit endpoint does not count against the quota, so it is called
+    outside the limiter.
+    """
+    result = await _call_gh(["api", "rate_limit"])
+    if not result["success"]:
+        return
+    try:
+        resources = json.loads(result["stdout"])["resources"]
+    except (json.JSONDecodeError, KeyError, TypeError):
+        return
+    now = time.time()
+    for resource in ("core", "graphql"):
+        quota = resources.get(resource)
+        if quota:
+            gh_rate_limiter.update_quota(
+                resource, quota["remaining"], quota["reset"] - now
+            )
+
+
+async def _ensure_quota_known(resource: str) -> None:
+    """Look up the quota once per reset window before bulk calls spend it"""
+    global _rate_limit_lock
+    if _rate_limit_lock is None:
+        _rate_limit_lock = asyncio.Lock()
+    async with _rate_limit_lock:
+        if not gh_rate_limiter.quota_known(resource):
+            await refresh_rate_limit()
+        if not gh_rate_limiter.quota_known(resource):
+            # Lookup failed; pace by the token bucket alone for a minute
+            # rather than retrying the lookup before every bulk call
+            gh_rate_limiter.update_quota(resource, float("inf"), 60)
+
+
+async def run_gh_command_async(
+    args: List[str],
+    capture_output: bool = True,
+    timeout: Optional[float] = None,
+    cwd: Optional[str] = None,
+    priority: str = "interactive",
+) -> Dict[str, Any]:
+    """Run a GitHub CLI command without blocking the event loop
+
+    Calls are paced by gh_rate_limiter at the given priority. A call GitHub
+    throttles is retried after an exponential backoff, up to GH_MAX_RETRIES
+    times, and its last result is returned if it never gets through. An
+    interactive call fails at once when the quota is used up for longer than
+    GH_INTERACTIVE_MAX_WAIT.
+    """
+    resource = gh_api_resource(args)
+    if priority == "bulk" and not gh_rate_limiter.quota_known(resource):
+        await _ensure_quota_known(resource)
+
+    for attempt in range(GH_MAX_RETRIES + 1):
+        reset_in = gh_rate_limiter.quota_wait(priority, resource)
+        if priority == "interactive" and reset_in > GH_INTERACTIVE_MAX_WAIT:
+            reset_at = datetime.now() + timedelta(seconds=reset_in)
+            return _command_result(
+                False,
+                stderr=f"GitHub API rate limit exhausted; it resets at {reset_at:%H:%M:%S}",
+            )
+        await gh_rate_limiter.acquire(priority, resource)
+        result = await _call_gh(args, capture_output, timeout, cwd)
+        if not is_rate_limited(result):
+            gh_rate_limiter.succeeded()
+            return result
+        if attempt < GH_MAX_RETRIES:
+            # A drained primary quota shows up here and pauses until the reset
+            await refresh_rate_limit()
+            gh_rate_limiter.throttled(attempt)
+    return result
+
+
+# Cached queries currently running with their priority, so a caller joins a
+# query already started instead of repeating it
+_pending_queries: Dict[Tuple[Hashable, ...], Tuple["asyncio.Future", str]] = {}
 
-    elif name == "reset_session":
-        session_id = arguments.get("session_id", "default")
-        return await handle_reset_session(session_id)
 
+async def run_gh_command_cached(
+    args: List[str], refresh: bool = False, priority: str = "interactive"
+) -> Dict[str, Any]:
+    """Run a read-only GitHub CLI query, reusing a recent successful result
+
+    Results are keyed by the command arguments. refresh=True discards the
+    cached entry and asks gh again. A query already in flight for the same
+    arguments is awaited rather than run twice, unless it runs at bulk
+    priority and this caller is interactive: a bulk query may wait behind
+    other calls or the quota reserve, so the query is issued again at
+    interactive priority.
+    """
+    key = tuple(args)
+    if refresh:
+        gh_cache.invalidate(key)
     else:
-        raise ValueError(f"Unknown tool: {name}")
+        cached = gh_cache.get(key)
+        if cached is not None:
+            return cached
+
+    pending, pending_priority = _pending_queries.get(key, (None, None))
+    if refresh or (pending_priority == "bulk" and priority == "interactive"):
+        pending = None
+    if pending is None:
+        pending = asyncio.ensure_future(run_gh_command_async(args, priority=priority))
+        _pending_queries[key] = (pending, priority)
+
+        def forget(task: "asyncio.Future") -> None:
+            if _pending_queries.get(key, (None,))[0] is task:
+                del _pending_queries[key]
+
+        pending.add_done_callback(forget)
+
+    # Shielded so a cancelled caller does not cancel the query for the others
+    result = await asyncio.shield(pending)
+    if result["success"]:
+        gh_cache.set(key, result)
+    return result
+
+
+_prefetch_tasks: Set["asyncio.Task"] = set()
+
+
+def start_prefetch(operation: Callable[[], Awaitable[None]]) -> None:
+    """Run a best-effort prefetch in the background when prefetching is enabled"""
+    if not PREFETCH_ENABLED:
+        return
+
+    async def run() -> None:
+        try:
+            await operation()
+        except Exception:
+            # The next step then simply fetches its data itself
+            pass
+
+    task = asyncio.ensure_future(run())
+    _prefetch_tasks.add(task)
+    task.add_done_callback(_prefetch_tasks.discard)
+
+
+def assignment_listing_args(classroom_id: Any) -> List[str]:
+    """gh arguments listing a classroom's assignments"""
+    return [
+        "classroom",
+        "list-assignments",
+        "--classroom-id",
+        str(classroom_id),
+        "--json",
+        "id,title,name,deadline",
+    ]
+
+
+async def prefetch_assignments(classrooms: List[Dict]) -> None:
+    """Warm the cached assignment listings of classrooms the user may pick next"""
+    semaphore = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+
+    async def prefetch(classroom: Dict) -> None:
+        async with semaphore:
+            await run_gh_command_cached(
+                assignment_listing_args(classroom["id"]), priority="bulk"
+            )
+
+    await asyncio.gather(*(prefetch(classroom) for classroom in classrooms))
+
+
+def parse_github_repo_full_name(remote_url: str) -> Optional[str]:
+    """Extract owner/repo from an SSH or HTTPS GitHub remote URL"""
+    if "github.com" not in remote_url:
+        return None
+    if remote_url.startswith("git@"):
+        full_name = remote_url.split(":", 1)[1]
+    else:
+        full_name = remote_url.split("github.com/", 1)[1]
+    full_name = full_name.strip().rstrip("/")
+    if full_name.endswith(".git"):
+        full_name = full_name[: -len(".git")]
+    return full_name or None
+
+
+def build_pull_request_query(
+    requests: List[Tuple[str, Optional[str]]], states: List[str]
+) -> str:
+    """Build one GraphQL query covering several repositories via aliases
+
+    requests holds (owner/repo, cursor) pairs; the cursor continues a repository
+    whose pull requests did not fit in a previous page. Repository i is aliased
+    as r{i}.
+    """
+    fields = []
+    for i, (full_name, cursor) in enumerate(requests):
+        owner, name = full_name.split("/", 1)
+        arguments = f"first: {GRAPHQL_PRS_PER_PAGE}, states: [{', '.join(states)}]"
+        arguments += ", orderBy: {field: CREATED_AT, direction: DESC}"
+        if cursor:
+            arguments += f", after: {json.dumps(cursor)}"
+        fields.append(
+            f"r{i}: repository(owner: {json.dumps(owner)}, name: {json.dumps(name)}) "
+            f"{{ pullRequests({arguments}) {{ pageInfo {{ hasNextPage endCursor }} "
+            "nodes { number title state createdAt author { login } } } }"
+        )
+    return "query {\n  " + "\n  ".join(fields) + "\n}"
+
+
+def _graphql_alias_errors(payload: Dict[str, Any]) -> Dict[str, str]:
+    """Map query aliases to the error GitHub reported for them"""
+    errors = {}
+    for error in payload.get("errors") or []:
+        path = error.get("path") or []
+        if path:
+            errors.setdefault(str(path[0]), error.get("message", "GraphQL error"))
+    return errors
+
+
+async def _fetch_pull_request_page(
+    requests: List[Tuple[str, Optional[str]]],
+    states: List[str],
+    priority: str = "interactive",
+) -> Dict[str, Dict[str, Any]]:
+    """Run one aliased GraphQL query and return a page of results per repository"""
+    query = build_pull_request_query(requests, states)
+    result = await run_gh_command_async(
+        ["api", "graphql", "-f", f"query={query}"], priority=priority
+    )
+
+    # gh exits non-zero when any alias fails, but still prints the partial data
+    try:
+        payload = json.loads(result["stdout"]) if result["stdout"] else {}
+    except json.JSONDecodeError:
+        payload = {}
+    data = payload.get("data") or {}
+    if not data and not result["success"]:
+        error = result["stderr"].strip() or "gh api graphql failed"
+        return {full_name: {"error": error} for full_name, _ in requests}
+
+    alias_errors = _graphql_alias_errors(payload)
+    pages = {}
+    for i, (full_name, _) in enumerate(requests):
+        repository = data.get(f"r{i}")
+        if not repository:
+            pages[full_name] = {
+                "error": alias_errors.get(f"r{i}", "repository not found")
+            }
+            continue
+        connection = repository["pullRequests"]
+        pages[full_name] = {
+            "prs": [
+                {
+                    "number": node["number"],
+                    "title": node["title"],
+                    "author": node.get("author") or {"login": "ghost"},
+                    "state": node["state"],
+                    "createdAt": node["createdAt"],
+                }
+                for node in connection["nodes"]
+            ],
+            "next_cursor": (
+                connection["pageInfo"]["endCursor"]
+                if connection["pageInfo"]["hasNextPage"]
+                else None
+            ),
+        }
+    return pages
+
+
+async def fetch_pull_requests(
+    full_names: List[str],
+    states: Optional[List[str]] = None,
+    concurrency: int = DEFAULT_PR_CONCURRENCY,
+    priority: str = "interactive",
+) -> Dict[str, Dict[str, Any]]:
+    """Fetch pull requests for many repositories with batched GraphQL queries
+
+    Returns {owner/repo: {"prs": [...]}} with the same number, title, author,
+    state and createdAt fields as `gh pr list --json`, or {"error": message}
+    for repositories that could not be queried. Repositories are split into
+    requests of GRAPHQL_REPOS_PER_QUERY, and repositories with more pull
+    requests than fit in one page are followed up in later rounds. priority
+    is the gh_rate_limiter priority of the queries.
+    """
+    states = states or PR_STATES
+    results: Dict[str, Dict[str, Any]] = {
+        full_name: {"prs": []} for full_name in full_names
+    }
+    pending: List[Tuple[str, Optional[str]]] = [
+        (full_name, None) for full_name in results
+    ]
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def fetch_with_limit(batch: List[Tuple[str, Optional[str]]]):
+        async with semaphore:
+            return await _fetch_pull_request_page(batch, states, priority)
+
+    while pending:
+        batches = [
+            pending[start : start + GRAPHQL_REPOS_PER_QUERY]
+            for start in range(0, len(pending), GRAPHQL_REPOS_PER_QUERY)
+        ]
+        pending = []
+        for pages in await asyncio.gather(*(fetch_with_limit(b) for b in batches)):
+            for full_name, page in pages.items():
+                if "error" in page:
+                    results[full_name] = {"error": page["error"]}
+                    continue
+                results[full_name]["prs"].extend(page["prs"])
+                if page["next_cursor"]:
+                    pending.append((full_name, page["next_cursor"]))
+    return results
+
+
+async def prefetch_pull_requests(full_names: List[str]) -> None:
+    """Warm the open pull requests select_student shows for each repository"""
+    results = await fetch_pull_requests(
+        full_names,
+        states=["OPEN"],
+        concurrency=PREFETCH_CONCURRENCY,
+        priority="bulk",
+    )
+    for full_name, result in results.items():
+        if "error" not in result:
+            pr_prefetch_cache.set((full_name, "OPEN"), result)
+
+
+def _git_dir(repo_path: Path) -> Optional[Path]:
+    """Locate a repository's git directory, following `gitdir:` indirection files"""
+    git_path = repo_path / ".git"
+    if git_path.is_dir():
+        return git_path
+    try:
+        pointer = git_path.read_text().strip()
+    except OSError:
+        return None
+    if not pointer.startswith("gitdir:"):
+        return None
+    git_dir = Path(pointer[len("gitdir:") :].strip())
+    return git_dir if git_dir.is_absolute() else repo_path / git_dir
+
+
+def read_origin_url(repo_path: Path) -> Optional[str]:
+    """Read the origin remote URL straight from .git/config, without spawning git"""
+    git_dir = _git_dir(repo_path)
+    if git_dir is None:
+        return None
+    try:
+        lines = (git_dir / "config").read_text().splitlines()
+    except OSError:
+        return None
+
+    in_origin = False
+    for line in lines:
+        line = line.strip()
+        if line.startswith("["):
+            in_origin = line.replace(" ", "").lower() == '[remote"origin"]'
+        elif in_origin and "=" in line:
+            key, value = line.split("=", 1)
+            if key.strip().lower() == "url":
+                return value.strip()
+    return None
+
+
+def resolve_repo_full_name(repo: Dict[str, Any]) -> Optional[str]:
+    """Return owner/repo for a cloned repository, reading .git/config if not recorded"""
+    if repo.get("full_name"):
+        return repo["full_name"]
+    remote_url = read_origin_url(Path(repo["path"]))
+    return parse_github_repo_full_name(remote_url) if remote_url else None
+
+
+def index_cloned_repos(session: UserSession) -> None:
+    """Record each cloned repository's full name and build the name lookup"""
+    for repo in session.cloned_repos:
+        repo["full_name"] = resolve_repo_full_name(repo)
+    session.repo_index = {
+        repo["name"]: i for i, repo in enumerate(session.cloned_repos)
+    }
+
+
+def parse_student_repos(accepted_assignments: List[Dict]) -> List[Dict[str, str]]:
+    """Extract name, full name and clone URL for each accepted assignment"""
+    repos = []
+    for accepted in accepted_assignments:
+        repository = accepted.get("repository") or {}
+        full_name = repository.get("full_name")
+        if not full_name:
+            continue
+        html_url = repository.get("html_url") or f"https://github.com/{full_name}"
+        repos.append(
+            {
+                "name": full_name.split("/")[-1],
+                "full_name": full_name,
+                "clone_url": f"{html_url}.git",
+            }
+        )
+    return sorted(repos, key=lambda repo: repo["name"])
+
+
+async def _run_git_with_retries(
+    cmd: List[str],
+    entry: Dict[str, Any],
+    options: CloneOptions,
+    cwd: Optional[Path] = None,
+    cleanup: Optional[Path] = None,
+) -> bool:
+    """Run a git command, retrying failures and recording attempts on entry"""
+    for attempt in range(1, options.retries + 2):
+        entry["attempts"] += 1
+        result = await run_command_async(
+            cmd, timeout=options.timeout, cwd=str(cwd) if cwd else None
+        )
+        if result["success"]:
+            entry["error"] = None
+            return True
+
+        entry["error"] = result["stderr"].strip() or f"{' '.join(cmd[:2])} failed"
+        if cleanup is not None:
+            # Drop partial checkouts so the next attempt starts clean
+            shutil.rmtree(cleanup, ignore_errors=True)
+        if attempt <= options.retries:
+            await asyncio.sleep(options.retry_delay * attempt)
+    return False
+
+
+def directory_size(path: Path) -> int:
+    """Total size in bytes of the files below path"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+async def _directory_size_async(path: Path) -> int:
+    """Measure a directory on a worker thread so the event loop keeps running"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, directory_size, path)
+
+
+async def _local_head_sha(repo_path: Path) -> Optional[str]:
+    """Return the commit checked out in a local repository"""
+    result = await run_command_async(["git", "rev-parse", "HEAD"], cwd=str(repo_path))
+    return result["stdout"].strip() if result["success"] else None
+
+
+async def _remote_head_sha(clone_url: str, timeout: float) -> Optional[str]:
+    """Return the commit the remote HEAD points at, without fetching"""
+    result = await run_command_async(
+        ["git", "ls-remote", clone_url, "HEAD"], timeout=timeout
+    )
+    if not result["success"] or not result["stdout"].strip():
+        return None
+    return result["stdout"].split()[0]
+
+
+async def _sync_existing_repo(
+    repo: Dict[str, str],
+    target: Path,
+    entry: Dict[str, Any],
+    options: CloneOptions,
+    last_synced_sha: Optional[str],
+) -> Dict[str, Any]:
+    """Bring an existing checkout up to date, skipping it if the remote is unchanged"""
+    remote_sha = await _remote_head_sha(repo["clone_url"], options.timeout)
+    if remote_sha is not None:
+        local_sha = last_synced_sha or await _local_head_sha(target)
+        if remote_sha == local_sha:
+            entry["status"] = "unchanged"
+            entry["sha"] = remote_sha
+            return entry
+
+    fetch_cmd = ["git", "fetch", "--quiet"]
+    if options.profile == "shallow":
+        fetch_cmd.append("--depth=1")
+    fetched = await _run_git_with_retries(
+        fetch_cmd + ["origin", "HEAD"], entry, options, cwd=target
+    )
+    if fetched:
+        fetched = await _run_git_with_retries(
+            ["git", "reset", "--hard", "--quiet", "FETCH_HEAD"],
+            entry,
+            options,
+            cwd=target,
+        )
+    if not fetched:
+        entry["status"] = "failed"
+        return entry
+
+    entry["status"] = "updated"
+    entry["sha"] = await _local_head_sha(target)
+    entry["size_bytes"] = await _directory_size_async(target)
+    return entry
+
+
+async def fetch_template_repo(assignment_id: Any) -> Optional[Dict[str, str]]:
+    """Look up the starter code repository an assignment's repositories come from"""
+    result = await run_gh_command_cached(["api", f"assignments/{assignment_id}"])
+    if not result["success"]:
+        return None
+    try:
+        assignment = json.loads(result["stdout"])
+    except json.JSONDecodeError:
+        return None
+    repository = (
+        assignment.get("starter_code_repository")
+        if isinstance(assignment, dict)
+        else None
+    )
+    if not repository or not repository.get("full_name"):
+        return None
+    full_name = repository["full_name"]
+    html_url = repository.get("html_url") or f"https://github.com/{full_name}"
+    return {"full_name": full_name, "clone_url": f"{html_url}.git"}
+
+
+_mirror_locks: Dict[str, asyncio.Lock] = {}
+
+
+async def ensure_reference_mirror(
+    template: Dict[str, str], options: CloneOptions
+) -> Optional[Path]:
+    """Create or refresh the shared bare mirror of a template repository
+
+    Returns None when the mirror cannot be made, in which case students are
+    cloned without a reference.
+    """
+    mirror = (
+        workspace_root().absolute()
+        / MIRROR_DIR
+        / f"{_safe_path_component(template['full_name'])}.git"
+    )
+    lock = _mirror_locks.setdefault(str(mirror), asyncio.Lock())
+    entry = {"attempts": 0, "error": None}
+    async with lock:
+        if (mirror / "HEAD").exists():
+            # Settings are also passed here for mirrors made before they were
+            # stored in the mirror's config
+            no_gc = [arg for setting in MIRROR_GIT_CONFIG for arg in ("-c", setting)]
+            fetched = await _run_git_with_retries(
+                ["git", *no_gc, "fetch", "--quiet", "--prune", "origin"],
+                entry,
+                options,
+                cwd=mirror,
+            )
+            # A stale mirror still saves most of the download
+            return mirror if fetched or (mirror / "objects").exists() else None
+
+        staging = mirror.with_name(mirror.name + ".tmp")
+        shutil.rmtree(staging, ignore_errors=True)
+        cloned = await _run_git_with_retries(
+            [
+                "git",
+                "clone",
+                "--quiet",
+                "--mirror",
+                *(
+                    arg
+                    for setting in MIRROR_GIT_CONFIG
+                    for arg in ("--config", setting)
+                ),
+                template["clone_url"],
+                str(staging),
+            ],
+            entry,
+            options,
+            cleanup=staging,
+        )
+        if not cloned:
+            return None
+        try:
+            staging.replace(mirror)
+        except OSError:
+            return None
+        return mirror
+
+
+async def clone_student_repo(
+    repo: Dict[str, str],
+    dest_root: Path,
+    options: CloneOptions,
+    last_synced_sha: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Clone or sync one student repository and describe the outcome"""
+    target = dest_root / repo["name"]
+    entry = {
+        "name": repo["name"],
+        "path": str(target.absolute()),
+        "full_name": repo["full_name"],
+        "status": "cloned",
+        "attempts": 0,
+        "error": None,
+        "sha": None,
+        "size_bytes": None,
+    }
+
+    if (target / ".git").exists():
+        if options.sync_mode == "incremental":
+            return await _sync_existing_repo(
+                repo, target, entry, options, last_synced_sha
+            )
+        shutil.rmtree(target)
+    elif target.exists():
+        entry["status"] = "failed"
+        entry["error"] = f"{target} already exists and is not a git repository"
+        return entry
+
+    reference_args = (
+        ["--reference-if-able", options.reference] if options.reference else []
+    )
+    cloned = await _run_git_with_retries(
+        ["git", "clone", "--quiet"]
+        + CLONE_PROFILES[options.profile]
+        + reference_args
+        + [repo["clone_url"], str(target)],
+        entry,
+        options,
+        cleanup=target,
+    )
+    if cloned and options.profile == "sparse":
+        cloned = await _run_git_with_retries(
+            ["git", "sparse-checkout", "set"] + options.sparse_paths,
+            entry,
+            options,
+            cwd=target,
+        )
+    if not cloned:
+        entry["status"] = "failed"
+        return entry
+
+    entry["sha"] = await _local_head_sha(target)
+    entry["size_bytes"] = await _directory_size_async(target)
+    return entry
+
+
+async def clone_student_repos(
+    repos: List[Dict[str, str]],
+    dest_root: Path,
+    options: CloneOptions,
+    synced_shas: Optional[Dict[str, str]] = None,
+    on_progress: Optional[ProgressCallback] = None,
+) -> List[Dict[str, Any]]:
+    """Clone or sync student repositories concurrently with a bounded worker pool
+
+    synced_shas maps repository names to the commit recorded by the last sync,
+    letting unchanged repositories be skipped. on_progress is awaited with a
+    progress event as each repository finishes. Results are returned in the
+    same order as repos, one entry per repository, whether it succeeded or
+    failed.
+    """
+    synced_shas = synced_shas or {}
+    semaphore = asyncio.Semaphore(max(1, options.concurrency))
+    started = time.monotonic()
+    completed = 0
+    total_bytes = 0
+
+    async def clone_with_limit(repo: Dict[str, str]) -> Dict[str, Any]:
+        nonlocal completed, total_bytes
+        async with semaphore:
+            entry = await clone_student_repo(
+                repo, dest_root, options, synced_shas.get(repo["name"])
+            )
+        completed += 1
+        total_bytes += entry["size_bytes"] or 0
+        if on_progress is not None:
+            await on_progress(
+                {
+                    "completed": completed,
+                    "total": len(repos),
+                    "repo": entry,
+                    "bytes": entry["size_bytes"] or 0,
+                    "total_bytes": total_bytes,
+                    "elapsed": time.monotonic() - started,
+                }
+            )
+        return entry
+
+    return list(await asyncio.gather(*(clone_with_limit(repo) for repo in repos)))
+
+
+def format_size(size_bytes: int) -> str:
+    """Human readable byte count"""
+    size = float(size_bytes)
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def format_progress_event(event: Dict[str, Any]) -> str:
+    """One-line description of a finished repository"""
+    repo = event["repo"]
+    line = f"[{event['completed']}/{event['total']}] {repo['name']} {repo['status']}"
+    if repo["status"] in ("failed", "error"):
+        line += f": {repo['error']}"
+    elif event["bytes"]:
+        line += f" ({format_size(event['bytes'])})"
+    return line + f" - {event['elapsed']:.1f}s elapsed"
+
+
+class ProgressReporter:
+    """Streams clone progress to the MCP client while recording every event
+
+    Inside a tool call, each event is sent as a progress notification (when
+    the client supplied a progress token) and as an info log message. Outside
+    a request, for example in tests, events are only recorded.
+    """
+
+    def __init__(
+        self, use_progress_token: bool = True, logger: str = "classroom.clone"
+    ):
+        try:
+            context = server.request_context
+        except LookupError:
+            context = None
+        self.events: List[Dict[str, Any]] = []
+        self._logger = logger
+        self._session = context.session if context else None
+        self._progress_token = (
+            context.meta.progressToken
+            if use_progress_token and context and context.meta
+            else None
+        )
+
+    async def __call__(self, event: Dict[str, Any]) -> None:
+        self.events.append(event)
+        if self._session is None:
+            return
+        try:
+            if self._progress_token is not None:
+                await self._session.send_progress_notification(
+                    self._progress_token, event["completed"], event["total"]
+                )
+            await self._session.send_log_message(
+                level="info",
+                data=format_progress_event(event),
+                logger=self._logger,
+            )
+        except Exception:
+            # Notifications are best effort; a closed stream must not fail the clone
+            pass
+
+
+def _resource_limiter(
+    cpu_seconds: float, memory_mb: float
+) -> Optional[Callable[[], None]]:
+    """Build a preexec_fn capping a test process's CPU time and memory"""
+    if resource is None:
+        return None
+
+    def apply_limits() -> None:
+        limits = [(resource.RLIMIT_CPU, int(cpu_seconds) + 1)]
+        if memory_mb:
+            limits.append((resource.RLIMIT_AS, int(memory_mb * 1024 * 1024)))
+        for limit, value in limits:
+            try:
+                resource.setrlimit(limit, (value, value))
+            except (ValueError, OSError):
+                # The hard limit is already lower; keep it
+                pass
+
+    return apply_limits
+
+
+TEST_COUNT_PATTERN = re.compile(
+    r"(\d+) (passed|failed|errors?|skipped|xfailed|xpassed|deselected)\b"
+)
+UNITTEST_RAN_PATTERN = re.compile(r"^Ran (\d+) tests?", re.MULTILINE)
+UNITTEST_FAILED_PATTERN = re.compile(r"^FAILED \((.*)\)", re.MULTILINE)
+
+
+def parse_test_counts(output: str) -> Optional[Dict[str, int]]:
+    """Read pass/fail counts from pytest or unittest output
+
+    Returns None when the output has no recognizable test summary.
+    """
+    counts = {"passed": 0, "failed": 0, "errors": 0, "skipped": 0}
+    for line in reversed(output.splitlines()):
+        matches = TEST_COUNT_PATTERN.findall(line)
+        if matches and any(
+            kind in ("passed", "failed") or kind.startswith("error")
+            for _, kind in matches
+        ):
+            for number, kind in matches:
+                if kind.startswith("error"):
+                    counts["errors"] += int(number)
+                elif kind in counts:
+                    counts[kind] += int(number)
+            return counts
+
+    ran = UNITTEST_RAN_PATTERN.search(output)
+    if ran is None:
+        return None
+    failed = UNITTEST_FAILED_PATTERN.search(output)
+    if failed:
+        for part in failed.group(1).split(","):
+            kind, _, number = part.strip().partition("=")
+            key = {"failures": "failed", "errors": "errors", "skipped": "skipped"}.get(
+                kind
+            )
+            if key and number.isdigit():
+                counts[key] = int(number)
+    counts["passed"] = (
+        int(ran.group(1)) - counts["failed"] - counts["errors"] - counts["skipped"]
+    )
+    return counts
+
+
+async def run_exercise_check(
+    repo: Dict[str, Any], command: List[str], options: CheckOptions
+) -> Dict[str, Any]:
+    """Run the test command in one cloned repository and describe the outcome"""
+    entry = {
+        "name": repo["name"],
+        "sha": repo.get("sha"),
+        "status": "skipped",
+        "passed": 0,
+        "failed": 0,
+        "errors": 0,
+        "skipped": 0,
+        "duration": 0.0,
+        "returncode": None,
+        "error": None,
+        "output": "",
+    }
+    if repo["status"] in ("failed", "pending"):
+        entry["error"] = "repository was not cloned"
+        return entry
+    if not Path(repo["path"]).is_dir():
+        # Removed by workspace garbage collection or a session reset
+        entry["error"] = "repository directory not found"
+        return entry
+
+    started = time.monotonic()
+    result = await run_command_async(
+        command,
+        timeout=options.timeout,
+        cwd=repo["path"],
+        preexec_fn=_resource_limiter(options.timeout, options.memory_mb),
+        # Resource limits apply per process, so nothing a test forks may
+        # outlive the run
+        kill_leftovers=True,
+    )
+    entry["duration"] = round(time.monotonic() - started, 3)
+    entry["returncode"] = result["returncode"]
+    output = result["stdout"] + result["stderr"]
+    entry["output"] = output[-CHECK_OUTPUT_TAIL:]
+    entry["output_digest"] = hashlib.sha256(output.encode()).hexdigest()
+
+    counts = parse_test_counts(result["stdout"])
+    if counts:
+        entry.update(counts)
+    if result["success"]:
+        entry["status"] = "passed"
+    elif counts and (counts["failed"] or counts["errors"]):
+        entry["status"] = "failed"
+        entry["error"] = f"{counts['failed']} failed, {counts['errors']} errors"
+    else:
+        entry["status"] = "error"
+        lines = output.strip().splitlines()
+        entry["error"] = (
+            lines[-1] if lines else f"exited with status {result['returncode']}"
+        )
+    return entry
+
+
+def check_suite_hash(command: List[str]) -> str:
+    """Fingerprint a test command and any test files it names outside the repository
+
+    Absolute paths among the arguments (for example a directory of grader
+    tests) are hashed by content, so editing them invalidates cached results.
+    """
+    digest = hashlib.sha256()
+    for i, arg in enumerate(command):
+        digest.update(arg.encode() + b"\0")
+        path = Path(arg)
+        # The program itself is skipped; only its arguments can be test files
+        if i == 0 or not path.is_absolute() or not path.exists():
+            continue
+        files = [path] if path.is_file() else sorted(path.rglob("*"))
+        for file in files:
+            if file.is_file():
+                digest.update(str(file).encode() + b"\0")
+                digest.update(file.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def check_cache_path(assignment_id: Any) -> Path:
+    """Location of the cached check results of one assignment"""
+    return (
+        workspace_root().absolute()
+        / CHECK_CACHE_DIR
+        / f"{_safe_path_component(assignment_id)}.json"
+    )
+
+
+def load_check_cache(path: Path) -> Dict[str, Any]:
+    """Load cached check results, treating a missing or corrupt file as empty"""
+    try:
+        cache = json.loads(path.read_text())
+    except (OSError, json.JSONDecodeError):
+        return {"results": {}}
+    cache.setdefault("results", {})
+    return cache
+
+
+def save_check_cache(path: Path, results: Dict[str, Dict[str, Any]]) -> None:
+    """Merge new check results into the cache file
+
+    The file is re-read first so results written meanwhile by another session
+    checking the same assignment are kept.
+    """
+    cache = load_check_cache(path)
+    cache["results"].update(results)
+    write_json_atomic(path, cache)
+
+
+async def run_exercise_checks(
+    repos: List[Dict[str, Any]],
+    command: List[str],
+    options: CheckOptions,
+    on_progress: Optional[ProgressCallback] = None,
+    cache: Optional[Dict[str, Dict[str, Any]]] = None,
+    profile_key: str = "full",
+) -> List[Dict[str, Any]]:
+    """Run the test command in every repository, one test process per core at most
+
+    Each run is its own OS process, so the checks use every core while the
+    event loop only waits on them. Results keep the order of repos.
+
+    cache maps "<commit>:<suite hash>:<clone profile>:<timeout>:<memory>"
+    keys to earlier results, where profile_key is the clone_profile_key of
+    the checkouts: a sparse checkout or tighter limits can fail tests a full
+    one passes. Repositories whose key is present are not run again, and new
+    passed or failed results are added to it; errors such as timeouts may be
+    transient and are not kept.
+    """
+    semaphore = asyncio.Semaphore(max(1, options.concurrency))
+    scope = (
+        f"{check_suite_hash(command)}:{profile_key}:"
+        f"{options.timeout:g}:{options.memory_mb:g}"
+    )
+    started = time.monotonic()
+    completed = 0
+
+    async def check_with_limit(repo: Dict[str, Any]) -> Dict[str, Any]:
+        nonlocal completed
+        key = f"{repo.get('sha')}:{scope}" if repo.get("sha") else None
+        if (
+            cache is not None
+            and key in cache
+            and repo["status"] not in ("failed", "pending")
+        ):
+            entry = dict(cache[key], name=repo["name"], cached=True)
+        else:
+            async with semaphore:
+                entry = await run_exercise_check(repo, command, options)
+            if cache is not None and key and entry["status"] in ("passed", "failed"):
+                cache[key] = entry
+        completed += 1
+        if on_progress is not None:
+            await on_progress(
+                {
+                    "completed": completed,
+                    "total": len(repos),
+                    "repo": entry,
+                    "bytes": 0,
+                    "total_bytes": 0,
+                    "elapsed": time.monotonic() - started,
+                }
+            )
+        return entry
+
+    return list(await asyncio.gather(*(check_with_limit(repo) for repo in repos)))
+
+
+SOURCE_COMMENT_PATTERN = re.compile(r"/\*.*?\*/|//[^\n]*|#[^\n]*", re.DOTALL)
+SOURCE_TOKEN_PATTERN = re.compile(
+    r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|[A-Za-z_]\w*|\d+(?:\.\d+)?|\S'
+)
+
+
+def tokenize_source(text: str) -> List[str]:
+    """Split source code into tokens that ignore comments, layout and naming
+
+    Identifiers become "I", literals "S" and "N", so renaming variables or
+    reformatting code does not change the token stream.
+    """
+    tokens = []
+    for token in SOURCE_TOKEN_PATTERN.findall(SOURCE_COMMENT_PATTERN.sub(" ", text)):
+        if token[0] in "\"'":
+            tokens.append("S")
+        elif token[0].isdigit():
+            tokens.append("N")
+        elif token[0].isalpha() or token[0] == "_":
+            tokens.append(token if token in SOURCE_KEYWORDS else "I")
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def winnow(
+    tokens: List[str], k: int = SIMILARITY_KGRAM, window: int = SIMILARITY_WINDOW
+) -> Set[int]:
+    """Select the fingerprints of a token stream by winnowing k-gram hashes
+
+    From every window of consecutive k-gram hashes the minimum is kept, which
+    guarantees that any shared run of window + k - 1 tokens yields a shared
+    fingerprint while keeping only a fraction of the hashes.
+    """
+    hashes = [
+        zlib.crc32(" ".join(tokens[i : i + k]).encode())
+        for i in range(len(tokens) - k + 1)
+    ]
+    if len(hashes) <= window:
+        return {min(hashes)} if hashes else set()
+    return {min(hashes[i : i + window]) for i in range(len(hashes) - window + 1)}
+
+
+def fingerprint_repo(repo_path: Path) -> Set[int]:
+    """Winnowed fingerprints of every source file in a checkout"""
+    fingerprints: Set[int] = set()
+    for root, dirs, files in os.walk(repo_path):
+        dirs[:] = [
+            name
+            for name in dirs
+            if not name.startswith(".") and name not in SIMILARITY_SKIP_DIRS
+        ]
+        for name in files:
+            path = Path(root, name)
+            if path.suffix.lower() not in SIMILARITY_EXTENSIONS:
+                continue
+            try:
+                if path.stat().st_size > SIMILARITY_MAX_FILE_BYTES:
+                    continue
+                text = path.read_text(errors="replace")
+            except OSError:
+                continue
+            fingerprints |= winnow(tokenize_source(text))
+    return fingerprints
+
+
+def find_similar_pairs(
+    fingerprints: Dict[str, Set[int]], top_k: int = DEFAULT_SIMILARITY_TOP_K
+) -> List[Dict[str, Any]]:
+    """Rank repository pairs by shared fingerprints using an inverted index
+
+    Only pairs that share a fingerprint are ever counted, and fingerprints
+    found in more than SIMILARITY_MAX_POSTINGS repositories are skipped, so
+    each fingerprint adds a bounded number of pairs and the work grows
+    linearly with the cohort. Fingerprints found in more than half of the
+    repositories (and at least three) come from the template or boilerplate
+    and are also left out of each repository's total.
+    """
+    index: Dict[int, List[str]] = {}
+    for name, repo_fingerprints in fingerprints.items():
+        for fingerprint in repo_fingerprints:
+            index.setdefault(fingerprint, []).append(name)
+
+    template_repos = max(2, (len(fingerprints) + 1) // 2)
+    max_postings = min(SIMILARITY_MAX_POSTINGS, template_repos)
+    common = set()
+    shared: Counter = Counter()
+    for fingerprint, names in index.items():
+        if len(names) > template_repos:
+            common.add(fingerprint)
+        if len(names) > max_postings:
+            continue
+        for i, first in enumerate(names):
+            for second in names[i + 1 :]:
+                shared[tuple(sorted((first, second)))] += 1
+
+    distinct = {
+        name: len(repo_fingerprints - common) or 1
+        for name, repo_fingerprints in fingerprints.items()
+    }
+    pairs = [
+        {
+            "first": first,
+            "second": second,
+            "shared": count,
+            "first_percent": 100.0 * count / distinct[first],
+            "second_percent": 100.0 * count / distinct[second],
+        }
+        for (first, second), count in shared.items()
+    ]
+    pairs.sort(
+        key=lambda pair: (
+            -max(pair["first_percent"], pair["second_percent"]),
+            -pair["shared"],
+        )
+    )
+    return pairs[:top_k]
+
+
+def workspace_root() -> Path:
+    """Directory holding the clone workspaces of every session"""
+    if WORKSPACE_ROOT:
+        return Path(WORKSPACE_ROOT)
+    return Path.cwd() / "classroom_workspace"
+
+
+def _safe_path_component(value: Any) -> str:
+    """Turn an identifier into a single directory name"""
+    return re.sub(r"[^A-Za-z0-9._-]", "_", str(value)).strip(".") or "_"
+
+
+def session_dir_name(session_id: str) -> str:
+    """Directory name of a session's workspaces
+
+    Session ids that had to be rewritten get a short hash of the original
+    appended, so "grader 1" and "grader_1" never share their checkouts.
+    """
+    safe = _safe_path_component(session_id)
+    if safe == session_id:
+        return safe
+    return f"{safe}-{hashlib.sha256(session_id.encode()).hexdigest()[:8]}"
+
+
+def assignment_workspace(session_id: str, assignment_id: Any) -> Path:
+    """Directory that one session's clones of an assignment are placed in"""
+    return (
+        workspace_root()
+        / session_dir_name(session_id)
+        / _safe_path_component(assignment_id)
+    ).absolute()
+
+
+def sync_manifest_path(workspace: Path) -> Path:
+    """Location of the manifest recording the repositories in a workspace"""
+    return workspace / WORKSPACE_MANIFEST
+
+
+def load_sync_manifest(path: Path) -> Dict[str, Any]:
+    """Load a sync manifest, treating a missing or corrupt file as empty"""
+    try:
+        manifest = json.loads(path.read_text())
+    except (OSError, json.JSONDecodeError):
+        return {"repos": {}}
+    manifest.setdefault("repos", {})
+    return manifest
+
+
+def write_json_atomic(path: Path, data: Dict[str, Any]) -> None:
+    """Write a JSON file so readers never see it half written"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(data, indent=2))
+    tmp_path.replace(path)
+
+
+def save_sync_manifest(path: Path, manifest: Dict[str, Any]) -> None:
+    """Write a sync manifest atomically"""
+    write_json_atomic(path, manifest)
+
+
+def update_sync_manifest(
+    manifest: Dict[str, Any], entries: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Record the commit of every successfully synced repository"""
+    synced_at = datetime.now().isoformat()
+    for entry in entries:
+        if entry["status"] == "failed" or not entry.get("sha"):
+            continue
+        previous = manifest["repos"].get(entry["name"], {})
+        manifest["repos"][entry["name"]] = {
+            "full_name": entry.get("full_name"),
+            "sha": entry["sha"],
+            "size_bytes": (
+                entry["size_bytes"]
+                if entry.get("size_bytes") is not None
+                else previous.get("size_bytes")
+            ),
+            "synced_at": (
+                previous.get("synced_at", synced_at)
+                if entry["status"] == "unchanged"
+                else synced_at
+            ),
+            "checked_at": synced_at,
+        }
+    return manifest
+
+
+def repos_from_manifest(
+    workspace: Path, manifest: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """Rebuild cloned repository entries from a workspace manifest
+
+    Only the manifest is read, so this never walks the workspace directory.
+    """
+    return [
+        {
+            "name": name,
+            "path": str(workspace / name),
+            "full_name": repo.get("full_name"),
+            "status": "unchanged",
+            "attempts": 0,
+            "error": None,
+            "sha": repo.get("sha"),
+            "size_bytes": None,
+        }
+        for name, repo in sorted(manifest["repos"].items())
+    ]
+
+
+def touch_workspace(workspace: Path) -> None:
+    """Record that a workspace was just used, for least-recently-used eviction"""
+    manifest_path = sync_manifest_path(workspace)
+    if not manifest_path.exists():
+        return
+    manifest = load_sync_manifest(manifest_path)
+    manifest["last_used"] = datetime.now().isoformat()
+    save_sync_manifest(manifest_path, manifest)
+
+
+def list_workspaces(root: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """Describe every assignment workspace, least recently used first
+
+    Sizes and last-use times come from the workspace manifests, so the
+    checkouts themselves are never walked.
+    """
+    root = (root or workspace_root()).absolute()
+    workspaces = []
+    for manifest_path in root.glob(f"*/*/{WORKSPACE_MANIFEST}"):
+        manifest = load_sync_manifest(manifest_path)
+        workspaces.append(
+            {
+                "kind": "workspace",
+                "path": manifest_path.parent,
+                "session": manifest_path.parent.parent.name,
+                "assignment": manifest_path.parent.name,
+                "repos": len(manifest["repos"]),
+                "size_bytes": sum(
+                    repo.get("size_bytes") or 0 for repo in manifest["repos"].values()
+                ),
+                "last_used": manifest.get("last_used", ""),
+            }
+        )
+    return sorted(workspaces, key=lambda workspace: workspace["last_used"])
+
+
+def remove_workspace(workspace: Path) -> None:
+    """Delete a workspace, and its session directory once that is empty"""
+    shutil.rmtree(workspace, ignore_errors=True)
+    try:
+        workspace.parent.rmdir()
+    except OSError:
+        pass
+
+
+def _modified_at(path: Path) -> str:
+    try:
+        return datetime.fromtimestamp(path.stat().st_mtime).isoformat()
+    except OSError:
+        return ""
+
+
+def list_shared_caches(root: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """Describe the template mirrors and check result caches, least recently used first"""
+    root = (root or workspace_root()).absolute()
+    caches = [
+        {
+            "kind": "mirror",
+            "path": mirror,
+            "size_bytes": directory_size(mirror),
+            # Every fetch rewrites FETCH_HEAD
+            "last_used": _modified_at(
+                mirror / "FETCH_HEAD" if (mirror / "FETCH_HEAD").exists() else mirror
+            ),
+        }
+        for mirror in (root / MIRROR_DIR).glob("*.git")
+    ]
+    caches += [
+        {
+            "kind": "check_cache",
+            "path": cache_file,
+            "size_bytes": cache_file.stat().st_size,
+            "last_used": _modified_at(cache_file),
+        }
+        for cache_file in (root / CHECK_CACHE_DIR).glob("*.json")
+    ]
+    return sorted(caches, key=lambda cache: cache["last_used"])
+
+
+def referenced_mirrors(root: Optional[Path] = None) -> Set[str]:
+    """Mirrors whose objects checkouts in the workspaces borrow through git alternates"""
+    root = (root or workspace_root()).absolute()
+    mirrors = set()
+    for alternates in root.glob("*/*/*/.git/objects/info/alternates"):
+        try:
+            lines = alternates.read_text().splitlines()
+        except OSError:
+            continue
+        mirrors.update(str(Path(line.strip()).parent) for line in lines if line.strip())
+    return mirrors
+
+
+def collect_workspace_garbage(
+    quota_bytes: int, protected: Set[str] = frozenset(), root: Optional[Path] = None
+) -> List[Dict[str, Any]]:
+    """Remove least recently used workspaces until the total size fits the quota
+
+    The template mirrors and check result caches count toward the quota too.
+    Workspaces are removed first, skipping those whose path is in protected,
+    such as ones in use. If that is not enough, cached check results and
+    mirrors no remaining checkout borrows objects from are removed. Returns
+    the removed workspaces and caches.
+    """
+    workspaces = list_workspaces(root)
+    caches = list_shared_caches(root)
+    total = sum(item["size_bytes"] for item in workspaces + caches)
+    removed = []
+    for workspace in workspaces:
+        if total <= quota_bytes:
+            return removed
+        if str(workspace["path"]) in protected:
+            continue
+        remove_workspace(workspace["path"])
+        total -= workspace["size_bytes"]
+        removed.append(workspace)
+
+    in_use = referenced_mirrors(root)
+    for cache in caches:
+        if total <= quota_bytes:
+            break
+        if cache["kind"] == "mirror":
+            lock = _mirror_locks.get(str(cache["path"]))
+            if str(cache["path"]) in in_use or (lock is not None and lock.locked()):
+                continue
+            shutil.rmtree(cache["path"], ignore_errors=True)
+        else:
+            cache["path"].unlink(missing_ok=True)
+        total -= cache["size_bytes"]
+        removed.append(cache)
+    return removed
+
+
+def describe_removed(removed: List[Dict[str, Any]]) -> str:
+    """Count removed workspaces and caches for a summary line"""
+    workspaces = sum(1 for item in removed if item["kind"] == "workspace")
+    text = f"{workspaces} least recently used workspaces"
+    if len(removed) > workspaces:
+        text += f" and {len(removed) - workspaces} mirrors or cached check results"
+    return text
+
+
+async def _run_job(job: Job, operation: Awaitable[str]) -> None:
+    """Await a job's operation and record how it ended"""
+    try:
+        job.result = await operation
+        job.status = "completed"
+    except asyncio.CancelledError:
+        job.status = "cancelled"
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+    finally:
+        job.finished_at = datetime.now()
+
+
+def start_job(
+    session: UserSession,
+    kind: str,
+    description: str,
+    operation: Callable[[Job], Awaitable[str]],
+    total: int = 0,
+) -> Job:
+    """Run an operation on a background task and attach the job to the session
+
+    operation is called with the new job so it can report progress on it; the
+    text it returns becomes the job's result.
+    """
+    job = Job(
+        job_id=uuid.uuid4().hex[:8], kind=kind, description=description, total=total
+    )
+    job.task = asyncio.create_task(_run_job(job, operation(job)))
+    session.jobs[job.job_id] = job
+    return job
+
+
+def get_or_create_session(session_id: str = "default") -> UserSession:
+    """Get existing session or create a new one"""
+    return user_sessions.get_or_create(session_id)
+
+
+@server.list_tools()
+async def handle_list_tools() -> ListToolsResult:
+    """List available tools"""
+    tools = [
+        Tool(
+            name="start_classroom_workflow",
+            description="Start the interactive classroom workflow - lists classrooms and guides through the process",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "session_id": {
+                        "type": "string",
+                        "description": "Session ID (optional, defaults to 'default')",
+                    },
+                    "refresh": {
+                        "type": "boolean",
+                        "description": "Ignore cached listings and ask GitHub again (optional, defaults to false)",
+                    },
+                    "page": {
+                        "type": "integer",
+                        "description": "Page of the listing to show, starting at 1 (optional, defaults to 1)",
+                    },
+                    "page_size": {
+                        "type": "integer",
+                        "description": f"Items per page (optional, defaults to {DEFAULT_PAGE_SIZE})",
+                    },
+                    "format": {
+                        "type": "string",
+                        "enum": OUTPUT_FORMATS,
+                        "description": "'text' for a readable summary or 'json' for compact records (optional, defaults to 'text')",
+                    },
+                },
+                "required": [],
+            },
+        ),
+        Tool(
+            name="select_classroom",
+            description="Select a classroom by number from the list",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "classroom_number": {
+                        "type": "integer",
+                        "description": "The number of the classroom to select",
+                    },
+                    "session_id": {
+                        "type": "string",
+                        "description": "Session ID (optional, defaults to 'default')",
+                    },
+                    "refresh": {
+                        "type": "boolean",
+                        "description": "Ignore cached listings and ask GitHub again (optional, defaults to false)",
+                    },
+                    "page": {
+                        "type": "integer",
+                        "description": "Page of the listing to show, starting at 1 (optional, defaults to 1)",
+                    },
+                    "page_size": {
+                        "type": "integer",
+                        "description": f"Items per page (optional, defaults to {DEFAULT_PAGE_SIZE})",
+                    },
+                    "format": {
+                        "type": "string",
+                        "enum": OUTPUT_FORMATS,
+                        "description": "'text' for a readable summary or 'json' for compact records (optional, defaults to 'text')",
+                    },
+                },
+                "required": ["classroom_number"],
+            },
+        ),
+        Tool(
+            name="select_assignment",
+            description="Select an assignment by number from the list",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "assignment_number": {
+                        "type": "integer",
+                        "description": "The number of the assignment to select",
+                    },
+                    "session_id": {
+                        "type": "string",
+                        "description": "Session ID (optional, defaults to 'default')",
+                    },
+                    "concurrency": {
+                        "type": "integer",
+                        "description": f"Number of repositories cloned at once (optional, defaults to {DEFAULT_CLONE_CONCURRENCY})",
+                    },
+                    "retries": {
+                        "type": "integer",
+                        "description": f"Retries per failed clone (optional, defaults to {DEFAULT_CLONE_RETRIES})",
+                    },
+                    "timeout": {
+                        "type": "number",
+                        "description": f"Timeout in seconds per clone attempt (optional, defaults to {DEFAULT_CLONE_TIMEOUT:g})",
+                    },
+                    "sync_mode": {
+                        "type": "string",
+                        "enum": SYNC_MODES,
+                        "description": "'incremental' fetches repos already on disk and skips unchanged ones, 'full' re-clones everything (optional, defaults to 'incremental')",
+                    },
+                    "clone_profile": {
+                        "type": "string",
+                        "enum": list(CLONE_PROFILES),
+                        "description": "'full' history, 'shallow' (latest commit only), 'blobless' (file contents fetched on demand) or 'sparse' (only sparse_paths checked out) (optional, defaults to 'full')",
+                    },
+                    "sparse_paths": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Exercise paths to check out with the 'sparse' clone profile",
+                    },
+                    "background": {
+                        "type": "boolean",
+                        "description": "Return a job id immediately and clone in the background (optional, defaults to false)",
+                    },
+                    "page_size": {
+                        "type": "integer",
+                        "description": f"Students listed per page (optional, defaults to {DEFAULT_PAGE_SIZE})",
+                    },
+                    "format": {
+                        "type": "string",
+                        "enum": OUTPUT_FORMATS,
+                        "description": "'text' for a readable summary or 'json' for compact records (optional, defaults to 'text')",
+                    },
+                },
+                "required": ["assignment_number"],
+            },
+        ),
+        Tool(
+            name="select_student",
+            description="Select a student by number or repository name to view their pull requests",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "student_number": {
+                        "type": "integer",
+                        "description": "The number of the student to select",
+                    },
+                    "student_name": {
+                        "type": "string",
+                        "description": "The student's repository name, as an alternative to student_number",
+                    },
+                    "session_id": {
+                        "type": "string",
+                        "description": "Session ID (optional, defaults to 'default')",
+                    },
+                    "format": {
+                        "type": "string",
+                        "enum": OUTPUT_FORMATS,
+                        "description": "'text' for a readable summary or 'json' for compact records (optional, defaults to 'text')",
+                    },
+                },
+                "required": [],
+            },
+        ),
+        Tool(
+            name="pull_request_overview",
+            description="Summarize pull requests for every cloned student repository in one table",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "session_id": {
+                        "type": "string",
+                        "description": "Session ID (optional, defaults to 'default')",
+                    },
+                    "concurrency": {
+                        "type": "integer",
+                        "description": f"Number of batched GitHub queries in flight at once (optional, defaults to {DEFAULT_PR_CONCURRENCY})",
+                    },
+                    "page": {
+                        "type": "integer",
+                        "description": "Page of the listing to show, starting at 1 (optional, defaults to 1)",
+                    },
+                    "page_size": {
+                        "type": "integer",
+                        "description": f"Items per page (optional, defaults to {DEFAULT_PAGE_SIZE})",
+                    },
+                },
+                "required": [],
+            },
+        ),
+        Tool(
+            name="check_exercises",
+            description="Run the assignment's test command in every cloned student repository in parallel and report pass/fail counts",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "session_id": {
+                        "type": "string",
+                        "description": "Session ID (optional, defaults to 'default')",
+                    },
+                    "command": {
+                        "type": "string",
+                        "description": f"Test command run inside each repository (optional, defaults to '{DEFAULT_CHECK_COMMAND}')",
+                    },
+                    "concurrency": {
+                        "type": "integer",
+                        "description": f"Number of test runs at once (optional, defaults to the {DEFAULT_CHECK_CONCURRENCY} CPU cores)",
+                    },
+                    "timeout": {
+                        "type": "number",
+                        "description": f"Seconds before one repository's test run is killed; also its CPU time limit (optional, defaults to {DEFAULT_CHECK_TIMEOUT:g})",
+                    },
+                    "memory_mb": {
+                        "type": "number",
+                        "description": f"Address space limit for each test run in megabytes, 0 for none (optional, defaults to {CHECK_MEMORY_LIMIT_MB:g})",
+                    },
+                    "background": {
+                        "type": "boolean",
+                        "description": "Return a job id immediately and run the checks in the background (optional, defaults to false)",
+                    },
+                    "refresh": {
+                        "type": "boolean",
+                        "description": "Run every repository again instead of reusing results for unchanged commits (optional, defaults to false)",
+                    },
+                    "page_size": {
+                        "type": "integer",
+                        "description": f"Students listed per page (optional, defaults to {DEFAULT_PAGE_SIZE})",
+                    },
+                },
+                "required": [],
+            },
+        ),
+        Tool(
+            name="similarity_report",
+            description="Find the most similar pairs of cloned student repositories using winnowed source fingerprints (MOSS-style)",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "session_id": {
+                        "type": "string",
+                        "description": "Session ID (optional, defaults to 'default')",
+                    },
+                    "top_k": {
+                        "type": "integer",
+                        "description": f"Number of pairs to report (optional, defaults to {DEFAULT_SIMILARITY_TOP_K})",
+                    },
+                },
+                "required": [],
+            },
+        ),
+        Tool(
+            name="show_page",
+            description=(
+                "Show another page of a listing from the session. Classroom, assignment, "
+                "student and test result pages are served without asking GitHub again; "
+                "pull request pages are fetched for the students on that page."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "listing": {
+                        "type": "string",
+                        "enum": LISTINGS,
+                        "description": "The listing to page through",
+                    },
+                    "page": {
+                        "type": "integer",
+                        "description": "Page to show, starting at 1 (optional, defaults to the page after the last one shown)",
+                    },
+                    "page_size": {
+                        "type": "integer",
+                        "description": "Items per page (optional, defaults to the listing's last page size)",
+                    },
+                    "session_id": {
+                        "type": "string",
+                        "description": "Session ID (optional, defaults to 'default')",
+                    },
+                },
+                "required": ["listing"],
+            },
+        ),
+        Tool(
+            name="job_status",
+            description="Show the status and partial results of background jobs",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "job_id": {
+                        "type": "string",
+                        "description": "The job to inspect (optional, lists all of the session's jobs when omitted)",
+                    },
+                    "session_id": {
+                        "type": "string",
+                        "description": "Session ID (optional, defaults to 'default')",
+                    },
+                },
+                "required": [],
+            },
+        ),
+        Tool(
+            name="cancel_job",
+            description="Cancel a running background job",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "job_id": {
+                        "type": "string",
+                        "description": "The job to cancel",
+                    },
+                    "session_id": {
+                        "type": "string",
+                        "description": "Session ID (optional, defaults to 'default')",
+                    },
+                },
+                "required": ["job_id"],
+            },
+        ),
+        Tool(
+            name="workspace_usage",
+            description="Report the disk space used by cloned assignments and reclaim it by removing the least recently used ones",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "reclaim": {
+                        "type": "boolean",
+                        "description": "Remove least recently used assignment workspaces until the quota is met (optional, defaults to false). Without a quota every workspace not being cloned into is removed.",
+                    },
+                    "quota_mb": {
+                        "type": "number",
+                        "description": "Disk quota in megabytes (optional, defaults to CLASSROOM_WORKSPACE_QUOTA_MB)",
+                    },
+                },
+                "required": [],
+            },
+        ),
+        Tool(
+            name="reset_session",
+            description="Reset the current session, delete its cloned repositories and start over",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "session_id": {
+                        "type": "string",
+                        "description": "Session ID to reset (optional, defaults to 'default')",
+                    }
+                },
+                "required": [],
+            },
+        ),
+    ]
+    return ListToolsResult(tools=tools)
+
+
+@server.call_tool()
+async def handle_call_tool(name: str, arguments: Dict[str, Any]) -> CallToolResult:
+    """Handle tool calls, running calls on the same session one at a time"""
+    session_id = arguments.get("session_id", "default")
+    if name in UNLOCKED_TOOLS:
+        return await dispatch_tool_call(name, arguments)
+
+    async with session_locks.hold(session_id):
+        result = await dispatch_tool_call(name, arguments)
+        user_sessions.persist(session_id)
+    return result
+
+
+async def dispatch_tool_call(name: str, arguments: Dict[str, Any]) -> CallToolResult:
+    """Route a tool call to its handler"""
+
+    output_format = arguments.get("format", "text")
+    if output_format not in OUTPUT_FORMATS:
+        return CallToolResult(
+            content=[
+                TextContent(
+                    type="text",
+                    text=f"Unknown format '{output_format}'. Choose one of: {', '.join(OUTPUT_FORMATS)}",
+                )
+            ]
+        )
+
+    if name == "start_classroom_workflow":
+        session_id = arguments.get("session_id", "default")
+        refresh = arguments.get("refresh", False)
+        page = arguments.get("page", 1)
+        page_size = arguments.get("page_size", DEFAULT_PAGE_SIZE)
+        return await handle_start_workflow(
+            session_id, refresh, page, page_size, output_format
+        )
+
+    elif name == "select_classroom":
+        classroom_number = arguments["classroom_number"]
+        session_id = arguments.get("session_id", "default")
+        refresh = arguments.get("refresh", False)
+        page = arguments.get("page", 1)
+        page_size = arguments.get("page_size", DEFAULT_PAGE_SIZE)
+        return await handle_select_classroom(
+            classroom_number, session_id, refresh, page, page_size, output_format
+        )
+
+    elif name == "select_assignment":
+        assignment_number = arguments["assignment_number"]
+        session_id = arguments.get("session_id", "default")
+        clone_options = CloneOptions(
+            concurrency=arguments.get("concurrency", DEFAULT_CLONE_CONCURRENCY),
+            retries=arguments.get("retries", DEFAULT_CLONE_RETRIES),
+            timeout=arguments.get("timeout", DEFAULT_CLONE_TIMEOUT),
+            sync_mode=arguments.get("sync_mode", "incremental"),
+            profile=arguments.get("clone_profile", "full"),
+            sparse_paths=arguments.get("sparse_paths", []),
+        )
+        background = arguments.get("background", False)
+        page_size = arguments.get("page_size", DEFAULT_PAGE_SIZE)
+        return await handle_select_assignment(
+            assignment_number,
+            session_id,
+            clone_options,
+            background,
+            page_size,
+            output_format,
+        )
+
+    elif name == "select_student":
+        student_number = arguments.get("student_number")
+        student_name = arguments.get("student_name")
+        session_id = arguments.get("session_id", "default")
+        return await handle_select_student(
+            student_number, session_id, student_name, output_format
+        )
+
+    elif name == "pull_request_overview":
+        session_id = arguments.get("session_id", "default")
+        concurrency = arguments.get("concurrency", DEFAULT_PR_CONCURRENCY)
+        page = arguments.get("page", 1)
+        page_size = arguments.get("page_size", DEFAULT_PAGE_SIZE)
+        return await handle_pull_request_overview(
+            session_id, concurrency, page, page_size
+        )
+
+    elif name == "check_exercises":
+        session_id = arguments.get("session_id", "default")
+        command = arguments.get("command")
+        check_options = CheckOptions(
+            concurrency=arguments.get("concurrency", DEFAULT_CHECK_CONCURRENCY),
+            timeout=arguments.get("timeout", DEFAULT_CHECK_TIMEOUT),
+            memory_mb=arguments.get("memory_mb", CHECK_MEMORY_LIMIT_MB),
+        )
+        background = arguments.get("background", False)
+        refresh = arguments.get("refresh", False)
+        page_size = arguments.get("page_size", DEFAULT_PAGE_SIZE)
+        return await handle_check_exercises(
+            session_id, command, check_options, background, refresh, page_size
+        )
+
+    elif name == "show_page":
+        listing = arguments["listing"]
+        session_id = arguments.get("session_id", "default")
+        page = arguments.get("page")
+        page_size = arguments.get("page_size")
+        return await handle_show_page(listing, session_id, page, page_size)
+
+    elif name == "similarity_report":
+        session_id = arguments.get("session_id", "default")
+        top_k = arguments.get("top_k", DEFAULT_SIMILARITY_TOP_K)
+        return await handle_similarity_report(session_id, top_k)
+
+    elif name == "job_status":
+        job_id = arguments.get("job_id")
+        session_id = arguments.get("session_id", "default")
+        return await handle_job_status(job_id, session_id)
+
+    elif name == "cancel_job":
+        job_id = arguments["job_id"]
+        session_id = arguments.get("session_id", "default")
+        return await handle_cancel_job(job_id, session_id)
+
+    elif name == "workspace_usage":
+        reclaim = arguments.get("reclaim", False)
+        quota_mb = arguments.get("quota_mb")
+        return await handle_workspace_usage(reclaim, quota_mb)
+
+    elif name == "reset_session":
+        session_id = arguments.get("session_id", "default")
+        return await handle_reset_session(session_id)
+
+    else:
+        raise ValueError(f"Unknown tool: {name}")
+
+
+def format_classroom_item(number: int, classroom: Dict) -> str:
+    """One classroom in the classroom listing"""
+    return f"{number}. {classroom['title']} (ID: {classroom['id']})\n"
+
+
+def format_assignment_item(number: int, assignment: Dict) -> str:
+    """One assignment in the assignment listing"""
+    deadline = assignment.get("deadline", "No deadline")
+    return (
+        f"{number}. {assignment['title']} (ID: {assignment['id']})\n"
+        f"   📅 Deadline: {deadline}\n\n"
+    )
+
+
+def format_student_item(number: int, repo: Dict) -> str:
+    """One student repository in the student listing"""
+    if repo["status"] == "failed":
+        return f"{number}. {repo['name']} ❌ Clone failed: {repo['error']}\n"
+    return f"{number}. {repo['name']}\n"
+
+
+def page_offset(
+    session: UserSession, listing: str, page: Optional[int], page_size: int
+) -> int:
+    """Offset of the requested page, or of the item after the last one shown"""
+    if page is not None:
+        return (max(1, page) - 1) * max(1, page_size)
+    return session.pages.get(listing, {}).get("offset", 0)
+
+
+def render_page(
+    session: UserSession,
+    listing: str,
+    records: List[Any],
+    format_item: Callable[[int, Any], str],
+    offset: int = 0,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    budget: Optional[int] = None,
+) -> str:
+    """Render one page of a listing, stopping early once the byte budget is spent
+
+    Items keep their number in the full listing. The offset after the last
+    rendered item is stored in session.pages, so 'show_page' continues exactly
+    where a page cut short by the budget stopped. An offset past the end
+    starts over from the first item.
+    """
+    budget = OUTPUT_BYTE_BUDGET if budget is None else budget
+    page_size = max(1, page_size)
+    if offset >= len(records):
+        offset = 0
+
+    parts = []
+    used = 0
+    end = offset
+    for number, record in enumerate(records[offset : offset + page_size], offset + 1):
+        item = format_item(number, record)
+        used += len(item.encode())
+        if parts and used > budget:
+            break
+        parts.append(item)
+        end += 1
+    session.pages[listing] = {"offset": end, "page_size": page_size}
+
+    if offset > 0 or end < len(records):
+        parts.append(f"\n📄 Showing {offset + 1}-{end} of {len(records)}")
+        if end < len(records):
+            parts.append(
+                f"; call 'show_page' with listing '{listing}' for the next page"
+            )
+        parts.append("\n")
+    return "".join(parts)
+
+
+def json_result(data: Dict[str, Any]) -> CallToolResult:
+    """Return records as compact JSON for automated clients"""
+    return CallToolResult(
+        content=[
+            TextContent(
+                type="text", text=json.dumps(data, separators=(",", ":"), default=str)
+            )
+        ]
+    )
+
+
+def json_page(
+    session: UserSession,
+    listing: str,
+    records: List[Dict[str, Any]],
+    offset: int = 0,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    budget: Optional[int] = None,
+) -> Dict[str, Any]:
+    """One page of a listing as numbered records, tracked like render_page
+
+    The page stops early once its records' JSON exceeds the byte budget, just
+    as render_page does. next_offset is the offset of the first record left
+    out, or None when the listing is complete.
+    """
+    budget = OUTPUT_BYTE_BUDGET if budget is None else budget
+    page_size = max(1, page_size)
+    if offset >= len(records):
+        offset = 0
+
+    items = []
+    used = 0
+    for number, record in enumerate(records[offset : offset + page_size], offset + 1):
+        item = dict(record, number=number)
+        used += len(json.dumps(item, separators=(",", ":"), default=str).encode())
+        if items and used > budget:
+            break
+        items.append(item)
+    end = offset + len(items)
+    session.pages[listing] = {"offset": end, "page_size": page_size}
+    return {
+        "page": offset // page_size + 1,
+        "pages": max(1, -(-len(records) // page_size)),
+        "total": len(records),
+        "next_offset": end if end < len(records) else None,
+        listing: items,
+    }
+
+
+def student_record(repo: Dict[str, Any]) -> Dict[str, Any]:
+    """The fields of a cloned repository that automated clients need"""
+    return {
+        key: repo.get(key)
+        for key in ("name", "full_name", "status", "error", "sha", "path")
+    }
+
+
+async def handle_start_workflow(
+    session_id: str,
+    refresh: bool = False,
+    page: Optional[int] = 1,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    output_format: str = "text",
+) -> CallToolResult:
+    """Start the interactive workflow by listing classrooms"""
+    session = get_or_create_session(session_id)
+    session.current_step = "selecting_classroom"
+
+    # Get list of classrooms
+    result = await run_gh_command_cached(
+        ["classroom", "list", "--json", "id,name,title"], refresh
+    )
+
+    if not result["success"]:
+        return CallToolResult(
+            content=[TextContent(type="text", text=f"Error: {result['stderr']}")]
+        )
+
+    try:
+        classrooms = json.loads(result["stdout"])
+        if not classrooms:
+            return CallToolResult(
+                content=[
+                    TextContent(
+                        type="text",
+                        text="No classrooms found. Please check your GitHub Classroom access.",
+                    )
+                ]
+            )
+
+        # Store classrooms in session for later use
+        session.classrooms = classrooms
+        offset = page_offset(session, "classrooms", page, page_size)
+        shown = classrooms[offset : offset + max(1, page_size)]
+        start_prefetch(lambda: prefetch_assignments(shown))
+
+        if output_format == "json":
+            return json_result(
+                json_page(session, "classrooms", classrooms, offset, page_size)
+            )
+
+        output = "🏫 Available Classrooms:\n"
+        output += "======================\n\n"
+        output += render_page(
+            session, "classrooms", classrooms, format_classroom_item, offset, page_size
+        )
+
+        output += "\n🏫 Call 'select_classroom' with the number to view assignments."
+
+        return CallToolResult(content=[TextContent(type="text", text=output)])
+
+    except json.JSONDecodeError:
+        return CallToolResult(
+            content=[
+                TextContent(
+                    type="text",
+                    text=f"Error parsing classroom data: {result['stdout']}",
+                )
+            ]
+        )
+
+
+async def handle_select_classroom(
+    classroom_number: int,
+    session_id: str,
+    refresh: bool = False,
+    page: Optional[int] = 1,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    output_format: str = "text",
+) -> CallToolResult:
+    """Select a classroom and show its assignments"""
+    session = get_or_create_session(session_id)
+
+    if not hasattr(session, "classrooms") or not session.classrooms:
+        return CallToolResult(
+            content=[
+                TextContent(
+                    type="text",
+                    text="No classrooms available. Please call 'start_classroom_workflow' first.",
+                )
+            ]
+        )
+
+    if classroom_number < 1 or classroom_number > len(session.classrooms):
+        return CallToolResult(
+            content=[
+                TextContent(
+                    type="text",
+                    text=f"Invalid classroom number. Please select between 1 and {len(session.classrooms)}",
+                )
+            ]
+        )
+
+    # Get selected classroom
+    selected_classroom = session.classrooms[classroom_number - 1]
+    session.selected_classroom = selected_classroom
+    session.current_step = "selecting_assignment"
+
+    # Get assignments for this classroom
+    result = await run_gh_command_cached(
+        assignment_listing_args(selected_classroom["id"]), refresh
+    )
+
+    if not result["success"]:
+        return CallToolResult(
+            content=[
+                TextContent(
+                    type="text", text=f"Error fetching assignments: {result['stderr']}"
+                )
+            ]
+        )
+
+    try:
+        assignments = json.loads(result["stdout"])
+        if not assignments:
+            return CallToolResult(
+                content=[
+                    TextContent(
+                        type="text",
+                        text=f"No assignments found for classroom: {selected_classroom['title']}",
+                    )
+                ]
+            )
+
+        # Store assignments in session
+        session.assignments = assignments
+        offset = page_offset(session, "assignments", page, page_size)
+
+        if output_format == "json":
+            return json_result(
+                dict(
+                    json_page(session, "assignments", assignments, offset, page_size),
+                    classroom=selected_classroom,
+                )
+            )
+
+        output = f"✅ Selected Classroom: {selected_classroom['title']}\n\n"
+        output += "📚 Available Assignments:\n"
+        output += "========================\n\n"
+        output += render_page(
+            session,
+            "assignments",
+            assignments,
+            format_assignment_item,
+            offset,
+            page_size,
+        )
+
+        output += (
+            "🚀 Call 'select_assignment' with the number to clone student repositories."
+        )
+
+        return CallToolResult(content=[TextContent(type="text", text=output)])
+
+    except json.JSONDecodeError:
+        return CallToolResult(
+            content=[
+                TextContent(
+                    type="text",
+                    text=f"Error parsing assignment data: {result['stdout']}",
+                )
+            ]
+        )
+
+
+async def handle_select_assignment(
+    assignment_number: int,
+    session_id: str,
+    clone_options: Optional[CloneOptions] = None,
+    background: bool = False,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    output_format: str = "text",
+) -> CallToolResult:
+    """Select an assignment and clone student repositories"""
+    session = get_or_create_session(session_id)
+    clone_options = clone_options or CloneOptions()
+
+    options_error = validate_clone_options(clone_options)
+    if options_error:
+        return CallToolResult(content=[TextContent(type="text", text=options_error)])
+
+    if not hasattr(session, "assignments") or not session.assignments:
+        return CallToolResult(
+            content=[
+                TextContent(
+                    type="text",
+                    text="No assignments available. Please select a classroom first.",
+                )
+            ]
+        )
+
+    if assignment_number < 1 or assignment_number > len(session.assignments):
+        return CallToolResult(
+            content=[
+                TextContent(
+                    type="text",
+                    text=f"Invalid assignment number. Please select between 1 and {len(session.assignments)}",
+                )
+            ]
+        )
+
+    # A running clone job keeps filling in the session's repositories
+    clone_job = running_clone_job(session)
+    if clone_job is not None:
+        return CallToolResult(
+            content=[
+                TextContent(
+                    type="text",
+                    text=(
+                        f"⏳ Background job {clone_job.job_id} is still running: "
+                        f"{clone_job.description}. Wait for it to finish or call "
+                        "'cancel_job' before selecting another assignment."
+                    ),
+                )
+            ]
+        )
+
+    # Get selected assignment
+    selected_assignment = session.assignments[assignment_number - 1]
+    session.selected_assignment = selected_assignment
+    session.current_step = "cloning_repos"
+
+    output = f"✅ Selected Assignment: {selected_assignment['title']}\n\n"
+    output += "📥 Cloning student repositories...\n"
+
+    # List the repositories of students who accepted the assignment
+    listing_result = await run_gh_command_async(
+        [
+            "classroom",
+            "accepted-assignments",
+            "--assignment-id",
+            str(selected_assignment["id"]),
+            "--json",
+            "id,students,repository",
+        ]
+    )
+
+    if not listing_result["success"]:
+        workspace = assignment_workspace(session_id, selected_assignment["id"])
+        manifest = load_sync_manifest(sync_manifest_path(workspace))
+        if not manifest["repos"]:
+            return CallToolResult(
+                content=[
+                    TextContent(
+                        type="text",
+                        text=f"Error listing student repositories: {listing_result['stderr']}",
+                    )
+                ]
+            )
+
+        # Fall back to the repositories already cloned into this workspace
+        session.cloned_repos = repos_from_manifest(workspace, manifest)
+        session.workspace = str(workspace)
+        touch_workspace(workspace)
+        index_cloned_repos(session)
+        session.current_step = "selecting_student"
+
+        if output_format == "json":
+            return json_result(
+                dict(
+                    json_page(
+                        session,
+                        "students",
+                        [student_record(repo) for repo in session.cloned_repos],
+                        0,
+                        page_size,
+                    ),
+                    assignment=selected_assignment,
+                    warning=f"Could not list student repositories: {listing_result['stderr'].strip()}",
+                )
+            )
+
+        output = f"✅ Selected Assignment: {selected_assignment['title']}\n\n"
+        output += f"⚠️ Could not list student repositories: {listing_result['stderr'].strip()}\n"
+        output += f"📂 Using the {len(session.cloned_repos)} repositories already cloned in {workspace}\n\n"
+        output += "👥 Student Repositories:\n"
+        output += "=======================\n\n"
+        output += render_page(
+            session, "students", session.cloned_repos, format_student_item, 0, page_size
+        )
+        output += (
+            "\n🔍 Call 'select_student' with the number to view their pull requests."
+        )
+
+        return CallToolResult(content=[TextContent(type="text", text=output)])
+
+    try:
+        repos = parse_student_repos(json.loads(listing_result["stdout"]))
+    except json.JSONDecodeError:
+        return CallToolResult(
+            content=[
+                TextContent(
+                    type="text",
+                    text=f"Error parsing student repository data: {listing_result['stdout']}",
+                )
+            ]
+        )
+
+    if not repos:
+        return CallToolResult(
+            content=[
+                TextContent(
+                    type="text",
+                    text=f"No student repositories found for assignment: {selected_assignment['title']}",
+                )
+            ]
+        )
+
+    if background:
+        job = start_clone_job(
+            session, selected_assignment, repos, clone_options, page_size
+        )
+        if output_format == "json":
+            return json_result(
+                dict(
+                    json_page(
+                        session,
+                        "students",
+                        [student_record(repo) for repo in session.cloned_repos],
+                        0,
+                        page_size,
+                    ),
+                    assignment=selected_assignment,
+                    job_id=job.job_id,
+                )
+            )
+        output += (
+            f"🚀 Cloning {len(repos)} repositories in background job {job.job_id}.\n\n"
+        )
+        output += "👥 Student Repositories (cloning in progress):\n"
+        output += "=======================\n\n"
+        output += render_page(
+            session, "students", session.cloned_repos, format_student_item, 0, page_size
+        )
+
+        output += (
+            f"\n📋 Call 'job_status' with job_id '{job.job_id}' to follow progress."
+        )
+        output += "\n🔍 Students whose repositories have finished cloning can already be selected with 'select_student'."
+
+        return CallToolResult(content=[TextContent(type="text", text=output)])
+
+    summary = await clone_assignment_repos(
+        session,
+        selected_assignment,
+        repos,
+        clone_options,
+        ProgressReporter(),
+        page_size=page_size,
+    )
+
+    if output_format == "json":
+        status_counts = Counter(repo["status"] for repo in session.cloned_repos)
+        return json_result(
+            dict(
+                json_page(
+                    session,
+                    "students",
+                    [student_record(repo) for repo in session.cloned_repos],
+                    0,
+                    page_size,
+                ),
+                assignment=selected_assignment,
+                statuses=dict(status_counts),
+            )
+        )
+
+    output += summary
+
+    return CallToolResult(content=[TextContent(type="text", text=output)])
+
+
+async def clone_assignment_repos(
+    session: UserSession,
+    assignment: Dict,
+    repos: List[Dict[str, str]],
+    clone_options: CloneOptions,
+    reporter: ProgressReporter,
+    job: Optional[Job] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+) -> str:
+    """Clone or sync an assignment's repositories into the session and summarize them
+
+    With a job, each finished repository replaces its pending entry in
+    session.cloned_repos as soon as it completes. A job whose assignment is no
+    longer selected still finishes the workspace but leaves the session alone.
+    """
+
+    def is_selected() -> bool:
+        return (session.selected_assignment or {}).get("id") == assignment["id"]
+
+    async def on_progress(event: Dict[str, Any]) -> None:
+        await reporter(event)
+        if job is not None:
+            job.record_progress(event)
+            index = session.repo_index.get(event["repo"]["name"])
+            if is_selected() and index is not None:
+                session.cloned_repos[index] = event["repo"]
+
+    # Clone or sync student repositories in parallel, recording each outcome
+    workspace = assignment_workspace(session.session_id, assignment["id"])
+    workspace.mkdir(parents=True, exist_ok=True)
+    if is_selected():
+        session.workspace = str(workspace)
+    manifest_path = sync_manifest_path(workspace)
+    manifest = load_sync_manifest(manifest_path)
+    profile_key = clone_profile_key(clone_options)
+    if manifest.get("profile", profile_key) != profile_key:
+        # Checkouts made with another profile lack the requested history or paths
+        clone_options = replace(clone_options, sync_mode="full")
+    manifest["profile"] = profile_key
+    # Borrow the template's objects from a shared mirror so only each
+    # student's own commits are downloaded
+    shared_from = None
+    if USE_REFERENCE_MIRRORS and clone_options.reference is None:
+        template = await fetch_template_repo(assignment["id"])
+        mirror = (
+            await ensure_reference_mirror(template, clone_options) if template else None
+        )
+        if mirror is not None:
+            clone_options = replace(clone_options, reference=str(mirror))
+            shared_from = template["full_name"]
+    synced_shas = {name: repo["sha"] for name, repo in manifest["repos"].items()}
+    cloned_repos = await clone_student_repos(
+        repos, workspace, clone_options, synced_shas, on_progress=on_progress
+    )
+    manifest["last_used"] = datetime.now().isoformat()
+    save_sync_manifest(manifest_path, update_sync_manifest(manifest, cloned_repos))
+    removed = []
+    if WORKSPACE_QUOTA_MB > 0:
+        removed = await reclaim_workspaces(
+            int(WORKSPACE_QUOTA_MB * 1024 * 1024), {str(workspace)}
+        )
+    selected = is_selected()
+    if selected:
+        session.cloned_repos = cloned_repos
+        index_cloned_repos(session)
+        full_names = [
+            repo["full_name"] for repo in cloned_repos if repo["status"] != "failed"
+        ]
+        start_prefetch(lambda: prefetch_pull_requests(full_names))
+        session.current_step = "selecting_student"
+        session.clone_profile = clone_options.profile
+        session.sparse_paths = list(clone_options.sparse_paths)
+
+    # Summarize from the progress events streamed while cloning
+    status_counts = {status: 0 for status in ("cloned", "updated", "unchanged")}
+    for event in reporter.events:
+        if event["repo"]["status"] in status_counts:
+            status_counts[event["repo"]["status"]] += 1
+    last_event = reporter.events[-1]
+    output = f"✅ Successfully cloned {sum(status_counts.values())} of {last_event['total']} repositories!\n"
+    output += (
+        f"   📥 {status_counts['cloned']} cloned, 🔄 {status_counts['updated']} updated, "
+        f"⏭️ {status_counts['unchanged']} unchanged\n"
+    )
+    output += (
+        f"   ⏱️ {last_event['elapsed']:.1f}s, "
+        f"{format_size(last_event['total_bytes'])} in new or updated checkouts\n"
+    )
+    output += f"   📦 Clone profile: {clone_profile_key(clone_options)}\n"
+    if shared_from:
+        output += f"   🪞 Template objects shared from {shared_from}\n"
+    if removed:
+        output += (
+            f"   🧹 Removed {describe_removed(removed)} "
+            f"({format_size(sum(workspace['size_bytes'] for workspace in removed))}) "
+            "to stay within the disk quota\n"
+        )
+    output += "\n"
+    if not selected:
+        output += (
+            f"⚠️ {assignment['title']} is no longer the selected assignment; "
+            f"its repositories are in {workspace} but the session was left unchanged.\n"
+        )
+        return output
+    output += "👥 Student Repositories:\n"
+    output += "=======================\n\n"
+    output += render_page(
+        session, "students", session.cloned_repos, format_student_item, 0, page_size
+    )
+
+    output += "\n🔍 Call 'select_student' with the number to view their pull requests."
+
+    return output
+
+
+async def _clone_job_operation(
+    session: UserSession,
+    assignment: Dict,
+    repos: List[Dict[str, str]],
+    clone_options: CloneOptions,
+    job: Job,
+    page_size: int = DEFAULT_PAGE_SIZE,
+) -> str:
+    """Clone in the background, marking unfinished repositories if cancelled"""
+    try:
+        return await clone_assignment_repos(
+            session,
+            assignment,
+            repos,
+            clone_options,
+            # The tool call has already returned, so only log messages are streamed
+            ProgressReporter(use_progress_token=False),
+            job,
+            page_size,
+        )
+    except asyncio.CancelledError:
+        if (session.selected_assignment or {}).get("id") != assignment["id"]:
+            raise
+        for repo in session.cloned_repos:
+            if repo["status"] == "pending":
+                repo["status"] = "failed"
+                repo["error"] = "clone cancelled"
+        raise
+    finally:
+        user_sessions.persist(session.session_id)
+
+
+def running_clone_job(session: UserSession) -> Optional[Job]:
+    """The session's clone job that is still running, if any"""
+    for job in session.jobs.values():
+        if job.kind == "clone_assignment" and job.status == "running":
+            return job
+    return None
+
+
+def start_clone_job(
+    session: UserSession,
+    assignment: Dict,
+    repos: List[Dict[str, str]],
+    clone_options: CloneOptions,
+    page_size: int = DEFAULT_PAGE_SIZE,
+) -> Job:
+    """Register pending repositories on the session and clone them in a background job"""
+    workspace = assignment_workspace(session.session_id, assignment["id"])
+    session.workspace = str(workspace)
+    session.cloned_repos = [
+        {
+            "name": repo["name"],
+            "path": str(workspace / repo["name"]),
+            "full_name": repo["full_name"],
+            "status": "pending",
+            "attempts": 0,
+            "error": None,
+            "sha": None,
+            "size_bytes": None,
+        }
+        for repo in repos
+    ]
+    index_cloned_repos(session)
+
+    return start_job(
+        session,
+        "clone_assignment",
+        f"Clone {len(repos)} repositories for {assignment['title']}",
+        lambda job: _clone_job_operation(
+            session, assignment, repos, clone_options, job, page_size
+        ),
+        total=len(repos),
+    )
+
+
+async def handle_select_student(
+    student_number: Optional[int],
+    session_id: str,
+    student_name: Optional[str] = None,
+    output_format: str = "text",
+) -> CallToolResult:
+    """Select a student and show their pull requests"""
+    session = get_or_create_session(session_id)
+
+    if not hasattr(session, "cloned_repos") or not session.cloned_repos:
+        return CallToolResult(
+            content=[
+                TextContent(
+                    type="text",
+                    text="No student repositories available. Please select an assignment first.",
+                )
+            ]
+        )
+
+    if student_name is not None:
+        if student_name not in session.repo_index:
+            return CallToolResult(
+                content=[
+                    TextContent(
+                        type="text",
+                        text=f"Unknown student repository: {student_name}",
+                    )
+                ]
+            )
+        student_number = session.repo_index[student_name] + 1
+
+    if student_number is None:
+        return CallToolResult(
+            content=[
+                TextContent(
+                    type="text",
+                    text="Please provide a student_number or student_name.",
+                )
+            ]
+        )
+
+    if student_number < 1 or student_number > len(session.cloned_repos):
+        return CallToolResult(
+            content=[
+                TextContent(
+                    type="text",
+                    text=f"Invalid student number. Please select between 1 and {len(session.cloned_repos)}",
+                )
+            ]
+        )
+
+    # Get selected student's repository
+    selected_repo = session.cloned_repos[student_number - 1]
+    repo_name = selected_repo["name"]
+    if session.workspace:
+        touch_workspace(Path(session.workspace))
+
+    # The owner/repo name was resolved when the assignment was cloned
+    prs = None
+    problem = None
+    try:
+        repo_path = Path(selected_repo["path"])
+
+        if selected_repo.get("status") == "pending":
+            problem = "Repository is still being cloned by a background job."
+        elif repo_path.exists():
+            repo_full_name = resolve_repo_full_name(selected_repo)
+            if repo_full_name:
+                # List open PRs for this repository, unless prefetched
+                pr_result = pr_prefetch_cache.get((repo_full_name, "OPEN"))
+                if pr_result is not None:
+                    pr_prefetch_cache.invalidate((repo_full_name, "OPEN"))
+                else:
+                    pr_results = await fetch_pull_requests(
+                        [repo_full_name], states=["OPEN"]
+                    )
+                    pr_result = pr_results[repo_full_name]
+
+                if "error" not in pr_result:
+                    prs = pr_result["prs"]
+                else:
+                    problem = f"Error fetching pull requests: {pr_result['error']}"
+            else:
+                problem = "Could not determine GitHub repository name."
+        elif selected_repo.get("status") == "failed":
+            problem = f"Repository was not cloned: {selected_repo['error']}"
+        else:
+            problem = "Repository directory not found."
+
+    except Exception as e:
+        problem = f"Error checking pull requests: {str(e)}"
+
+    check = session.check_results.get(repo_name)
+    if output_format == "json":
+        return json_result(
+            {
+                "student": dict(student_record(selected_repo), number=student_number),
+                "pull_requests": prs,
+                "error": problem,
+                "check": (
+                    {key: value for key, value in check.items() if key != "output"}
+                    if check
+                    else None
+                ),
+            }
+        )
+
+    output = f"✅ Selected Student: {repo_name}\n\n"
+    output += "🔍 Checking for pull requests...\n\n"
 
+    output += f"📁 Repository: {repo_name}\n"
+    output += f" Path: {selected_repo['path']}\n\n"
 
-async def handle_start_workflow(session_id: str) -> CallToolResult:
-    """Start the interactive workflow by listing classrooms"""
-    session = get_or_create_session(session_id)
-    session.current_step = "selecting_classroom"
+    if check:
+        output += (
+            f"🧪 Tests ({session.check_command}): {check['status']}, "
+            f"{check['passed']} passed, {check['failed']} failed, "
+            f"{check['errors']} errors in {check['duration']:.1f}s\n"
+        )
+        if check["status"] != "passed" and check["output"]:
+            output += "```\n" + check["output"][-800:].strip() + "\n```\n"
+        output += "\n"
 
-    # Get list of classrooms
-    result = run_gh_command(["classroom", "list", "--json", "id,name,title"])
+    if problem:
+        output += f"📋 {problem}\n"
+    elif prs:
+        output += " Pull Requests:\n"
+        output += "================\n\n"
 
-    if not result["success"]:
-        return CallToolResult(
-            content=[TextContent(type="text", text=f"Error: {result['stderr']}")]
-        )
+        for pr in prs:
+            output += f"#{pr['number']}: {pr['title']}\n"
+            output += f"   👤 Author: {pr['author']['login']}\n"
+            output += f"   📊 State: {pr['state']}\n"
+            output += f"   📅 Created: {pr['createdAt']}\n\n"
+    else:
+        output += "📋 No pull requests found for this repository.\n"
 
-    try:
-        classrooms = json.loads(result["stdout"])
-        if not classrooms:
-            return CallToolResult(
-                content=[
-                    TextContent(
-                        type="text",
-                        text="No classrooms found. Please check your GitHub Classroom access.",
-                    )
-                ]
-            )
+    output += "\n🔄 Call 'reset_session' to start over with a new workflow."
 
-        # Store classrooms in session for later use
-        session.classrooms = classrooms
+    return CallToolResult(content=[TextContent(type="text", text=output)])
 
-        output = "🏫 Available Classrooms:\n"
-        output += "======================\n\n"
 
-        for i, classroom in enumerate(classrooms, 1):
-            output += f"{i}. {classroom['title']} (ID: {classroom['id']})\n"
+def summarize_pull_requests(prs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Count pull requests by state and find the most recent creation date"""
+    summary = {"open": 0, "merged": 0, "closed": 0, "latest": None}
+    for pr in prs:
+        state = pr["state"].lower()
+        if state in summary:
+            summary[state] += 1
+    if prs:
+        summary["latest"] = max(pr["createdAt"] for pr in prs)
+    return summary
 
-        output += "\n🏫 Call 'select_classroom' with the number to view assignments."
 
-        return CallToolResult(content=[TextContent(type="text", text=output)])
+async def handle_pull_request_overview(
+    session_id: str,
+    concurrency: int = DEFAULT_PR_CONCURRENCY,
+    page: Optional[int] = 1,
+    page_size: int = DEFAULT_PAGE_SIZE,
+) -> CallToolResult:
+    """Show pull request counts for one page of the cloned student repositories
 
-    except json.JSONDecodeError:
+    Only the repositories on the page are queried.
+    """
+    session = get_or_create_session(session_id)
+
+    if not session.cloned_repos:
         return CallToolResult(
             content=[
                 TextContent(
                     type="text",
-                    text=f"Error parsing classroom data: {result['stdout']}",
+                    text="No student repositories available. Please select an assignment first.",
                 )
             ]
         )
 
+    page_size = max(1, page_size)
+    offset = page_offset(session, "pull_requests", page, page_size)
+    if offset >= len(session.cloned_repos):
+        offset = 0
+    page_repos = session.cloned_repos[offset : offset + page_size]
 
-async def handle_select_classroom(
-    classroom_number: int, session_id: str
+    full_names = [resolve_repo_full_name(repo) for repo in page_repos]
+    pr_results = await fetch_pull_requests(
+        [full_name for full_name in full_names if full_name],
+        concurrency=concurrency,
+        priority="bulk",
+    )
+
+    summaries = {}
+    for repo, full_name in zip(page_repos, full_names):
+        if not full_name:
+            summaries[repo["name"]] = {"error": "could not determine GitHub repository"}
+        elif "error" in pr_results[full_name]:
+            summaries[repo["name"]] = pr_results[full_name]
+        else:
+            summaries[repo["name"]] = summarize_pull_requests(
+                pr_results[full_name]["prs"]
+            )
+
+    name_width = max(len("Student"), *(len(repo["name"]) for repo in page_repos))
+
+    def format_row(number: int, repo: Dict) -> str:
+        summary = summaries[repo["name"]]
+        row = f"{number:>3}  {repo['name']:<{name_width}}  "
+        if "error" in summary:
+            return row + f"⚠️ {summary['error']}\n"
+        latest = summary["latest"][:10] if summary["latest"] else "-"
+        return row + (
+            f"{summary['open']:>4}  {summary['merged']:>6}  "
+            f"{summary['closed']:>6}  {latest}\n"
+        )
+
+    output = f"📊 Pull Request Overview ({len(session.cloned_repos)} repositories):\n"
+    output += "=====================================\n\n"
+    output += f"{'#':>3}  {'Student':<{name_width}}  Open  Merged  Closed  Latest PR\n"
+    output += render_page(
+        session, "pull_requests", session.cloned_repos, format_row, offset, page_size
+    )
+
+    output += (
+        "\n🔍 Call 'select_student' with a number to view that student's pull requests."
+    )
+
+    return CallToolResult(content=[TextContent(type="text", text=output)])
+
+
+async def handle_check_exercises(
+    session_id: str,
+    command: Optional[str] = None,
+    check_options: Optional[CheckOptions] = None,
+    background: bool = False,
+    refresh: bool = False,
+    page_size: int = DEFAULT_PAGE_SIZE,
 ) -> CallToolResult:
-    """Select a classroom and show its assignments"""
+    """Run the test command in every cloned student repository"""
     session = get_or_create_session(session_id)
+    check_options = check_options or CheckOptions()
+    command = command or session.check_command or DEFAULT_CHECK_COMMAND
 
-    if not hasattr(session, "classrooms") or not session.classrooms:
+    options_error = validate_check_options(check_options)
+    if options_error:
+        return CallToolResult(content=[TextContent(type="text", text=options_error)])
+
+    try:
+        command_args = shlex.split(command)
+    except ValueError as e:
         return CallToolResult(
-            content=[
-                TextContent(
-                    type="text",
-                    text="No classrooms available. Please call 'start_classroom_workflow' first.",
-                )
-            ]
+            content=[TextContent(type="text", text=f"Invalid test command: {e}")]
+        )
+    if not command_args:
+        return CallToolResult(
+            content=[TextContent(type="text", text="The test command is empty.")]
         )
 
-    if classroom_number < 1 or classroom_number > len(session.classrooms):
+    if not session.cloned_repos:
         return CallToolResult(
             content=[
                 TextContent(
                     type="text",
-                    text=f"Invalid classroom number. Please select between 1 and {len(session.classrooms)}",
+                    text="No student repositories available. Please select an assignment first.",
                 )
             ]
         )
 
-    # Get selected classroom
-    selected_classroom = session.classrooms[classroom_number - 1]
-    session.selected_classroom = selected_classroom
-    session.current_step = "selecting_assignment"
+    if background:
+        job = start_job(
+            session,
+            "check_exercises",
+            f"Run '{command}' in {len(session.cloned_repos)} repositories",
+            lambda job: check_assignment_repos(
+                session,
+                command,
+                command_args,
+                check_options,
+                ProgressReporter(use_progress_token=False, logger="classroom.check"),
+                job,
+                refresh,
+                page_size,
+            ),
+            total=len(session.cloned_repos),
+        )
+        output = f"🧪 Checking {len(session.cloned_repos)} repositories in background job {job.job_id}\n"
+        output += (
+            f"\n📋 Call 'job_status' with job_id '{job.job_id}' to follow progress."
+        )
+        return CallToolResult(content=[TextContent(type="text", text=output)])
 
-    # Get assignments for this classroom
-    result = run_gh_command(
-        [
-            "classroom",
-            "list-assignments",
-            "--classroom-id",
-            str(selected_classroom["id"]),
-            "--json",
-            "id,title,name,deadline",
-        ]
+    output = await check_assignment_repos(
+        session,
+        command,
+        command_args,
+        check_options,
+        ProgressReporter(logger="classroom.check"),
+        refresh=refresh,
+        page_size=page_size,
     )
+    return CallToolResult(content=[TextContent(type="text", text=output)])
 
-    if not result["success"]:
-        return CallToolResult(
-            content=[
-                TextContent(
-                    type="text", text=f"Error fetching assignments: {result['stderr']}"
-                )
-            ]
+
+def render_check_results(
+    session: UserSession,
+    results: List[Dict[str, Any]],
+    offset: int = 0,
+    page_size: int = DEFAULT_PAGE_SIZE,
+) -> str:
+    """Render one page of check results as a table"""
+    name_width = max(len("Student"), *(len(result["name"]) for result in results))
+
+    def format_row(number: int, result: Dict[str, Any]) -> str:
+        row = (
+            f"{number:>3}  {result['name']:<{name_width}}  {result['status']:<7}  "
+            f"{result['passed']:>6}  {result['failed'] + result['errors']:>6}  "
+            f"{result['duration']:>5.1f}s"
         )
+        if result.get("cached"):
+            row += " ♻️"
+        if result["status"] in ("error", "skipped"):
+            row += f"  ⚠️ {result['error']}"
+        return row + "\n"
 
-    try:
-        assignments = json.loads(result["stdout"])
-        if not assignments:
-            return CallToolResult(
-                content=[
-                    TextContent(
-                        type="text",
-                        text=f"No assignments found for classroom: {selected_classroom['title']}",
-                    )
-                ]
-            )
+    header = f"{'#':>3}  {'Student':<{name_width}}  Result   Passed  Failed   Time\n"
+    return header + render_page(
+        session, "checks", results, format_row, offset, page_size
+    )
 
-        # Store assignments in session
-        session.assignments = assignments
 
-        output = f"✅ Selected Classroom: {selected_classroom['title']}\n\n"
-        output += "📚 Available Assignments:\n"
-        output += "========================\n\n"
+async def check_assignment_repos(
+    session: UserSession,
+    command: str,
+    command_args: List[str],
+    check_options: CheckOptions,
+    reporter: ProgressReporter,
+    job: Optional[Job] = None,
+    refresh: bool = False,
+    page_size: int = DEFAULT_PAGE_SIZE,
+) -> str:
+    """Run the checks, store the results on the session and summarize them
 
-        for i, assignment in enumerate(assignments, 1):
-            deadline = assignment.get("deadline", "No deadline")
-            output += f"{i}. {assignment['title']} (ID: {assignment['id']})\n"
-            output += f"   📅 Deadline: {deadline}\n\n"
+    Results are cached per assignment under the submission's commit, the
+    test suite's hash, the clone profile and the check limits; refresh=True
+    runs every repository again.
+    """
 
-        output += (
-            "🚀 Call 'select_assignment' with the number to clone student repositories."
+    async def on_progress(event: Dict[str, Any]) -> None:
+        await reporter(event)
+        if job is not None:
+            job.record_progress(event)
+
+    started = time.monotonic()
+    assignment = session.selected_assignment
+    cache_path = check_cache_path(assignment["id"]) if assignment else None
+    cache = (
+        {}
+        if cache_path is None or refresh
+        else dict(load_check_cache(cache_path)["results"])
+    )
+    cached_keys = set(cache)
+    profile_key = clone_profile_key(
+        CloneOptions(
+            profile=session.clone_profile or "full",
+            sparse_paths=session.sparse_paths,
+        )
+    )
+    results = await run_exercise_checks(
+        list(session.cloned_repos),
+        command_args,
+        check_options,
+        on_progress,
+        cache,
+        profile_key,
+    )
+    if cache_path is not None:
+        save_check_cache(
+            cache_path, {key: cache[key] for key in cache if key not in cached_keys}
         )
+    session.check_command = command
+    session.check_results = {result["name"]: result for result in results}
 
-        return CallToolResult(content=[TextContent(type="text", text=output)])
+    status_counts = {"passed": 0, "failed": 0, "error": 0, "skipped": 0}
+    for result in results:
+        status_counts[result["status"]] += 1
 
-    except json.JSONDecodeError:
-        return CallToolResult(
-            content=[
-                TextContent(
-                    type="text",
-                    text=f"Error parsing assignment data: {result['stdout']}",
-                )
-            ]
-        )
+    output = f"🧪 Checked {len(results)} repositories with '{command}' in {time.monotonic() - started:.1f}s\n"
+    output += (
+        f"   ✅ {status_counts['passed']} passed, ❌ {status_counts['failed']} failed, "
+        f"⚠️ {status_counts['error']} errors, ⏭️ {status_counts['skipped']} skipped\n"
+    )
+    reused = sum(1 for result in results if result.get("cached"))
+    if reused:
+        output += f"   ♻️ {reused} results reused for unchanged submissions\n"
+    output += "\n"
 
+    output += render_check_results(session, results, 0, page_size)
 
-async def handle_select_assignment(
-    assignment_number: int, session_id: str
+    output += (
+        "\n🔍 Call 'select_student' with a number to see that student's test output."
+    )
+
+    return output
+
+
+def _fingerprint_repos(repos: List[Dict[str, Any]]) -> Dict[str, Set[int]]:
+    """Fingerprint every cloned repository"""
+    return {
+        repo["name"]: fingerprint_repo(Path(repo["path"]))
+        for repo in repos
+        if repo["status"] not in ("failed", "pending")
+    }
+
+
+async def handle_similarity_report(
+    session_id: str, top_k: int = DEFAULT_SIMILARITY_TOP_K
 ) -> CallToolResult:
-    """Select an assignment and clone student repositories"""
+    """Report the most similar pairs of cloned student repositories"""
     session = get_or_create_session(session_id)
 
-    if not hasattr(session, "assignments") or not session.assignments:
+    if not session.cloned_repos:
         return CallToolResult(
             content=[
                 TextContent(
                     type="text",
-                    text="No assignments available. Please select a classroom first.",
+                    text="No student repositories available. Please select an assignment first.",
                 )
             ]
         )
 
-    if assignment_number < 1 or assignment_number > len(session.assignments):
+    # Tokenizing every checkout is CPU bound, so keep it off the event loop
+    loop = asyncio.get_running_loop()
+    fingerprints = await loop.run_in_executor(
+        None, _fingerprint_repos, list(session.cloned_repos)
+    )
+    pairs = find_similar_pairs(fingerprints, max(1, top_k))
+
+    output = (
+        f"🔎 Most Similar Submissions ({len(fingerprints)} repositories compared):\n"
+    )
+    output += "=====================================\n\n"
+    if not pairs:
+        output += "No two repositories share source code beyond the common template.\n"
+        return CallToolResult(content=[TextContent(type="text", text=output)])
+
+    name_width = max(
+        len("Student"),
+        *(len(pair[key]) for pair in pairs for key in ("first", "second")),
+    )
+    output += f"{'#':>3}  {'Student':<{name_width}}  {'Student':<{name_width}}  Shared  Similarity\n"
+    for i, pair in enumerate(pairs, 1):
+        output += (
+            f"{i:>3}  {pair['first']:<{name_width}}  {pair['second']:<{name_width}}  "
+            f"{pair['shared']:>6}  {pair['first_percent']:.0f}% / {pair['second_percent']:.0f}%\n"
+        )
+
+    output += (
+        "\nSimilarity is the share of each student's fingerprints found in the other's "
+        "code; fingerprints common to most of the class are ignored as template code."
+    )
+
+    return CallToolResult(content=[TextContent(type="text", text=output)])
+
+
+async def handle_show_page(
+    listing: str,
+    session_id: str,
+    page: Optional[int] = None,
+    page_size: Optional[int] = None,
+) -> CallToolResult:
+    """Show another page of a listing kept on the session
+
+    Pull requests are only ever fetched for the page shown, so their pages
+    go back to the pull request overview.
+    """
+    session = get_or_create_session(session_id)
+
+    if listing not in LISTINGS:
         return CallToolResult(
             content=[
                 TextContent(
                     type="text",
-                    text=f"Invalid assignment number. Please select between 1 and {len(session.assignments)}",
+                    text=f"Unknown listing '{listing}'. Choose one of: {', '.join(LISTINGS)}",
                 )
             ]
         )
 
-    # Get selected assignment
-    selected_assignment = session.assignments[assignment_number - 1]
-    session.selected_assignment = selected_assignment
-    session.current_step = "cloning_repos"
-
-    output = f"✅ Selected Assignment: {selected_assignment['title']}\n\n"
-    output += "📥 Cloning student repositories...\n"
-
-    # Clone student repositories
-    clone_result = run_gh_command(
-        ["classroom", "clone", "student-repos", "-a", str(selected_assignment["id"])],
-        capture_output=False,
+    page_size = page_size or session.pages.get(listing, {}).get(
+        "page_size", DEFAULT_PAGE_SIZE
     )
+    if listing == "pull_requests" and session.cloned_repos:
+        return await handle_pull_request_overview(
+            session_id, page=page, page_size=page_size
+        )
 
-    if not clone_result["success"]:
+    records = {
+        "classrooms": session.classrooms,
+        "assignments": session.assignments,
+        "students": session.cloned_repos,
+        "pull_requests": session.cloned_repos,
+        "checks": list(session.check_results.values()),
+    }[listing]
+    if not records:
         return CallToolResult(
             content=[
-                TextContent(
-                    type="text",
-                    text=f"Error cloning repositories: {clone_result['stderr']}",
-                )
+                TextContent(type="text", text=f"Nothing to show for '{listing}' yet.")
             ]
         )
 
-    # Get list of cloned repositories
-    cloned_dirs = [
-        d for d in Path.cwd().iterdir() if d.is_dir() and not d.name.startswith(".")
-    ]
-
-    # Store cloned repos in session
-    session.cloned_repos = []
-    for repo_dir in cloned_dirs:
-        session.cloned_repos.append(
-            {"name": repo_dir.name, "path": str(repo_dir.absolute())}
+    offset = page_offset(session, listing, page, page_size)
+    if listing == "classrooms":
+        output = "🏫 Available Classrooms:\n"
+        output += "======================\n\n"
+        output += render_page(
+            session, listing, records, format_classroom_item, offset, page_size
+        )
+    elif listing == "assignments":
+        output = "📚 Available Assignments:\n"
+        output += "========================\n\n"
+        output += render_page(
+            session, listing, records, format_assignment_item, offset, page_size
+        )
+    elif listing == "students":
+        output = "👥 Student Repositories:\n"
+        output += "=======================\n\n"
+        output += render_page(
+            session, listing, records, format_student_item, offset, page_size
         )
+    else:
+        output = f"🧪 Test Results ('{session.check_command}'):\n\n"
+        output += render_check_results(session, records, offset, page_size)
 
-    session.current_step = "selecting_student"
+    return CallToolResult(content=[TextContent(type="text", text=output)])
 
-    output += f"✅ Successfully cloned {len(session.cloned_repos)} repositories!\n\n"
-    output += "👥 Student Repositories:\n"
-    output += "=======================\n\n"
 
-    for i, repo in enumerate(session.cloned_repos, 1):
-        output += f"{i}. {repo['name']}\n"
+def format_job(job: Job, recent_events: int = 10) -> str:
+    """Describe a job's status, progress and (partial) results"""
+    output = f"📋 Job {job.job_id} ({job.kind}): {job.status}\n"
+    output += f"   {job.description}\n"
+    if job.total:
+        output += f"   Progress: {job.completed} of {job.total}\n"
+    if job.error:
+        output += f"   ❌ Error: {job.error}\n"
+    if job.events:
+        output += "   Recent events:\n"
+        for event in job.events[-recent_events:]:
+            output += f"   {event}\n"
+    if job.result:
+        output += f"\n{job.result}\n"
+    return output
 
-    output += "\n🔍 Call 'select_student' with the number to view their pull requests."
 
-    return CallToolResult(content=[TextContent(type="text", text=output)])
+async def handle_job_status(job_id: Optional[str], session_id: str) -> CallToolResult:
+    """Show one background job in detail, or list all of the session's jobs"""
+    session = get_or_create_session(session_id)
+
+    if job_id is None:
+        if not session.jobs:
+            return CallToolResult(
+                content=[TextContent(type="text", text="No background jobs.")]
+            )
+        output = "📋 Background Jobs:\n"
+        output += "==================\n\n"
+        for job in session.jobs.values():
+            output += f"{job.job_id}: {job.status} - {job.description}"
+            if job.total:
+                output += f" ({job.completed} of {job.total})"
+            output += "\n"
+        return CallToolResult(content=[TextContent(type="text", text=output)])
 
+    if job_id not in session.jobs:
+        return CallToolResult(
+            content=[TextContent(type="text", text=f"Unknown job: {job_id}")]
+        )
 
-async def handle_select_student(student_number: int, session_id: str) -> CallToolResult:
-    """Select a student and show their pull requests"""
+    return CallToolResult(
+        content=[TextContent(type="text", text=format_job(session.jobs[job_id]))]
+    )
+
+
+async def handle_cancel_job(job_id: str, session_id: str) -> CallToolResult:
+    """Cancel a running background job"""
     session = get_or_create_session(session_id)
 
-    if not hasattr(session, "cloned_repos") or not session.cloned_repos:
+    if job_id not in session.jobs:
         return CallToolResult(
-            content=[
-                TextContent(
-                    type="text",
-                    text="No student repositories available. Please select an assignment first.",
-                )
-            ]
+            content=[TextContent(type="text", text=f"Unknown job: {job_id}")]
         )
 
-    if student_number < 1 or student_number > len(session.cloned_repos):
+    job = session.jobs[job_id]
+    if job.task is None or job.task.done():
         return CallToolResult(
             content=[
                 TextContent(
-                    type="text",
-                    text=f"Invalid student number. Please select between 1 and {len(session.cloned_repos)}",
+                    type="text", text=f"Job {job_id} already finished: {job.status}"
                 )
             ]
         )
 
-    # Get selected student's repository
-    selected_repo = session.cloned_repos[student_number - 1]
-    repo_name = selected_repo["name"]
+    job.task.cancel()
+    try:
+        await job.task
+    except asyncio.CancelledError:
+        pass
 
-    output = f"✅ Selected Student: {repo_name}\n\n"
-    output += "🔍 Checking for pull requests...\n\n"
+    return CallToolResult(
+        content=[TextContent(type="text", text=f"🛑 Job {job_id} cancelled.")]
+    )
 
-    # Try to get pull requests for this repository
-    # Note: We need to determine the full repository name
-    # This might require additional logic to map cloned repo names to full GitHub repo names
 
-    # For now, let's show a message about the repository
-    output += f"📁 Repository: {repo_name}\n"
-    output += f" Path: {selected_repo['path']}\n\n"
+async def handle_workspace_usage(
+    reclaim: bool = False, quota_mb: Optional[float] = None
+) -> CallToolResult:
+    """Report the disk used by cloned assignments and optionally reclaim it"""
+    quota_mb = WORKSPACE_QUOTA_MB if quota_mb is None else quota_mb
+    if quota_mb < 0:
+        return CallToolResult(
+            content=[TextContent(type="text", text="quota_mb must be 0 or more")]
+        )
 
-    # Try to list PRs if we can determine the repo name
-    # This is a simplified approach - in practice you might need to parse the git remote
-    try:
-        # Change to the repository directory
-        original_dir = Path.cwd()
-        repo_path = Path(selected_repo["path"])
+    removed = []
+    if reclaim:
+        # Without a quota every workspace not being cloned into is removed
+        removed = await reclaim_workspaces(int(quota_mb * 1024 * 1024))
+
+    # Measuring every checkout walks the whole tree, so keep it off the event loop
+    loop = asyncio.get_running_loop()
+    workspaces, caches = await loop.run_in_executor(
+        None, lambda: (list_workspaces(), list_shared_caches())
+    )
+    shared = sum(cache["size_bytes"] for cache in caches)
+    total = sum(workspace["size_bytes"] for workspace in workspaces) + shared
+
+    output = f"💾 Workspace Usage ({workspace_root().absolute()}):\n"
+    output += "=======================\n\n"
+    if removed:
+        output += (
+            f"🧹 Removed {describe_removed(removed)}, reclaiming "
+            f"{format_size(sum(workspace['size_bytes'] for workspace in removed))}\n\n"
+        )
 
-        if repo_path.exists():
-            # Try to get git remote to determine full repo name
-            remote_result = subprocess.run(
-                ["git", "remote", "get-url", "origin"],
-                cwd=repo_path,
-                capture_output=True,
-                text=True,
+    if not workspaces:
+        output += "No cloned assignments on disk.\n"
+    else:
+        output += "| # | Session | Assignment | Repos | Size | Last used |\n"
+        output += "|---|---------|------------|-------|------|-----------|\n"
+        for i, workspace in enumerate(reversed(workspaces), 1):
+            last_used = workspace["last_used"][:16].replace("T", " ") or "unknown"
+            output += (
+                f"| {i} | {workspace['session']} | {workspace['assignment']} | "
+                f"{workspace['repos']} | {format_size(workspace['size_bytes'])} | {last_used} |\n"
             )
 
-            if remote_result.returncode == 0:
-                remote_url = remote_result.stdout.strip()
-                # Extract owner/repo from git URL
-                if "github.com" in remote_url:
-                    # Handle both SSH and HTTPS URLs
-                    if remote_url.startswith("git@"):
-                        repo_full_name = remote_url.split(":")[1].replace(".git", "")
-                    else:
-                        repo_full_name = remote_url.split("github.com/")[1].replace(
-                            ".git", ""
-                        )
-
-                    # List PRs for this repository
-                    pr_result = run_gh_command(
-                        [
-                            "pr",
-                            "list",
-                            "--repo",
-                            repo_full_name,
-                            "--json",
-                            "number,title,author,state,createdAt",
-                        ]
-                    )
+    if caches:
+        output += (
+            f"\n🪞 Template mirrors and cached check results: {format_size(shared)}\n"
+        )
+    output += f"\n📦 Total: {format_size(total)}"
+    if quota_mb:
+        output += f" of {format_size(int(quota_mb * 1024 * 1024))} quota"
+    output += "\n"
+    if not reclaim and quota_mb and total > quota_mb * 1024 * 1024:
+        output += "\n🧹 Call 'workspace_usage' with reclaim set to free space."
 
-                    if pr_result["success"]:
-                        try:
-                            prs = json.loads(pr_result["stdout"])
-                            if prs:
-                                output += " Pull Requests:\n"
-                                output += "================\n\n"
-
-                                for pr in prs:
-                                    output += f"#{pr['number']}: {pr['title']}\n"
-                                    output += f"   👤 Author: {pr['author']['login']}\n"
-                                    output += f"   📊 State: {pr['state']}\n"
-                                    output += f"   📅 Created: {pr['createdAt']}\n\n"
-                            else:
-                                output += (
-                                    "📋 No pull requests found for this repository.\n"
-                                )
-                        except json.JSONDecodeError:
-                            output += " Error parsing pull request data.\n"
-                    else:
-                        output += (
-                            f"📋 Error fetching pull requests: {pr_result['stderr']}\n"
-                        )
-                else:
-                    output += "📋 Could not determine GitHub repository name.\n"
-            else:
-                output += "📋 Could not get git remote information.\n"
-        else:
-            output += "📋 Repository directory not found.\n"
+    return CallToolResult(content=[TextContent(type="text", text=output)])
 
-    except Exception as e:
-        output += f"📋 Error checking pull requests: {str(e)}\n"
 
-    output += "\n🔄 Call 'reset_session' to start over with a new workflow."
+def busy_session_dirs() -> Set[str]:
+    """Directory names of sessions in use by a tool call or a running background job"""
+    busy_sessions = set(session_locks)
+    busy_sessions.update(
+        session_id for session_id in user_sessions if user_sessions.in_use(session_id)
+    )
+    return {session_dir_name(session_id) for session_id in busy_sessions}
+
+
+def busy_workspaces(session_dirs: Optional[Set[str]] = None) -> Set[str]:
+    """Workspaces of sessions in use by a tool call or a running background job
+
+    Session state is only safe to read on the event loop, so callers on a
+    worker thread pass session_dirs from busy_session_dirs().
+    """
+    if session_dirs is None:
+        session_dirs = busy_session_dirs()
+    return {
+        str(workspace["path"])
+        for workspace in list_workspaces()
+        if workspace["session"] in session_dirs
+    }
 
-    return CallToolResult(content=[TextContent(type="text", text=output)])
+
+async def reclaim_workspaces(
+    quota_bytes: int, protected: Iterable[str] = ()
+) -> List[Dict[str, Any]]:
+    """Run collect_workspace_garbage on a worker thread, sparing busy sessions"""
+    session_dirs = busy_session_dirs()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None,
+        lambda: collect_workspace_garbage(
+            quota_bytes, busy_workspaces(session_dirs) | set(protected)
+        ),
+    )
+
+
+def cancel_session_jobs(session: UserSession) -> None:
+    """Stop every background job still running for a session"""
+    for job in session.jobs.values():
+        if job.task is not None and not job.task.done():
+            job.task.cancel()
+
+
+def _remove_session_dir(session_dir: Path) -> List[Dict[str, Any]]:
+    """Delete a session's workspaces and return what they were"""
+    freed = [
+        workspace
+        for workspace in list_workspaces()
+        if workspace["path"].parent == session_dir
+    ]
+    shutil.rmtree(session_dir, ignore_errors=True)
+    return freed
 
 
 async def handle_reset_session(session_id: str) -> CallToolResult:
-    """Reset the session and start over"""
+    """Reset the session, remove its cloned repositories and start over"""
     if session_id in user_sessions:
-        del user_sessions[session_id]
+        session = user_sessions[session_id]
+        cancel_session_jobs(session)
+        # Let cancelled clones stop before their checkouts are deleted
+        await asyncio.gather(
+            *(job.task for job in session.jobs.values() if job.task is not None),
+            return_exceptions=True,
+        )
+    # The session may only be stored, after a restart or an eviction
+    user_sessions.remove(session_id)
+
+    session_dir = workspace_root().absolute() / session_dir_name(session_id)
+    loop = asyncio.get_running_loop()
+    freed = await loop.run_in_executor(None, _remove_session_dir, session_dir)
 
     output = "🔄 Session reset successfully!\n\n"
+    if freed:
+        output += (
+            f"🧹 Removed {len(freed)} assignment workspaces "
+            f"({format_size(sum(workspace['size_bytes'] for workspace in freed))})\n\n"
+        )
     output += "🏫 Call 'start_classroom_workflow' to begin a new workflow."
 
     return CallToolResult(content=[TextContent(type="text", text=output)])
@@ -550,19 +4512,22 @@ async def handle_reset_session(session_id: str) -> CallToolResult:
 
 async def main():
     """Main function to run the MCP server"""
-    async with stdio_server() as (read_stream, write_stream):
-        await server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="github-classroom-mcp",
-                server_version="1.0.0",
-                capabilities=server.get_capabilities(
-                    notification_options=None,
-                    experimental_capabilities=None,
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await server.run(
+                read_stream,
+                write_stream,
+                InitializationOptions(
+                    server_name="github-classroom-mcp",
+                    server_version="1.0.0",
+                    capabilities=server.get_capabilities(
+                        notification_options=None,
+                        experimental_capabilities=None,
+                    ),
                 ),
-            ),
-        )
+            )
+    finally:
+        await close_gh_http_client()
 
 
 if __name__ == "__main__":
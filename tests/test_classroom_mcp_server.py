@@ -5,7 +5,36 @@ Test suite for the GitHub Classroom MCP Server
 
 from exercise_checker_mcp.classroom_mcp_server import (
     UserSession,
-    run_gh_command,
+    SessionLocks,
+    session_locks,
+    run_command_async,
+    run_gh_command_async,
+    CloneOptions,
+    parse_student_repos,
+    clone_student_repos,
+    sync_manifest_path,
+    assignment_workspace,
+    CheckOptions,
+    handle_check_exercises,
+    parse_test_counts,
+    check_suite_hash,
+    find_similar_pairs,
+    handle_similarity_report,
+    tokenize_source,
+    winnow,
+    handle_show_page,
+    render_page,
+    json_page,
+    run_exercise_check,
+    run_exercise_checks,
+    ensure_reference_mirror,
+    collect_workspace_garbage,
+    handle_workspace_usage,
+    list_workspaces,
+    load_sync_manifest,
+    save_sync_manifest,
+    update_sync_manifest,
+    validate_clone_options,
     get_or_create_session,
     handle_list_tools,
     handle_call_tool,
@@ -14,19 +43,58 @@ from exercise_checker_mcp.classroom_mcp_server import (
     handle_select_assignment,
     handle_select_student,
     handle_reset_session,
-    user_sessions
+    user_sessions,
+    TTLCache,
+    gh_cache,
+    GitHubRateLimiter,
+    is_rate_limited,
+    GitHubHTTPClient,
+    close_gh_http_client,
+    prefetch_pull_requests,
+    pr_prefetch_cache,
+    run_gh_command_cached,
+    parse_github_repo_full_name,
+    summarize_pull_requests,
+    handle_pull_request_overview,
+    build_pull_request_query,
+    fetch_pull_requests,
+    read_origin_url,
+    index_cloned_repos,
+    SessionStore,
+    SQLiteSessionBackend,
+    session_to_dict,
+    session_from_dict,
+    ProgressReporter,
+    format_progress_event,
+    handle_job_status,
+    handle_cancel_job,
+    Job,
 )
+from mcp.server.lowlevel.server import request_ctx
+from mcp.types import CallToolResult, TextContent
 
 import asyncio
 import json
 import pytest
+import re
 import subprocess
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dataclasses import replace
 from unittest.mock import Mock, patch, AsyncMock
 from pathlib import Path
+from datetime import datetime, timedelta
 import sys
 import os
 
 
+@pytest.fixture(autouse=True)
+def no_prefetch(monkeypatch):
+    """Keep background prefetches from issuing gh calls tests do not expect"""
+    monkeypatch.setattr("exercise_checker_mcp.classroom_mcp_server.PREFETCH_ENABLED", False)
+
+
 class TestUserSession:
     """Test the UserSession dataclass"""
 
@@ -40,34 +108,573 @@ class TestUserSession:
         assert session.cloned_repos == []
         assert session.current_step == "selecting_classroom"
         assert session.created_at is not None
+        assert session.clone_profile is None
+        assert session.sparse_paths == []
 
 class TestGitHubCommands:
     """Test GitHub CLI command execution"""
     
-    @patch('subprocess.run')
-    def test_run_gh_command_success(self, mock_run):
-        """Test successful GitHub CLI command execution"""
-        # Mock successful command execution
-        mock_result = Mock()
-        mock_result.stdout = '{"id": 123, "name": "test"}'
-        mock_result.stderr = ""
-        mock_result.returncode = 0
-        mock_run.return_value = mock_result
-        
-        result = run_gh_command(["classroom", "list"])
-        
+    @pytest.mark.asyncio
+    async def test_run_command_async_success(self):
+        """Test running a command without blocking the event loop"""
+        result = await run_command_async([sys.executable, "-c", "print('hello')"])
+
         assert result["success"] is True
-        assert result["stdout"] == '{"id": 123, "name": "test"}'
+        assert result["stdout"].strip() == "hello"
         assert result["returncode"] == 0
-        mock_run.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_run_command_async_failure(self):
+        """Test a failing command keeps the result dict contract"""
+        result = await run_command_async(
+            [sys.executable, "-c", "import sys; sys.stderr.write('boom'); sys.exit(3)"]
+        )
+
+        assert result["success"] is False
+        assert result["stderr"] == "boom"
+        assert result["returncode"] == 3
+
+    @pytest.mark.asyncio
+    async def test_run_command_async_timeout(self):
+        """Test that a command exceeding its timeout is killed"""
+        result = await run_command_async(
+            [sys.executable, "-c", "import time; time.sleep(30)"], timeout=0.2
+        )
+
+        assert result["success"] is False
+        assert "timed out" in result["stderr"]
+
+    @pytest.mark.asyncio
+    async def test_run_command_async_timeout_kills_background_children(self):
+        """Test that a child left running in the background does not outlive the timeout"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await run_command_async(["sh", "-c", "sleep 30 & sleep 30"], timeout=0.5)
+
+        assert "timed out" in result["stderr"]
+        assert loop.time() - started < 5
+
+    @pytest.mark.asyncio
+    async def test_run_command_async_cancellation(self):
+        """Test that cancelling the caller kills the subprocess"""
+        task = asyncio.create_task(
+            run_command_async([sys.executable, "-c", "import time; time.sleep(30)"])
+        )
+        await asyncio.sleep(0.2)
+        task.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    @pytest.mark.asyncio
+    async def test_run_gh_command_async_not_found(self):
+        """Test the friendly message when gh is missing"""
+        with patch('asyncio.create_subprocess_exec', side_effect=FileNotFoundError):
+            result = await run_gh_command_async(["classroom", "list"])
+
+        assert result["success"] is False
+        assert "GitHub CLI (gh) not found" in result["stderr"]
+
+    @pytest.mark.asyncio
+    async def test_missing_working_directory_is_not_a_missing_command(self, tmp_path):
+        """Test that a missing cwd is reported as such, not as a missing executable"""
+        result = await run_command_async([sys.executable, "-c", "pass"], cwd=str(tmp_path / "gone"))
+
+        assert result["success"] is False
+        assert "Working directory not found" in result["stderr"]
+
+        entry = await run_exercise_check(
+            {"name": "gone", "path": str(tmp_path / "gone"), "status": "cloned"},
+            [sys.executable, "-m", "pytest"],
+            CheckOptions(),
+        )
+        assert entry["status"] == "skipped"
+        assert entry["error"] == "repository directory not found"
+
+    @pytest.mark.asyncio
+    async def test_concurrent_commands_overlap(self):
+        """Test that several commands run at the same time"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        results = await asyncio.gather(*[
+            run_command_async([sys.executable, "-c", "import time; time.sleep(0.5)"])
+            for _ in range(4)
+        ])
+
+        assert all(result["success"] for result in results)
+        assert loop.time() - started < 2.0
  
 
+def make_git_repo(path):
+    """Create a local git repository with one commit"""
+    path.mkdir(parents=True)
+    for cmd in (
+        ["git", "init", "-q"],
+        ["git", "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "--allow-empty", "-m", "init"],
+    ):
+        subprocess.run(cmd, cwd=path, check=True)
+    return path
+
+
+class TestCloneEngine:
+    """Test the parallel student repository clone engine"""
+
+    def test_parse_student_repos(self):
+        """Test extracting clone targets from accepted assignments"""
+        repos = parse_student_repos([
+            {"repository": {"full_name": "org/zed-repo"}},
+            {"repository": {"full_name": "org/amy-repo", "html_url": "https://example.com/org/amy-repo"}},
+            {"repository": None},
+        ])
+
+        assert [repo["name"] for repo in repos] == ["amy-repo", "zed-repo"]
+        assert repos[0]["clone_url"] == "https://example.com/org/amy-repo.git"
+        assert repos[1]["clone_url"] == "https://github.com/org/zed-repo.git"
+
+    @pytest.mark.asyncio
+    async def test_clone_student_repos_with_git(self, tmp_path):
+        """Test cloning real local repositories and reporting each outcome"""
+        source = make_git_repo(tmp_path / "remote" / "student1-repo")
+        repos = [
+            {"name": "student1-repo", "full_name": "org/student1-repo", "clone_url": str(source)},
+            {"name": "missing-repo", "full_name": "org/missing-repo",
+             "clone_url": str(tmp_path / "remote" / "missing-repo")},
+        ]
+        dest = tmp_path / "clones"
+        dest.mkdir()
+
+        results = await clone_student_repos(repos, dest, CloneOptions(retries=0))
+
+        assert results[0]["status"] == "cloned"
+        assert (dest / "student1-repo" / ".git").is_dir()
+        assert results[1]["status"] == "failed"
+        assert results[1]["error"]
+        assert not (dest / "missing-repo").exists()
+
+    @pytest.mark.asyncio
+    async def test_clone_concurrency_is_bounded(self, tmp_path):
+        """Test that no more than the configured number of clones run at once"""
+        running = 0
+        peak = 0
+
+        async def fake_clone(cmd, **kwargs):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+            return {"success": True, "stdout": "", "stderr": "", "returncode": 0}
+
+        repos = [
+            {"name": f"repo{i}", "full_name": f"org/repo{i}", "clone_url": f"url{i}"}
+            for i in range(10)
+        ]
+        with patch('exercise_checker_mcp.classroom_mcp_server.run_command_async',
+                   side_effect=fake_clone):
+            results = await clone_student_repos(repos, tmp_path, CloneOptions(concurrency=3))
+
+        assert peak == 3
+        assert [repo["name"] for repo in results] == [repo["name"] for repo in repos]
+
+    @pytest.mark.asyncio
+    async def test_clone_retries_then_succeeds(self, tmp_path):
+        """Test that a transient clone failure is retried"""
+        outcomes = [
+            {"success": False, "stdout": "", "stderr": "network error", "returncode": 128},
+            {"success": True, "stdout": "", "stderr": "", "returncode": 0},
+            # git rev-parse HEAD
+            {"success": True, "stdout": "abc123\n", "stderr": "", "returncode": 0},
+        ]
+        repos = [{"name": "repo", "full_name": "org/repo", "clone_url": "url"}]
+        with patch('exercise_checker_mcp.classroom_mcp_server.run_command_async',
+                   side_effect=outcomes):
+            results = await clone_student_repos(
+                repos, tmp_path, CloneOptions(retries=2, retry_delay=0)
+            )
+
+        assert results[0]["status"] == "cloned"
+        assert results[0]["attempts"] == 2
+        assert results[0]["error"] is None
+        assert results[0]["sha"] == "abc123"
+
+    @pytest.mark.asyncio
+    async def test_incremental_sync_skips_unchanged_and_fetches_updates(self, tmp_path):
+        """Test that re-syncing skips unchanged repos and updates changed ones"""
+        source = make_git_repo(tmp_path / "remote" / "student1-repo")
+        repos = [{"name": "student1-repo", "full_name": "org/student1-repo", "clone_url": str(source)}]
+        dest = tmp_path / "clones"
+        dest.mkdir()
+        manifest_path = sync_manifest_path(dest)
+
+        first = await clone_student_repos(repos, dest, CloneOptions(retries=0))
+        manifest = update_sync_manifest(load_sync_manifest(manifest_path), first)
+        save_sync_manifest(manifest_path, manifest)
+        assert first[0]["status"] == "cloned"
+
+        synced_shas = {name: repo["sha"] for name, repo in load_sync_manifest(manifest_path)["repos"].items()}
+        second = await clone_student_repos(repos, dest, CloneOptions(retries=0), synced_shas)
+        assert second[0]["status"] == "unchanged"
+        assert second[0]["sha"] == first[0]["sha"]
+
+        subprocess.run(
+            ["git", "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "--allow-empty", "-m", "update"],
+            cwd=source, check=True,
+        )
+        third = await clone_student_repos(repos, dest, CloneOptions(retries=0), synced_shas)
+        assert third[0]["status"] == "updated"
+        assert third[0]["sha"] != first[0]["sha"]
+
+    @pytest.mark.asyncio
+    async def test_clone_borrows_objects_from_template_mirror(self, tmp_path, monkeypatch):
+        """Test that student clones reference the shared bare mirror of the template"""
+        monkeypatch.setattr("exercise_checker_mcp.classroom_mcp_server.WORKSPACE_ROOT", str(tmp_path / "workspace"))
+        template = make_git_repo(tmp_path / "remote" / "template")
+        student = tmp_path / "remote" / "student1-repo"
+        subprocess.run(["git", "clone", "-q", str(template), str(student)], check=True)
+        subprocess.run(
+            ["git", "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "--allow-empty", "-m", "solution"],
+            cwd=student, check=True,
+        )
+
+        options = CloneOptions(retries=0)
+        mirror = await ensure_reference_mirror({"full_name": "org/template", "clone_url": str(template)}, options)
+        assert mirror == tmp_path / "workspace" / ".mirrors" / "org_template.git"
+        assert await ensure_reference_mirror({"full_name": "org/template", "clone_url": str(template)}, options) == mirror
+        for key, value in (("gc.auto", "0"), ("gc.pruneExpire", "never")):
+            config = subprocess.run(["git", "config", key], cwd=mirror, capture_output=True, text=True)
+            assert config.stdout.strip() == value
+
+        repos = [{"name": "student1-repo", "full_name": "org/student1-repo", "clone_url": f"file://{student}"}]
+        results = await clone_student_repos(repos, tmp_path / "clones", replace(options, reference=str(mirror)))
+
+        assert results[0]["status"] == "cloned"
+        alternates = tmp_path / "clones" / "student1-repo" / ".git" / "objects" / "info" / "alternates"
+        assert str(mirror) in alternates.read_text()
+
+    @pytest.mark.asyncio
+    async def test_full_sync_reclones(self, tmp_path):
+        """Test that full sync mode re-clones repos already on disk"""
+        source = make_git_repo(tmp_path / "remote" / "student1-repo")
+        repos = [{"name": "student1-repo", "full_name": "org/student1-repo", "clone_url": str(source)}]
+        dest = tmp_path / "clones"
+        dest.mkdir()
+
+        await clone_student_repos(repos, dest, CloneOptions(retries=0))
+        results = await clone_student_repos(repos, dest, CloneOptions(retries=0, sync_mode="full"))
+
+        assert results[0]["status"] == "cloned"
+        assert (dest / "student1-repo" / ".git").is_dir()
+
+    @pytest.mark.asyncio
+    async def test_shallow_profile_clones_latest_commit_only(self, tmp_path):
+        """Test that the shallow profile skips history"""
+        source = make_git_repo(tmp_path / "remote" / "student1-repo")
+        subprocess.run(
+            ["git", "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "--allow-empty", "-m", "second"],
+            cwd=source, check=True,
+        )
+        repos = [{"name": "student1-repo", "full_name": "org/student1-repo", "clone_url": source.as_uri()}]
+        dest = tmp_path / "clones"
+        dest.mkdir()
+
+        results = await clone_student_repos(repos, dest, CloneOptions(retries=0, profile="shallow"))
+
+        assert results[0]["status"] == "cloned"
+        count = subprocess.run(
+            ["git", "rev-list", "--count", "HEAD"], cwd=dest / "student1-repo",
+            capture_output=True, text=True, check=True,
+        )
+        assert count.stdout.strip() == "1"
+
+    @pytest.mark.asyncio
+    async def test_sparse_profile_checks_out_only_requested_paths(self, tmp_path):
+        """Test that the sparse profile limits the working tree to exercise paths"""
+        source = make_git_repo(tmp_path / "remote" / "student1-repo")
+        (source / "exercise").mkdir()
+        (source / "exercise" / "solution.py").write_text("print('hi')\n")
+        (source / "other").mkdir()
+        (source / "other" / "big.txt").write_text("data\n")
+        subprocess.run(["git", "add", "."], cwd=source, check=True)
+        subprocess.run(
+            ["git", "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "-m", "files"],
+            cwd=source, check=True,
+        )
+        repos = [{"name": "student1-repo", "full_name": "org/student1-repo", "clone_url": source.as_uri()}]
+        dest = tmp_path / "clones"
+        dest.mkdir()
+
+        results = await clone_student_repos(
+            repos, dest, CloneOptions(retries=0, profile="sparse", sparse_paths=["exercise"])
+        )
+
+        assert results[0]["status"] == "cloned"
+        assert (dest / "student1-repo" / "exercise" / "solution.py").exists()
+        assert not (dest / "student1-repo" / "other").exists()
+
+    def test_validate_clone_options(self):
+        """Test rejecting unusable clone profiles"""
+        assert validate_clone_options(CloneOptions()) is None
+        assert "Unknown clone profile" in validate_clone_options(CloneOptions(profile="tiny"))
+        assert "sparse_paths" in validate_clone_options(CloneOptions(profile="sparse"))
+        assert "Unknown sync mode" in validate_clone_options(CloneOptions(sync_mode="fast"))
+
+    def test_validate_clone_options_rejects_unusable_limits(self):
+        """Test rejecting limits that would clone nothing or time out every clone"""
+        assert validate_clone_options(CloneOptions(concurrency=0)) == "concurrency must be at least 1"
+        assert validate_clone_options(CloneOptions(retries=-1)) == "retries must be 0 or more"
+        assert validate_clone_options(CloneOptions(retries=0)) is None
+        assert validate_clone_options(CloneOptions(timeout=0)) == "timeout must be greater than 0"
+        assert validate_clone_options(CloneOptions(retry_delay=-1)) == "retry_delay must be greater than 0"
+
+    @pytest.mark.asyncio
+    async def test_progress_events_for_each_repo(self, tmp_path):
+        """Test that a progress event is emitted as each repository finishes"""
+        source = make_git_repo(tmp_path / "remote" / "student1-repo")
+        repos = [
+            {"name": "student1-repo", "full_name": "org/student1-repo", "clone_url": str(source)},
+            {"name": "missing-repo", "full_name": "org/missing-repo",
+             "clone_url": str(tmp_path / "remote" / "missing-repo")},
+        ]
+        dest = tmp_path / "clones"
+        dest.mkdir()
+        events = []
+
+        async def record(event):
+            events.append(event)
+
+        await clone_student_repos(repos, dest, CloneOptions(retries=0), on_progress=record)
+
+        assert [event["completed"] for event in events] == [1, 2]
+        assert all(event["total"] == 2 for event in events)
+        cloned = next(event for event in events if event["repo"]["status"] == "cloned")
+        assert cloned["bytes"] > 0
+        assert events[-1]["total_bytes"] == cloned["bytes"]
+        assert "[" in format_progress_event(events[0])
+
+    def test_sync_manifest_keeps_first_sync_time_for_unchanged_repos(self, tmp_path):
+        """Test manifest bookkeeping and tolerance of a corrupt file"""
+        manifest_path = tmp_path / "manifest.json"
+        manifest_path.write_text("not json")
+        manifest = load_sync_manifest(manifest_path)
+        assert manifest == {"repos": {}}
+
+        manifest["repos"]["repo"] = {"sha": "abc", "synced_at": "2024-01-01T00:00:00"}
+        update_sync_manifest(manifest, [
+            {"name": "repo", "status": "unchanged", "sha": "abc"},
+            {"name": "broken", "status": "failed", "sha": None},
+        ])
+
+        assert manifest["repos"]["repo"]["synced_at"] == "2024-01-01T00:00:00"
+        assert "broken" not in manifest["repos"]
+
+
+class TestListingCache:
+    """Test the TTL cache in front of gh listings"""
+
+    def setup_method(self):
+        """Clear cached gh listings before each test"""
+        gh_cache.invalidate()
+
+    def test_ttl_cache_expiry_and_invalidation(self):
+        """Test that entries expire after the TTL and can be invalidated by prefix"""
+        now = [0.0]
+        cache = TTLCache(ttl=10, clock=lambda: now[0])
+        cache.set(("classroom", "list"), "classrooms")
+        cache.set(("classroom", "list-assignments", "1"), "assignments")
+
+        assert cache.get(("classroom", "list")) == "classrooms"
+        assert cache.invalidate(("classroom", "list-assignments")) == 1
+        assert cache.get(("classroom", "list-assignments", "1")) is None
+
+        now[0] = 10.0
+        assert cache.get(("classroom", "list")) is None
+        assert len(cache) == 0
+
+    @pytest.mark.asyncio
+    @patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async', new_callable=AsyncMock)
+    async def test_cached_command_reuses_successful_results(self, mock_run_gh):
+        """Test that repeated listings spawn gh once and refresh forces a new call"""
+        mock_run_gh.return_value = {"success": True, "stdout": "[]", "stderr": "", "returncode": 0}
+
+        await run_gh_command_cached(["classroom", "list"])
+        await run_gh_command_cached(["classroom", "list"])
+        assert mock_run_gh.await_count == 1
+
+        await run_gh_command_cached(["classroom", "list"], refresh=True)
+        assert mock_run_gh.await_count == 2
+
+    @pytest.mark.asyncio
+    @patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async', new_callable=AsyncMock)
+    async def test_cached_command_does_not_cache_failures(self, mock_run_gh):
+        """Test that failed gh calls are retried on the next request"""
+        mock_run_gh.return_value = {"success": False, "stdout": "", "stderr": "offline", "returncode": 1}
+
+        await run_gh_command_cached(["classroom", "list"])
+        await run_gh_command_cached(["classroom", "list"])
+
+        assert mock_run_gh.await_count == 2
+
+    @pytest.mark.asyncio
+    @patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async', new_callable=AsyncMock)
+    async def test_listing_survives_session_reset(self, mock_run_gh):
+        """Test that a restarted workflow reuses the warm classroom listing"""
+        mock_run_gh.return_value = {
+            "success": True,
+            "stdout": json.dumps([{"id": 1, "name": "py", "title": "Python"}]),
+            "stderr": "",
+            "returncode": 0
+        }
+
+        await handle_start_workflow("grader")
+        await handle_reset_session("grader")
+        result = await handle_start_workflow("grader")
+
+        assert "Python" in result.content[0].text
+        assert mock_run_gh.await_count == 1
+
+
+class FakeClock:
+    """Monotonic clock whose sleeps advance time instantly"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestRateLimiter:
+    """Test pacing of GitHub API calls"""
+
+    @pytest.mark.asyncio
+    async def test_token_bucket_paces_calls_after_burst(self):
+        """Test that calls beyond the burst wait for tokens to refill"""
+        clock = FakeClock()
+        limiter = GitHubRateLimiter(rate=2, burst=2, clock=clock, sleep=clock.sleep)
+
+        waits = [await limiter.acquire() for _ in range(4)]
+
+        assert waits[:2] == [0, 0]
+        assert waits[2] == pytest.approx(0.5)
+        assert waits[3] == pytest.approx(0.5)
+        assert limiter.metrics["calls"] == 4
+
+    @pytest.mark.asyncio
+    async def test_bulk_calls_leave_reserve_for_interactive(self):
+        """Test that bulk calls wait for the quota reset once only the reserve is left"""
+        clock = FakeClock()
+        limiter = GitHubRateLimiter(
+            rate=100, burst=10, reserve=5, clock=clock, sleep=clock.sleep
+        )
+        limiter.update_quota("core", 5, reset_in=30)
+
+        assert await limiter.acquire("interactive") == 0
+        assert await limiter.acquire("bulk") == pytest.approx(30)
+        # Another resource's quota is unaffected
+        assert await limiter.acquire("bulk", "graphql") == 0
+
+    @pytest.mark.asyncio
+    async def test_throttled_call_is_retried_with_backoff(self):
+        """Test that a rate limited gh call is retried and slows the limiter down"""
+        clock = FakeClock()
+        limiter = GitHubRateLimiter(rate=10, clock=clock, sleep=clock.sleep)
+        outcomes = [
+            {"success": False, "stdout": "", "returncode": 1,
+             "stderr": "gh: You have exceeded a secondary rate limit (HTTP 403)"},
+            # gh api rate_limit
+            {"success": False, "stdout": "", "stderr": "offline", "returncode": 1},
+            {"success": True, "stdout": "[]", "stderr": "", "returncode": 0},
+        ]
+        with patch('exercise_checker_mcp.classroom_mcp_server.gh_rate_limiter', limiter), \
+             patch('exercise_checker_mcp.classroom_mcp_server.run_command_async',
+                   side_effect=outcomes):
+            result = await run_gh_command_async(["classroom", "list"])
+
+        assert result["success"]
+        assert limiter.metrics["throttled"] == 1
+        assert limiter.metrics["wait_seconds"] == pytest.approx(1.0)
+        assert limiter.rate < 10
+
+    @pytest.mark.asyncio
+    async def test_partial_data_mentioning_rate_limits_is_not_throttling(self):
+        """Test that only stderr and GraphQL error types signal a rate limit"""
+        clock = FakeClock()
+        limiter = GitHubRateLimiter(rate=10, clock=clock, sleep=clock.sleep)
+        payload = {
+            "data": {"r0": {"pullRequests": {"nodes": [{"title": "Add rate limit handling"}]}},
+                     "r1": None},
+            "errors": [{"type": "NOT_FOUND", "path": ["r1"], "message": "Could not resolve to a Repository"}],
+        }
+        failed = {"success": False, "stdout": json.dumps(payload), "returncode": 1,
+                  "stderr": "gh: Could not resolve to a Repository"}
+        with patch('exercise_checker_mcp.classroom_mcp_server.gh_rate_limiter', limiter), \
+             patch('exercise_checker_mcp.classroom_mcp_server.run_command_async',
+                   new_callable=AsyncMock, return_value=failed) as mock_run:
+            await run_gh_command_async(["api", "graphql", "-f", "query=..."])
+
+        assert mock_run.await_count == 1
+        assert limiter.metrics["throttled"] == 0
+        assert limiter.rate == 10
+
+        payload["errors"][0]["type"] = "RATE_LIMITED"
+        assert is_rate_limited(dict(failed, stdout=json.dumps(payload), stderr=""))
+
+    @pytest.mark.asyncio
+    async def test_drained_quota_waits_for_reset(self):
+        """Test that bulk calls wait for a drained quota to reset"""
+        clock = FakeClock()
+        limiter = GitHubRateLimiter(rate=10, clock=clock, sleep=clock.sleep)
+        reset = int(datetime.now().timestamp()) + 120
+        quota = {"resources": {
+            "core": {"remaining": 0, "reset": reset},
+            "graphql": {"remaining": 4000, "reset": reset},
+        }}
+        outcomes = [
+            {"success": False, "stdout": "", "returncode": 1,
+             "stderr": "gh: API rate limit exceeded for user ID 1. (HTTP 403)"},
+            {"success": True, "stdout": json.dumps(quota), "stderr": "", "returncode": 0},
+            {"success": True, "stdout": "[]", "stderr": "", "returncode": 0},
+        ]
+        limiter.update_quota("core", 1000, 3600)
+        with patch('exercise_checker_mcp.classroom_mcp_server.gh_rate_limiter', limiter), \
+             patch('exercise_checker_mcp.classroom_mcp_server.run_command_async',
+                   side_effect=outcomes):
+            result = await run_gh_command_async(["classroom", "list"], priority="bulk")
+
+        assert result["success"]
+        assert 110 < clock.now <= 121
+
+    @pytest.mark.asyncio
+    async def test_interactive_call_fails_fast_on_drained_quota(self):
+        """Test that interactive calls report the reset instead of waiting for it"""
+        clock = FakeClock()
+        limiter = GitHubRateLimiter(rate=10, clock=clock, sleep=clock.sleep)
+        limiter.update_quota("core", 0, 1800)
+        with patch('exercise_checker_mcp.classroom_mcp_server.gh_rate_limiter', limiter), \
+             patch('exercise_checker_mcp.classroom_mcp_server.run_command_async',
+                   new_callable=AsyncMock) as mock_run:
+            result = await run_gh_command_async(["classroom", "list"])
+
+        assert not result["success"]
+        assert "resets at" in result["stderr"]
+        assert clock.now == 0
+        mock_run.assert_not_awaited()
+
+        # A reset close enough is still waited for
+        limiter.update_quota("core", 0, 10)
+        assert await limiter.acquire() == pytest.approx(10)
+
+
 class TestSessionManagement:
     """Test session management functions"""
     
     def setup_method(self):
-        """Clear user_sessions before each test"""
+        """Clear user_sessions and cached gh listings before each test"""
         user_sessions.clear()
+        gh_cache.invalidate()
     
     def test_get_or_create_session_new(self):
         """Test creating a new session"""
@@ -88,6 +695,317 @@ class TestSessionManagement:
         assert retrieved_session == original_session
         assert len(user_sessions) == 1
 
+class TestSessionStore:
+    """Test session eviction and bounds"""
+
+    def test_lru_eviction_when_full(self):
+        """Test that the least recently used session is evicted first"""
+        store = SessionStore(max_sessions=2, idle_ttl=3600)
+        store.get_or_create("a")
+        store.get_or_create("b")
+        store.get_or_create("a")
+        store.get_or_create("c")
+
+        assert "a" in store
+        assert "b" not in store
+        assert "c" in store
+        assert store.metrics["evicted_lru"] == 1
+        assert store.metrics["created"] == 3
+
+    @pytest.mark.asyncio
+    async def test_sessions_in_use_are_not_evicted(self):
+        """Test that locked sessions and sessions with running jobs survive eviction"""
+        now = [datetime(2024, 1, 1, 12, 0)]
+        store = SessionStore(max_sessions=2, idle_ttl=60, clock=lambda: now[0])
+        working = store.get_or_create("working")
+        job = Job(job_id="job-1", kind="clone", description="Clone repositories")
+        job.task = asyncio.ensure_future(asyncio.sleep(30))
+        working.jobs[job.job_id] = job
+        store.get_or_create("locked")
+
+        try:
+            async with session_locks.hold("locked"):
+                now[0] += timedelta(seconds=120)
+                store.get_or_create("new")
+
+                assert "working" in store
+                assert "locked" in store
+                assert store.metrics["evicted_idle"] == 0
+                assert store.metrics["evicted_lru"] == 0
+
+            store.get_or_create("newer")
+            assert "locked" not in store
+            assert "working" in store
+        finally:
+            job.task.cancel()
+
+    def test_idle_sessions_expire(self):
+        """Test that sessions untouched for longer than the TTL are dropped"""
+        now = [datetime(2024, 1, 1, 12, 0)]
+        store = SessionStore(max_sessions=10, idle_ttl=60, clock=lambda: now[0])
+        store.get_or_create("idle")
+        now[0] += timedelta(seconds=30)
+        store.get_or_create("active")
+
+        now[0] += timedelta(seconds=45)
+        store.get_or_create("active")
+
+        assert "idle" not in store
+        assert "active" in store
+        assert store.metrics["evicted_idle"] == 1
+
+    def test_access_refreshes_last_accessed(self):
+        """Test that reusing a session keeps it alive and returns the same object"""
+        now = [datetime(2024, 1, 1, 12, 0)]
+        store = SessionStore(max_sessions=10, idle_ttl=60, clock=lambda: now[0])
+        session = store.get_or_create("grader")
+        now[0] += timedelta(seconds=50)
+
+        assert store.get_or_create("grader") is session
+        assert session.last_accessed == now[0]
+
+    def test_explicit_removal_is_counted(self):
+        """Test removing a session outside of eviction"""
+        store = SessionStore(max_sessions=10, idle_ttl=60)
+        store.get_or_create("grader")
+        del store["grader"]
+
+        assert len(store) == 0
+        assert store.metrics["removed"] == 1
+
+
+class TestSessionLocks:
+    """Test that tool calls on one session are serialized"""
+
+    def setup_method(self):
+        """Clear user_sessions before each test"""
+        user_sessions.clear()
+
+    @pytest.mark.asyncio
+    async def test_calls_on_one_session_run_one_at_a_time(self):
+        """Test that overlapping calls on a session do not interleave but other sessions run"""
+        events = []
+
+        async def fake_dispatch(name, arguments):
+            events.append(("start", arguments["session_id"], name))
+            await asyncio.sleep(0.05)
+            events.append(("end", arguments["session_id"], name))
+            return CallToolResult(content=[TextContent(type="text", text=name)])
+
+        with patch('exercise_checker_mcp.classroom_mcp_server.dispatch_tool_call', side_effect=fake_dispatch):
+            await asyncio.gather(
+                handle_call_tool("select_assignment", {"session_id": "a"}),
+                handle_call_tool("select_student", {"session_id": "a"}),
+                handle_call_tool("select_student", {"session_id": "b"}),
+            )
+
+        a_events = [event for event in events if event[1] == "a"]
+        assert a_events == [
+            ("start", "a", "select_assignment"), ("end", "a", "select_assignment"),
+            ("start", "a", "select_student"), ("end", "a", "select_student"),
+        ]
+        # Session b started while session a's first call was still running
+        assert events.index(("start", "b", "select_student")) < events.index(("end", "a", "select_assignment"))
+        assert len(session_locks) == 0
+
+    @pytest.mark.asyncio
+    async def test_job_status_does_not_wait_for_session_lock(self):
+        """Test that read-only job tools are answered while the session is busy"""
+        locks = SessionLocks()
+        with patch('exercise_checker_mcp.classroom_mcp_server.session_locks', locks):
+            async with locks.hold("default"):
+                result = await asyncio.wait_for(handle_call_tool("job_status", {}), timeout=1)
+
+        assert "No background jobs" in result.content[0].text
+
+    @pytest.mark.asyncio
+    async def test_lock_wait_is_measured(self):
+        """Test that contended acquisitions and their wait times are recorded"""
+        locks = SessionLocks()
+
+        async def hold_briefly():
+            async with locks.hold("grader"):
+                await asyncio.sleep(0.05)
+
+        first = asyncio.ensure_future(hold_briefly())
+        await asyncio.sleep(0)
+        async with locks.hold("grader") as waited:
+            assert waited >= 0.04
+        await first
+
+        assert locks.metrics["acquired"] == 2
+        assert locks.metrics["contended"] == 1
+        assert locks.metrics["max_wait_seconds"] >= 0.04
+        assert len(locks) == 0
+
+
+class TestPersistentSessions:
+    """Test the SQLite session backend"""
+
+    def test_session_round_trip(self):
+        """Test serializing and restoring a session"""
+        session = UserSession(session_id="grader")
+        session.classrooms = [{"id": 1, "title": "Python"}]
+        session.cloned_repos = [{"name": "repo", "path": "/tmp/repo", "full_name": "org/repo"}]
+
+        restored = session_from_dict(json.loads(json.dumps(session_to_dict(session))))
+
+        assert restored == session
+        assert isinstance(restored.created_at, datetime)
+
+    def test_backend_opens_lazily(self, tmp_path):
+        """Test that creating the backend does not touch the database"""
+        backend = SQLiteSessionBackend(tmp_path / "sessions.db")
+        SessionStore(backend=backend)
+
+        assert not (tmp_path / "sessions.db").exists()
+
+    def test_sessions_survive_restart(self, tmp_path):
+        """Test that a new store resumes a persisted session without gh calls"""
+        db_path = tmp_path / "sessions.db"
+        store = SessionStore(backend=SQLiteSessionBackend(db_path))
+        session = store.get_or_create("grader")
+        session.classrooms = [{"id": 1, "title": "Python"}]
+        session.assignments = [{"id": 7, "title": "Docker"}]
+        session.selected_assignment = {"id": 7, "title": "Docker"}
+        session.cloned_repos = [{"name": "repo", "path": "/tmp/repo", "full_name": "org/repo"}]
+        session.current_step = "selecting_student"
+        store.persist("grader")
+        store.backend.close()
+
+        restarted = SessionStore(backend=SQLiteSessionBackend(db_path))
+        resumed = restarted.get_or_create("grader")
+
+        assert resumed.current_step == "selecting_student"
+        assert resumed.cloned_repos[0]["full_name"] == "org/repo"
+        assert resumed.assignments == [{"id": 7, "title": "Docker"}]
+        assert restarted.metrics["loaded"] == 1
+
+    def test_reset_deletes_stored_session(self, tmp_path):
+        """Test that removing a session also forgets it on disk"""
+        backend = SQLiteSessionBackend(tmp_path / "sessions.db")
+        store = SessionStore(backend=backend)
+        store.get_or_create("grader").current_step = "selecting_student"
+        store.persist("grader")
+
+        del store["grader"]
+
+        assert backend.load("grader") is None
+
+    @pytest.mark.asyncio
+    async def test_reset_after_restart_deletes_stored_session(self, tmp_path, monkeypatch):
+        """Test that reset_session forgets a stored session that is not loaded"""
+        monkeypatch.setattr("exercise_checker_mcp.classroom_mcp_server.WORKSPACE_ROOT", str(tmp_path))
+        db_path = tmp_path / "sessions.db"
+        store = SessionStore(backend=SQLiteSessionBackend(db_path))
+        store.get_or_create("alice").classrooms = [{"id": 1, "title": "Python"}]
+        store.persist("alice")
+        store.backend.close()
+
+        restarted = SessionStore(backend=SQLiteSessionBackend(db_path))
+        with patch('exercise_checker_mcp.classroom_mcp_server.user_sessions', restarted):
+            await handle_reset_session("alice")
+
+        assert restarted.get_or_create("alice").classrooms == []
+        assert restarted.metrics["loaded"] == 0
+
+    def test_eviction_keeps_stored_copy(self, tmp_path):
+        """Test that an evicted session can be loaded again"""
+        store = SessionStore(max_sessions=1, backend=SQLiteSessionBackend(tmp_path / "sessions.db"))
+        store.get_or_create("first").current_step = "selecting_assignment"
+        store.persist("first")
+        store.get_or_create("second")
+
+        assert "first" not in store
+        assert store.get_or_create("first").current_step == "selecting_assignment"
+
+    def test_pending_clones_are_marked_interrupted_on_load(self, tmp_path):
+        """Test that repos left pending by a background job are not stuck after a restart"""
+        db_path = tmp_path / "sessions.db"
+        store = SessionStore(backend=SQLiteSessionBackend(db_path))
+        store.get_or_create("grader").cloned_repos = [
+            {"name": "repo", "path": "/tmp/repo", "status": "pending", "error": None}
+        ]
+        store.persist("grader")
+
+        restarted = SessionStore(backend=SQLiteSessionBackend(db_path))
+        repo = restarted.get_or_create("grader").cloned_repos[0]
+
+        assert repo["status"] == "failed"
+        assert "restart" in repo["error"]
+
+    @pytest.mark.asyncio
+    async def test_tool_calls_persist_session(self, tmp_path):
+        """Test that handle_call_tool writes the session back after each call"""
+        backend = SQLiteSessionBackend(tmp_path / "sessions.db")
+        user_sessions.clear()
+        with patch.object(user_sessions, "backend", backend):
+            await handle_call_tool("reset_session", {"session_id": "grader"})
+            get_or_create_session("grader").current_step = "selecting_assignment"
+            await handle_call_tool("select_student", {"session_id": "grader", "student_number": 1})
+
+        assert backend.load("grader")["current_step"] == "selecting_assignment"
+        user_sessions.clear()
+
+
+class TestProgressReporter:
+    """Test streaming clone progress to the client"""
+
+    def make_event(self, completed, total, status="cloned"):
+        return {
+            "completed": completed,
+            "total": total,
+            "repo": {"name": f"repo{completed}", "status": status, "error": "boom"},
+            "bytes": 2048,
+            "total_bytes": 2048 * completed,
+            "elapsed": 1.5,
+        }
+
+    @pytest.mark.asyncio
+    async def test_reporter_outside_request_only_records(self):
+        """Test that events are recorded when no client is attached"""
+        reporter = ProgressReporter()
+        await reporter(self.make_event(1, 2))
+
+        assert len(reporter.events) == 1
+
+    @pytest.mark.asyncio
+    async def test_reporter_sends_progress_and_log_notifications(self):
+        """Test that events become MCP progress and log notifications"""
+        client_session = AsyncMock()
+        context = Mock(session=client_session, meta=Mock(progressToken="tok"))
+        token = request_ctx.set(context)
+        try:
+            reporter = ProgressReporter()
+        finally:
+            request_ctx.reset(token)
+
+        await reporter(self.make_event(1, 3))
+        await reporter(self.make_event(2, 3, status="failed"))
+
+        client_session.send_progress_notification.assert_any_await("tok", 1, 3)
+        client_session.send_progress_notification.assert_any_await("tok", 2, 3)
+        messages = [call.kwargs["data"] for call in client_session.send_log_message.await_args_list]
+        assert messages[0].startswith("[1/3] repo1 cloned (2.0 KB)")
+        assert "failed: boom" in messages[1]
+
+    @pytest.mark.asyncio
+    async def test_reporter_ignores_notification_errors(self):
+        """Test that a broken client stream does not fail the clone"""
+        client_session = AsyncMock()
+        client_session.send_log_message.side_effect = RuntimeError("stream closed")
+        token = request_ctx.set(Mock(session=client_session, meta=None))
+        try:
+            reporter = ProgressReporter()
+        finally:
+            request_ctx.reset(token)
+
+        await reporter(self.make_event(1, 1))
+
+        client_session.send_progress_notification.assert_not_awaited()
+        assert len(reporter.events) == 1
+
+
 class TestToolListing:
     """Test tool listing functionality"""
     
@@ -102,21 +1020,38 @@ class TestToolListing:
             "select_classroom", 
             "select_assignment",
             "select_student",
+            "pull_request_overview",
+            "job_status",
+            "cancel_job",
+            "check_exercises",
+            "similarity_report",
+            "show_page",
+            "workspace_usage",
             "reset_session"
         ]
         
         assert all(tool in tool_names for tool in expected_tools)
-        assert len(result.tools) == 5
+        assert len(result.tools) == 12
+
+    @pytest.mark.asyncio
+    async def test_tool_input_schemas_are_valid(self):
+        """Test that every tool's input schema is itself a valid JSON Schema"""
+        jsonschema = pytest.importorskip("jsonschema")
+        result = await handle_list_tools()
+
+        for tool in result.tools:
+            jsonschema.Draft202012Validator.check_schema(tool.inputSchema)
 
 class TestWorkflowHandlers:
     """Test the workflow handler functions"""
     
     def setup_method(self):
-        """Clear user_sessions before each test"""
+        """Clear user_sessions and cached gh listings before each test"""
         user_sessions.clear()
+        gh_cache.invalidate()
     
     @pytest.mark.asyncio
-    @patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command')
+    @patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async', new_callable=AsyncMock)
     async def test_handle_start_workflow_success(self, mock_run_gh):
         """Test successful workflow start"""
         # Mock successful classroom list
@@ -138,7 +1073,7 @@ class TestWorkflowHandlers:
         assert "Java Programming 2025" in result.content[0].text
     
     @pytest.mark.asyncio
-    @patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command')
+    @patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async', new_callable=AsyncMock)
     async def test_handle_start_workflow_failure(self, mock_run_gh):
         """Test workflow start with GitHub CLI error"""
         mock_run_gh.return_value = {
@@ -154,7 +1089,7 @@ class TestWorkflowHandlers:
         assert "Not authenticated" in result.content[0].text
     
     @pytest.mark.asyncio
-    @patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command')
+    @patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async', new_callable=AsyncMock)
     async def test_handle_select_classroom_success(self, mock_run_gh):
         """Test successful classroom selection"""
         # Setup session with classrooms
@@ -196,9 +1131,11 @@ class TestWorkflowHandlers:
         assert "Invalid classroom number" in result.content[0].text
     
     @pytest.mark.asyncio
-    @patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command')
-    async def test_handle_select_assignment_success(self, mock_run_gh):
+    @patch('exercise_checker_mcp.classroom_mcp_server.run_command_async', new_callable=AsyncMock)
+    @patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async', new_callable=AsyncMock)
+    async def test_handle_select_assignment_success(self, mock_run_gh, mock_command, tmp_path, monkeypatch):
         """Test successful assignment selection and cloning"""
+        monkeypatch.chdir(tmp_path)
         # Setup session with assignments
         session = get_or_create_session("test_session")
         session.assignments = [
@@ -206,68 +1143,156 @@ class TestWorkflowHandlers:
             {"id": 101, "title": "API Exercise", "name": "api-exercise", "deadline": None}
         ]
         
-        # Mock successful cloning
+        # Mock the accepted assignment listing
         mock_run_gh.return_value = {
             "success": True,
-            "stdout": "",
+            "stdout": json.dumps([
+                {"id": 1, "repository": {"full_name": "classroom/student1-repo",
+                                         "html_url": "https://github.com/classroom/student1-repo"}},
+                {"id": 2, "repository": {"full_name": "classroom/student2-repo",
+                                         "html_url": "https://github.com/classroom/student2-repo"}}
+            ]),
             "stderr": "",
             "returncode": 0
         }
+        # Mock successful git clones
+        mock_command.return_value = {"success": True, "stdout": "", "stderr": "", "returncode": 0}
         
-        with patch('pathlib.Path.iterdir') as mock_iterdir:
-            # Mock cloned repositories
-            mock_repo1 = Mock()
-            mock_repo1.name = "student1-repo"
-            mock_repo1.is_dir.return_value = True
-            mock_repo1.absolute.return_value = Path("/tmp/student1-repo")
-            
-            mock_repo2 = Mock()
-            mock_repo2.name = "student2-repo"
-            mock_repo2.is_dir.return_value = True
-            mock_repo2.absolute.return_value = Path("/tmp/student2-repo")
-            
-            mock_iterdir.return_value = [mock_repo1, mock_repo2]
-            
-            result = await handle_select_assignment(1, "test_session")
+        result = await handle_select_assignment(1, "test_session")
         
         assert result.content[0].text is not None
         assert "Selected Assignment: Docker Exercise" in result.content[0].text
-        assert "Successfully cloned" in result.content[0].text
+        assert "Successfully cloned 2 of 2" in result.content[0].text
         assert session.selected_assignment["id"] == 789
         assert len(session.cloned_repos) == 2
+        assert session.cloned_repos[0]["full_name"] == "classroom/student1-repo"
+        assert session.clone_profile == "full"
+        clone_calls = [call for call in mock_command.await_args_list if call.args[0][1] == "clone"]
+        assert len(clone_calls) == 2
+        workspace = tmp_path / "classroom_workspace" / "test_session" / "789"
+        assert session.workspace == str(workspace)
+        assert session.cloned_repos[0]["path"] == str(workspace / "student1-repo")
+        assert (workspace / "manifest.json").exists()
+
+    @pytest.mark.asyncio
+    @patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async', new_callable=AsyncMock)
+    async def test_handle_select_assignment_falls_back_to_manifest(self, mock_run_gh, tmp_path, monkeypatch):
+        """Test that a failed listing reuses the repositories recorded in the workspace manifest"""
+        monkeypatch.chdir(tmp_path)
+        session = get_or_create_session("test_session")
+        session.assignments = [{"id": 789, "title": "Docker Exercise", "name": "docker-exercise", "deadline": None}]
+        workspace = assignment_workspace("test_session", 789)
+        save_sync_manifest(sync_manifest_path(workspace), {"repos": {
+            "student1-repo": {"full_name": "classroom/student1-repo", "sha": "abc123"},
+        }})
+        mock_run_gh.return_value = {"success": False, "stdout": "", "stderr": "network down", "returncode": 1}
+
+        result = await handle_select_assignment(1, "test_session")
+
+        assert "network down" in result.content[0].text
+        assert "1. student1-repo" in result.content[0].text
+        assert session.cloned_repos[0]["path"] == str(workspace / "student1-repo")
+        assert session.repo_index == {"student1-repo": 0}
+        assert session.current_step == "selecting_student"
+
+    def test_assignment_workspace_is_scoped_per_session(self, tmp_path, monkeypatch):
+        """Test that sessions get separate workspaces that stay under the root"""
+        monkeypatch.setattr("exercise_checker_mcp.classroom_mcp_server.WORKSPACE_ROOT", str(tmp_path))
+
+        first = assignment_workspace("session-a", 789)
+        second = assignment_workspace("session-b", 789)
+        hostile = assignment_workspace("../../etc", "1/2")
+
+        assert first != second
+        assert first == tmp_path / "session-a" / "789"
+        assert hostile.parent.parent == tmp_path
+
+    def test_assignment_workspace_keeps_similar_session_ids_apart(self, tmp_path, monkeypatch):
+        """Test that session ids sanitized to the same name still get separate workspaces"""
+        monkeypatch.setattr("exercise_checker_mcp.classroom_mcp_server.WORKSPACE_ROOT", str(tmp_path))
+
+        spaced = assignment_workspace("grader 1", 789)
+        underscored = assignment_workspace("grader_1", 789)
+
+        assert spaced != underscored
+        assert underscored == tmp_path / "grader_1" / "789"
+        assert spaced.parent.name.startswith("grader_1-")
+        assert assignment_workspace("grader 1", 789) == spaced
+    
+    @pytest.mark.asyncio
+    @patch('exercise_checker_mcp.classroom_mcp_server.run_command_async', new_callable=AsyncMock)
+    @patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async', new_callable=AsyncMock)
+    async def test_handle_select_assignment_partial_failure(self, mock_run_gh, mock_command, tmp_path, monkeypatch):
+        """Test that one failed clone does not fail the whole assignment"""
+        monkeypatch.chdir(tmp_path)
+        session = get_or_create_session("test_session")
+        session.assignments = [
+            {"id": 789, "title": "Docker Exercise", "name": "docker-exercise", "deadline": "2024-01-15"}
+        ]
+        mock_run_gh.return_value = {
+            "success": True,
+            "stdout": json.dumps([
+                {"repository": {"full_name": "classroom/good-repo"}},
+                {"repository": {"full_name": "classroom/bad-repo"}}
+            ]),
+            "stderr": "",
+            "returncode": 0
+        }
+
+        async def fake_clone(cmd, **kwargs):
+            if "bad-repo" in cmd[-1]:
+                return {"success": False, "stdout": "", "stderr": "repository not found", "returncode": 128}
+            return {"success": True, "stdout": "", "stderr": "", "returncode": 0}
+
+        mock_command.side_effect = fake_clone
+
+        result = await handle_select_assignment(
+            1, "test_session", CloneOptions(retries=1, retry_delay=0.01)
+        )
+
+        assert "Successfully cloned 1 of 2" in result.content[0].text
+        assert "Clone failed: repository not found" in result.content[0].text
+        statuses = {repo["name"]: repo["status"] for repo in session.cloned_repos}
+        assert statuses == {"bad-repo": "failed", "good-repo": "cloned"}
+        assert session.cloned_repos[0]["attempts"] == 2
     
     @pytest.mark.asyncio
-    async def test_handle_select_student_success(self):
+    async def test_handle_select_student_success(self, tmp_path):
         """Test successful student selection"""
-        # Setup session with cloned repos
+        # Setup session with cloned repos whose origin is only recorded in .git/config
+        for name in ("student1-repo", "student2-repo"):
+            (tmp_path / name / ".git").mkdir(parents=True)
+            (tmp_path / name / ".git" / "config").write_text(
+                "[core]\n\tbare = false\n"
+                f'[remote "origin"]\n\turl = git@github.com:classroom/{name}.git\n'
+                "\tfetch = +refs/heads/*:refs/remotes/origin/*\n"
+            )
         session = get_or_create_session("test_session")
         session.cloned_repos = [
-            {"name": "student1-repo", "path": "/tmp/student1-repo"},
-            {"name": "student2-repo", "path": "/tmp/student2-repo"}
+            {"name": "student1-repo", "path": str(tmp_path / "student1-repo")},
+            {"name": "student2-repo", "path": str(tmp_path / "student2-repo")}
         ]
         
-        with patch('pathlib.Path.exists', return_value=True), \
-             patch('subprocess.run') as mock_subprocess:
+        with patch('exercise_checker_mcp.classroom_mcp_server.run_command_async',
+                   new_callable=AsyncMock) as mock_command:
             
-            # Mock git remote command
-            mock_result = Mock()
-            mock_result.returncode = 0
-            mock_result.stdout = "git@github.com:classroom/student1-repo.git"
-            mock_subprocess.return_value = mock_result
-            
-            # Mock GitHub CLI PR list
-            with patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command') as mock_gh:
+            # Mock GitHub GraphQL PR query
+            with patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async',
+                       new_callable=AsyncMock) as mock_gh:
                 mock_gh.return_value = {
                     "success": True,
-                    "stdout": json.dumps([
-                        {
-                            "number": 1,
-                            "title": "Add Docker support",
-                            "author": {"login": "student1"},
-                            "state": "open",
-                            "createdAt": "2024-01-10T10:00:00Z"
-                        }
-                    ]),
+                    "stdout": json.dumps({"data": {"r0": {"pullRequests": {
+                        "pageInfo": {"hasNextPage": False, "endCursor": None},
+                        "nodes": [
+                            {
+                                "number": 1,
+                                "title": "Add Docker support",
+                                "author": {"login": "student1"},
+                                "state": "OPEN",
+                                "createdAt": "2024-01-10T10:00:00Z"
+                            }
+                        ]
+                    }}}}),
                     "stderr": "",
                     "returncode": 0
                 }
@@ -277,6 +1302,36 @@ class TestWorkflowHandlers:
         assert result.content[0].text is not None
         assert "Selected Student: student1-repo" in result.content[0].text
         assert "Pull Requests" in result.content[0].text
+        assert 'owner: "classroom", name: "student1-repo"' in mock_gh.await_args.args[0][-1]
+        mock_command.assert_not_awaited()
+    
+    @pytest.mark.asyncio
+    @patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async', new_callable=AsyncMock)
+    async def test_handle_select_student_by_name(self, mock_run_gh, tmp_path):
+        """Test selecting a student through the repository name index"""
+        (tmp_path / "student2-repo").mkdir()
+        session = get_or_create_session("test_session")
+        session.cloned_repos = [
+            {"name": "student1-repo", "path": str(tmp_path / "student1-repo"), "full_name": "classroom/student1-repo"},
+            {"name": "student2-repo", "path": str(tmp_path / "student2-repo"), "full_name": "classroom/student2-repo"}
+        ]
+        index_cloned_repos(session)
+        mock_run_gh.return_value = {
+            "success": True,
+            "stdout": json.dumps({"data": {"r0": {"pullRequests": {
+                "pageInfo": {"hasNextPage": False, "endCursor": None}, "nodes": []
+            }}}}),
+            "stderr": "",
+            "returncode": 0
+        }
+
+        result = await handle_select_student(None, "test_session", "student2-repo")
+        missing = await handle_select_student(None, "test_session", "nobody-repo")
+
+        assert session.repo_index == {"student1-repo": 0, "student2-repo": 1}
+        assert "Selected Student: student2-repo" in result.content[0].text
+        assert "No pull requests found" in result.content[0].text
+        assert "Unknown student repository: nobody-repo" in missing.content[0].text
     
     @pytest.mark.asyncio
     async def test_handle_reset_session(self):
@@ -293,12 +1348,1156 @@ class TestWorkflowHandlers:
         assert "Session reset successfully" in result.content[0].text
         assert "test_session" not in user_sessions
 
+def fake_graphql(prs_by_repo, page_size, calls=None):
+    """Build a fake `gh api graphql` that serves PRs per aliased repository"""
+    alias_pattern = re.compile(
+        r'(r\d+): repository\(owner: "([^"]+)", name: "([^"]+)"\) \{ pullRequests\(([^)]*)\)'
+    )
+
+    async def run(args, **kwargs):
+        query = args[-1][len("query="):]
+        if calls is not None:
+            calls.append(query)
+        data = {}
+        errors = []
+        for alias, owner, name, arguments in alias_pattern.findall(query):
+            full_name = f"{owner}/{name}"
+            if full_name not in prs_by_repo:
+                data[alias] = None
+                errors.append({"path": [alias], "message": f"Could not resolve to a Repository with the name '{full_name}'."})
+                continue
+            cursor = re.search(r'after: "(\d+)"', arguments)
+            start = int(cursor.group(1)) if cursor else 0
+            nodes = prs_by_repo[full_name][start:start + page_size]
+            has_next = start + page_size < len(prs_by_repo[full_name])
+            data[alias] = {"pullRequests": {
+                "pageInfo": {"hasNextPage": has_next, "endCursor": str(start + page_size) if has_next else None},
+                "nodes": nodes,
+            }}
+        payload = {"data": data}
+        if errors:
+            payload["errors"] = errors
+        return {"success": not errors, "stdout": json.dumps(payload), "stderr": "", "returncode": 1 if errors else 0}
+
+    return run
+
+
+def make_pr(number, state="OPEN", created="2024-01-10T10:00:00Z"):
+    """Build a pull request node as GraphQL returns it"""
+    return {"number": number, "title": f"PR {number}", "author": {"login": "student"},
+            "state": state, "createdAt": created}
+
+
+class TestPagination:
+    """Test paged, size-bounded listings"""
+
+    def setup_method(self):
+        """Clear user_sessions and cached gh listings before each test"""
+        user_sessions.clear()
+        gh_cache.invalidate()
+
+    def test_render_page_keeps_numbers_and_tracks_offset(self):
+        """Test that a page keeps listing numbers and records where it ended"""
+        session = get_or_create_session("grader")
+        records = [f"item{i}" for i in range(1, 8)]
+
+        text = render_page(session, "students", records, lambda n, r: f"{n}. {r}\n", offset=3, page_size=3)
+
+        assert text.startswith("4. item4\n5. item5\n6. item6\n")
+        assert "Showing 4-6 of 7" in text
+        assert session.pages["students"] == {"offset": 6, "page_size": 3}
+
+    def test_render_page_stops_at_byte_budget(self):
+        """Test that a page is cut short once the byte budget is spent"""
+        session = get_or_create_session("grader")
+        records = ["x" * 40 for _ in range(10)]
+
+        text = render_page(session, "students", records, lambda n, r: f"{n}. {r}\n", page_size=10, budget=100)
+
+        assert text.count("x" * 40) == 2
+        assert "Showing 1-2 of 10" in text
+        assert session.pages["students"]["offset"] == 2
+
+    def test_json_page_stops_at_byte_budget(self):
+        """Test that a JSON page is cut short like a text page and says where to resume"""
+        session = get_or_create_session("grader")
+        records = [{"name": "x" * 40} for _ in range(10)]
+
+        data = json_page(session, "students", records, page_size=10, budget=130)
+
+        assert [record["number"] for record in data["students"]] == [1, 2]
+        assert data["next_offset"] == 2
+        assert session.pages["students"]["offset"] == 2
+        assert json_page(session, "students", records, offset=8, page_size=10)["next_offset"] is None
+
+    @pytest.mark.asyncio
+    @patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async', new_callable=AsyncMock)
+    async def test_show_page_continues_classroom_listing(self, mock_run_gh):
+        """Test paging through classrooms without asking gh again"""
+        mock_run_gh.return_value = {
+            "success": True,
+            "stdout": json.dumps([{"id": i, "name": f"c{i}", "title": f"Classroom {i}"} for i in range(1, 6)]),
+            "stderr": "",
+            "returncode": 0,
+        }
+
+        first = await handle_start_workflow("grader", page_size=2)
+        second = await handle_show_page("classrooms", "grader")
+        last = await handle_show_page("classrooms", "grader", page=3)
+
+        assert "2. Classroom 2" in first.content[0].text
+        assert "3. Classroom 3" not in first.content[0].text
+        assert "3. Classroom 3 (ID: 3)\n4. Classroom 4 (ID: 4)" in second.content[0].text
+        assert "5. Classroom 5" in last.content[0].text
+        assert "for the next page" not in last.content[0].text
+        assert mock_run_gh.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_pull_request_overview_fetches_only_the_page(self):
+        """Test that the overview queries only the repositories on the requested page"""
+        session = get_or_create_session("grader")
+        session.cloned_repos = [
+            {"name": f"student{i}-repo", "path": f"/tmp/student{i}-repo", "full_name": f"org/student{i}-repo",
+             "status": "cloned"}
+            for i in range(1, 6)
+        ]
+
+        with patch('exercise_checker_mcp.classroom_mcp_server.fetch_pull_requests',
+                   new_callable=AsyncMock) as mock_fetch:
+            mock_fetch.return_value = {"org/student3-repo": {"prs": []}, "org/student4-repo": {"prs": []}}
+            result = await handle_pull_request_overview("grader", page=2, page_size=2)
+
+        assert mock_fetch.await_args.args[0] == ["org/student3-repo", "org/student4-repo"]
+        assert "  3  student3-repo" in result.content[0].text
+        assert "Showing 3-4 of 5" in result.content[0].text
+
+
+class TestJsonOutput:
+    """Test the compact JSON output mode of the workflow tools"""
+
+    def setup_method(self):
+        """Clear user_sessions and cached gh listings before each test"""
+        user_sessions.clear()
+        gh_cache.invalidate()
+
+    @pytest.mark.asyncio
+    @patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async', new_callable=AsyncMock)
+    async def test_start_workflow_json(self, mock_run_gh):
+        """Test that classrooms come back as numbered records"""
+        mock_run_gh.return_value = {
+            "success": True,
+            "stdout": json.dumps([{"id": 123, "name": "python-2025", "title": "Python 2025"},
+                                  {"id": 456, "name": "java-2025", "title": "Java 2025"}]),
+            "stderr": "",
+            "returncode": 0,
+        }
+
+        result = await handle_start_workflow("grader", output_format="json")
+
+        text = result.content[0].text
+        assert " " not in text.replace("Python 2025", "").replace("Java 2025", "")
+        assert json.loads(text) == {
+            "page": 1, "pages": 1, "total": 2, "next_offset": None,
+            "classrooms": [
+                {"id": 123, "name": "python-2025", "title": "Python 2025", "number": 1},
+                {"id": 456, "name": "java-2025", "title": "Java 2025", "number": 2},
+            ],
+        }
+
+    @pytest.mark.asyncio
+    @patch('exercise_checker_mcp.classroom_mcp_server.run_command_async', new_callable=AsyncMock)
+    @patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async', new_callable=AsyncMock)
+    async def test_select_assignment_json(self, mock_run_gh, mock_command, tmp_path, monkeypatch):
+        """Test that cloned repositories come back as records with status counts"""
+        monkeypatch.chdir(tmp_path)
+        session = get_or_create_session("grader")
+        session.assignments = [{"id": 789, "title": "Docker Exercise", "name": "docker-exercise", "deadline": None}]
+        mock_run_gh.return_value = {
+            "success": True,
+            "stdout": json.dumps([{"repository": {"full_name": "classroom/student1-repo"}}]),
+            "stderr": "",
+            "returncode": 0,
+        }
+        mock_command.return_value = {"success": True, "stdout": "abc123\n", "stderr": "", "returncode": 0}
+
+        result = await handle_select_assignment(1, "grader", output_format="json")
+
+        data = json.loads(result.content[0].text)
+        assert data["assignment"]["id"] == 789
+        assert data["statuses"] == {"cloned": 1}
+        assert data["students"][0]["number"] == 1
+        assert data["students"][0]["full_name"] == "classroom/student1-repo"
+        assert data["students"][0]["sha"] == "abc123"
+
+    @pytest.mark.asyncio
+    async def test_select_student_json(self, tmp_path):
+        """Test that a student's pull requests come back as raw records"""
+        session = get_or_create_session("grader")
+        session.cloned_repos = [{"name": "student1-repo", "path": str(tmp_path),
+                                 "full_name": "classroom/student1-repo", "status": "cloned"}]
+        pr = {"number": 1, "title": "Add Docker support", "author": {"login": "student1"},
+              "state": "OPEN", "createdAt": "2024-01-10T10:00:00Z"}
+
+        with patch('exercise_checker_mcp.classroom_mcp_server.fetch_pull_requests',
+                   new_callable=AsyncMock) as mock_fetch:
+            mock_fetch.return_value = {"classroom/student1-repo": {"prs": [pr]}}
+            result = await handle_select_student(1, "grader", output_format="json")
+
+        data = json.loads(result.content[0].text)
+        assert data["student"]["number"] == 1
+        assert data["student"]["full_name"] == "classroom/student1-repo"
+        assert data["pull_requests"] == [pr]
+        assert data["error"] is None
+        assert data["check"] is None
+
+
+class TestPullRequestOverview:
+    """Test the batch pull request overview"""
+
+    def setup_method(self):
+        """Clear user_sessions before each test"""
+        user_sessions.clear()
+
+    def test_parse_github_repo_full_name(self):
+        """Test parsing SSH and HTTPS remotes"""
+        assert parse_github_repo_full_name("git@github.com:org/repo.git") == "org/repo"
+        assert parse_github_repo_full_name("https://github.com/org/repo.git") == "org/repo"
+        assert parse_github_repo_full_name("https://github.com/org/repo") == "org/repo"
+        assert parse_github_repo_full_name("https://gitlab.com/org/repo.git") is None
+
+    def test_read_origin_url_from_git_config(self, tmp_path):
+        """Test reading the origin remote without spawning git"""
+        repo = tmp_path / "repo"
+        (repo / ".git").mkdir(parents=True)
+        (repo / ".git" / "config").write_text(
+            '[remote "upstream"]\n\turl = https://github.com/template/repo.git\n'
+            '[remote "origin"]\n\turl = https://github.com/classroom/repo.git\n'
+        )
+        worktree = tmp_path / "worktree"
+        worktree.mkdir()
+        (worktree / ".git").write_text(f"gitdir: {repo / '.git'}\n")
+
+        assert read_origin_url(repo) == "https://github.com/classroom/repo.git"
+        assert read_origin_url(worktree) == "https://github.com/classroom/repo.git"
+        assert read_origin_url(tmp_path / "missing") is None
+
+    @pytest.mark.asyncio
+    async def test_origin_url_matches_git(self, tmp_path):
+        """Test that the .git/config reader agrees with git itself"""
+        repo = make_git_repo(tmp_path / "repo")
+        subprocess.run(
+            ["git", "remote", "add", "origin", "git@github.com:classroom/repo.git"],
+            cwd=repo, check=True,
+        )
+
+        assert read_origin_url(repo) == "git@github.com:classroom/repo.git"
+
+    def test_summarize_pull_requests(self):
+        """Test counting pull requests by state"""
+        summary = summarize_pull_requests([
+            {"number": 1, "state": "OPEN", "createdAt": "2024-01-10T10:00:00Z"},
+            {"number": 2, "state": "MERGED", "createdAt": "2024-01-12T10:00:00Z"},
+            {"number": 3, "state": "CLOSED", "createdAt": "2024-01-11T10:00:00Z"},
+        ])
+
+        assert summary == {"open": 1, "merged": 1, "closed": 1, "latest": "2024-01-12T10:00:00Z"}
+        assert summarize_pull_requests([])["latest"] is None
+
+    @pytest.mark.asyncio
+    async def test_overview_batches_repos_into_graphql_queries(self):
+        """Test that the overview covers every repo with a few batched queries"""
+        session = get_or_create_session("test_session")
+        session.cloned_repos = [
+            {"name": f"student{i}-repo", "path": f"/tmp/student{i}-repo",
+             "full_name": f"classroom/student{i}-repo"}
+            for i in range(6)
+        ]
+        prs_by_repo = {
+            f"classroom/student{i}-repo": [
+                make_pr(1, "OPEN", "2024-01-10T10:00:00Z"),
+                make_pr(2, "MERGED", "2024-01-12T10:00:00Z"),
+            ]
+            for i in range(5)
+        }
+        calls = []
+
+        with patch('exercise_checker_mcp.classroom_mcp_server.GRAPHQL_REPOS_PER_QUERY', 4), \
+             patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async',
+                   side_effect=fake_graphql(prs_by_repo, page_size=100, calls=calls)):
+            result = await handle_pull_request_overview("test_session")
+
+        text = result.content[0].text
+        assert len(calls) == 2
+        assert "Pull Request Overview (6 repositories)" in text
+        assert "2024-01-12" in text
+        assert "Could not resolve to a Repository" in text
+
+    @pytest.mark.asyncio
+    async def test_overview_without_repos(self):
+        """Test the overview before an assignment is selected"""
+        result = await handle_pull_request_overview("test_session")
+
+        assert "No student repositories available" in result.content[0].text
+
+
+PYTEST_COMMAND = [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider"]
+
+
+def make_exercise_repo(path, test_source):
+    """Create a student checkout holding one pytest file"""
+    path.mkdir(parents=True)
+    (path / "test_exercise.py").write_text(test_source)
+    return {"name": path.name, "path": str(path), "status": "cloned", "sha": "abc123"}
+
+
+class TestExerciseChecks:
+    """Test running the assignment's tests across cloned repositories"""
+
+    def setup_method(self):
+        """Clear user_sessions before each test"""
+        user_sessions.clear()
+
+    def test_parse_test_counts(self):
+        """Test reading pytest and unittest summaries"""
+        assert parse_test_counts("...\n2 failed, 3 passed, 1 error in 0.12s\n") == {
+            "passed": 3, "failed": 2, "errors": 1, "skipped": 0}
+        assert parse_test_counts("Ran 5 tests in 0.001s\n\nFAILED (failures=2, errors=1)\n") == {
+            "passed": 2, "failed": 2, "errors": 1, "skipped": 0}
+        assert parse_test_counts("Ran 3 tests in 0.001s\n\nOK\n")["passed"] == 3
+        assert parse_test_counts("command not found") is None
+
+    @pytest.mark.asyncio
+    async def test_run_exercise_checks_records_counts(self, tmp_path):
+        """Test that each repository's tests run and their outcome is captured"""
+        repos = [
+            make_exercise_repo(tmp_path / "student1-repo", "def test_a():\n    assert True\n\ndef test_b():\n    assert True\n"),
+            make_exercise_repo(tmp_path / "student2-repo", "def test_a():\n    assert True\n\ndef test_b():\n    assert False\n"),
+            {"name": "student3-repo", "path": str(tmp_path / "student3-repo"), "status": "failed"},
+        ]
+
+        results = await run_exercise_checks(repos, PYTEST_COMMAND, CheckOptions(concurrency=2, timeout=60))
+
+        assert [result["status"] for result in results] == ["passed", "failed", "skipped"]
+        assert (results[0]["passed"], results[0]["failed"]) == (2, 0)
+        assert (results[1]["passed"], results[1]["failed"]) == (1, 1)
+        assert "assert False" in results[1]["output"]
+        assert results[0]["duration"] > 0
+
+    @pytest.mark.asyncio
+    async def test_run_exercise_checks_kills_slow_runs(self, tmp_path):
+        """Test that a run exceeding its timeout is killed and reported as an error"""
+        repos = [make_exercise_repo(tmp_path / "student1-repo", "")]
+
+        results = await run_exercise_checks(
+            repos, [sys.executable, "-c", "import time; time.sleep(10)"], CheckOptions(timeout=0.5)
+        )
+
+        assert results[0]["status"] == "error"
+        assert "timed out" in results[0]["error"]
+        assert results[0]["duration"] < 5
+
+    @pytest.mark.asyncio
+    async def test_run_exercise_checks_kill_processes_left_behind(self, tmp_path):
+        """Test that a background process forked by a passing check does not outlive it"""
+        repos = [make_exercise_repo(tmp_path / "student1-repo", "")]
+        pid_file = tmp_path / "leftover.pid"
+
+        results = await run_exercise_checks(
+            repos, ["sh", "-c", f"sleep 30 & echo $! > {pid_file}; echo '1 passed'"], CheckOptions(timeout=10)
+        )
+
+        assert results[0]["status"] == "passed"
+        assert results[0]["duration"] < 5
+        pid = int(pid_file.read_text())
+        for _ in range(50):
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                break
+            await asyncio.sleep(0.05)
+        else:
+            pytest.fail("background process survived the check")
+
+    @pytest.mark.asyncio
+    async def test_handle_check_exercises_stores_results_on_session(self, tmp_path):
+        """Test that the check tool stores results that select_student then shows"""
+        session = get_or_create_session("grader")
+        session.cloned_repos = [
+            dict(make_exercise_repo(tmp_path / "student1-repo", "def test_a():\n    assert False\n"),
+                 full_name="org/student1-repo"),
+        ]
+        session.repo_index = {"student1-repo": 0}
+
+        result = await handle_check_exercises("grader", " ".join(PYTEST_COMMAND), CheckOptions(timeout=60))
+
+        assert "0 passed, ❌ 1 failed" in result.content[0].text
+        assert session.check_results["student1-repo"]["failed"] == 1
+
+        with patch('exercise_checker_mcp.classroom_mcp_server.fetch_pull_requests',
+                   new_callable=AsyncMock) as mock_fetch:
+            mock_fetch.return_value = {"org/student1-repo": {"prs": []}}
+            selected = await handle_select_student(1, "grader")
+        assert "Tests (" in selected.content[0].text
+        assert "failed, 0 passed, 1 failed" in selected.content[0].text
+
+    @pytest.mark.asyncio
+    async def test_unchanged_submissions_reuse_cached_results(self, tmp_path, monkeypatch):
+        """Test that only repositories with a new commit are tested again"""
+        monkeypatch.setattr("exercise_checker_mcp.classroom_mcp_server.WORKSPACE_ROOT", str(tmp_path / "workspace"))
+        session = get_or_create_session("grader")
+        session.selected_assignment = {"id": 789, "title": "Docker Exercise"}
+        session.cloned_repos = [
+            make_exercise_repo(tmp_path / "student1-repo", "def test_a():\n    assert True\n"),
+            make_exercise_repo(tmp_path / "student2-repo", "def test_a():\n    assert True\n"),
+        ]
+        command = " ".join(PYTEST_COMMAND)
+
+        await handle_check_exercises("grader", command, CheckOptions(timeout=60))
+        # student2 pushes a failing commit; student1's checkout is unchanged
+        (tmp_path / "student2-repo" / "test_exercise.py").write_text("def test_a():\n    assert False\n")
+        session.cloned_repos[1]["sha"] = "def456"
+
+        with patch('exercise_checker_mcp.classroom_mcp_server.run_exercise_check',
+                   wraps=run_exercise_check) as mock_check:
+            result = await handle_check_exercises("grader", command, CheckOptions(timeout=60))
+
+        assert [call.args[0]["name"] for call in mock_check.call_args_list] == ["student2-repo"]
+        assert "1 results reused" in result.content[0].text
+        assert session.check_results["student1-repo"]["status"] == "passed"
+        assert session.check_results["student2-repo"]["status"] == "failed"
+        assert (tmp_path / "workspace" / ".check_cache" / "789.json").exists()
+
+        with patch('exercise_checker_mcp.classroom_mcp_server.run_exercise_check',
+                   wraps=run_exercise_check) as mock_check:
+            await handle_check_exercises("grader", command, CheckOptions(timeout=60), refresh=True)
+        assert mock_check.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_cached_results_are_scoped_to_profile_and_limits(self, tmp_path):
+        """Test that a result is only reused under the same clone profile and limits"""
+        repos = [make_exercise_repo(tmp_path / "student1-repo", "def test_a():\n    assert True\n")]
+        cache = {}
+        await run_exercise_checks(repos, PYTEST_COMMAND, CheckOptions(timeout=60), cache=cache)
+
+        for options, profile_key in [
+            (CheckOptions(timeout=60), "sparse:src"),
+            (CheckOptions(timeout=30), "full"),
+            (CheckOptions(timeout=60, memory_mb=256), "full"),
+        ]:
+            with patch('exercise_checker_mcp.classroom_mcp_server.run_exercise_check',
+                       wraps=run_exercise_check) as mock_check:
+                await run_exercise_checks(repos, PYTEST_COMMAND, options, cache=dict(cache),
+                                          profile_key=profile_key)
+            assert mock_check.call_count == 1
+
+        with patch('exercise_checker_mcp.classroom_mcp_server.run_exercise_check',
+                   wraps=run_exercise_check) as mock_check:
+            results = await run_exercise_checks(repos, PYTEST_COMMAND, CheckOptions(timeout=60), cache=cache)
+        assert mock_check.call_count == 0
+        assert results[0]["cached"]
+
+    def test_check_suite_hash_covers_grader_test_files(self, tmp_path):
+        """Test that editing test files named by the command changes the suite hash"""
+        tests_dir = tmp_path / "grader_tests"
+        tests_dir.mkdir()
+        (tests_dir / "test_hidden.py").write_text("def test_a():\n    pass\n")
+        command = ["pytest", "-q", str(tests_dir)]
+
+        before = check_suite_hash(command)
+        (tests_dir / "test_hidden.py").write_text("def test_a():\n    assert False\n")
+
+        assert check_suite_hash(command) != before
+        assert check_suite_hash(["pytest", "-x", str(tests_dir)]) != check_suite_hash(command)
+
+
+TEMPLATE_SOURCE = """
+def load_input(path):
+    with open(path) as handle:
+        return [line.strip() for line in handle if line.strip()]
+
+
+def main():
+    rows = load_input("input.txt")
+    print(len(rows))
+"""
+
+SOLUTION_SOURCE = """
+def solve(values, target):
+    seen = {}
+    for index, value in enumerate(values):
+        if target - value in seen:
+            return seen[target - value], index
+        seen[value] = index
+    return None
+"""
+
+# The same solution with renamed identifiers, new comments and different layout
+RENAMED_SOURCE = """
+def find_pair(numbers, goal):   # my own work
+    lookup = {}
+    for position, number in enumerate(numbers):
+        if goal - number in lookup:
+            return lookup[goal - number], position
+        lookup[number] = position
+    return None
+"""
+
+OTHER_SOURCE = """
+def solve(values, target):
+    values = sorted(values)
+    low, high = 0, len(values) - 1
+    while low < high:
+        total = values[low] + values[high]
+        if total == target:
+            return low, high
+        low, high = (low + 1, high) if total < target else (low, high - 1)
+"""
+
+
+class TestSimilarity:
+    """Test the winnowing similarity index over cloned repositories"""
+
+    def setup_method(self):
+        """Clear user_sessions before each test"""
+        user_sessions.clear()
+
+    def test_fingerprints_ignore_naming_and_comments(self):
+        """Test that renaming identifiers and adding comments keeps the fingerprints"""
+        assert winnow(tokenize_source(SOLUTION_SOURCE)) == winnow(tokenize_source(RENAMED_SOURCE))
+        assert winnow(tokenize_source(SOLUTION_SOURCE)) != winnow(tokenize_source(OTHER_SOURCE))
+        assert winnow(tokenize_source("x = 1")) == set()
+
+    def test_find_similar_pairs_ignores_common_fingerprints(self):
+        """Test that fingerprints shared by most of the class are not counted"""
+        fingerprints = {
+            "a": {1, 2, 3, 10, 11},
+            "b": {1, 2, 3, 10, 11, 12},
+            "c": {1, 2, 3, 20},
+            "d": {1, 2, 3, 30},
+            "e": {1, 2, 3, 20},
+        }
+
+        pairs = find_similar_pairs(fingerprints, top_k=5)
+
+        assert [(pair["first"], pair["second"], pair["shared"]) for pair in pairs] == [
+            ("a", "b", 2), ("c", "e", 1)]
+        assert pairs[0]["first_percent"] == 100.0
+        assert pairs[0]["second_percent"] == pytest.approx(200 / 3)
+
+    def test_find_similar_pairs_caps_posting_lists(self):
+        """Test that a fingerprint in many repositories adds no pairs in a large cohort"""
+        fingerprints = {f"s{i:02}": {i + 100} for i in range(40)}
+        for i in range(15):
+            fingerprints[f"s{i:02}"].add(1)
+        fingerprints["s20"].add(2)
+        fingerprints["s21"].add(2)
+
+        pairs = find_similar_pairs(fingerprints, top_k=5)
+
+        assert [(pair["first"], pair["second"]) for pair in pairs] == [("s20", "s21")]
+        assert pairs[0]["first_percent"] == 50.0
+
+    @pytest.mark.asyncio
+    async def test_similarity_report_ranks_copied_submission_first(self, tmp_path):
+        """Test that the tool reports the pair that copied each other's solution"""
+        session = get_or_create_session("grader")
+        sources = {"student1-repo": SOLUTION_SOURCE, "student2-repo": RENAMED_SOURCE, "student3-repo": OTHER_SOURCE}
+        session.cloned_repos = []
+        for name, source in sources.items():
+            (tmp_path / name / "src").mkdir(parents=True)
+            (tmp_path / name / "main.py").write_text(TEMPLATE_SOURCE)
+            (tmp_path / name / "src" / "solution.py").write_text(source)
+            (tmp_path / name / "notes.txt").write_text(SOLUTION_SOURCE)
+            session.cloned_repos.append({"name": name, "path": str(tmp_path / name), "status": "cloned"})
+
+        result = await handle_similarity_report("grader", top_k=1)
+
+        text = result.content[0].text
+        assert "3 repositories compared" in text
+        assert "  1  student1-repo  student2-repo" in text
+        assert "student3-repo" not in text
+
+
+class TestGraphQLPullRequests:
+    """Test the batched GraphQL pull request fetcher"""
+
+    def test_build_pull_request_query_aliases_repositories(self):
+        """Test that each repository gets an alias and cursors are passed on"""
+        query = build_pull_request_query(
+            [("org/alpha", None), ("org/beta", "Y3Vyc29y")], ["OPEN"]
+        )
+
+        assert 'r0: repository(owner: "org", name: "alpha")' in query
+        assert 'r1: repository(owner: "org", name: "beta")' in query
+        assert 'after: "Y3Vyc29y"' in query
+        assert "states: [OPEN]" in query
+
+    @pytest.mark.asyncio
+    async def test_fetch_pull_requests_follows_pages(self):
+        """Test that repositories with many pull requests are fetched page by page"""
+        prs_by_repo = {
+            "org/busy": [make_pr(n) for n in range(5)],
+            "org/quiet": [make_pr(1)],
+        }
+        calls = []
+
+        with patch('exercise_checker_mcp.classroom_mcp_server.GRAPHQL_PRS_PER_PAGE', 2), \
+             patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async',
+                   side_effect=fake_graphql(prs_by_repo, page_size=2, calls=calls)):
+            results = await fetch_pull_requests(["org/busy", "org/quiet"])
+
+        assert [pr["number"] for pr in results["org/busy"]["prs"]] == [0, 1, 2, 3, 4]
+        assert len(results["org/quiet"]["prs"]) == 1
+        assert results["org/quiet"]["prs"][0]["author"] == {"login": "student"}
+        assert len(calls) == 3
+
+    @pytest.mark.asyncio
+    @patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async', new_callable=AsyncMock)
+    async def test_fetch_pull_requests_reports_request_failures(self, mock_run_gh):
+        """Test that a failed request marks its repositories with the error"""
+        mock_run_gh.return_value = {"success": False, "stdout": "", "stderr": "HTTP 502", "returncode": 1}
+
+        results = await fetch_pull_requests(["org/alpha", "org/beta"])
+
+        assert results == {"org/alpha": {"error": "HTTP 502"}, "org/beta": {"error": "HTTP 502"}}
+
+
+@contextmanager
+def fake_github_server():
+    """Serve canned GitHub API responses on localhost
+
+    Yields the server; set server.routes[(method, path)] to (status, body,
+    headers). Each request is recorded in server.requests, and a request whose
+    If-None-Match matches the route's ETag header is answered 304.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def respond(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            server.requests.append({
+                "method": self.command,
+                "path": self.path,
+                "body": body,
+                "port": self.client_address[1],
+                "authorization": self.headers.get("Authorization"),
+                "if_none_match": self.headers.get("If-None-Match"),
+            })
+            status, payload, headers = server.routes.get(
+                (self.command, self.path), (404, {"message": "Not Found"}, {})
+            )
+            etag = headers.get("ETag")
+            if etag and self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = respond
+        do_POST = respond
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.routes = {}
+    server.requests = []
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class TestHTTPBackend:
+    """Test the direct GitHub API backend against a local fake server"""
+
+    @pytest.mark.asyncio
+    async def test_classroom_list_pages_over_one_connection(self):
+        """Test that listings follow pagination, keep gh's fields and reuse a connection"""
+        with fake_github_server() as server:
+            server.routes[("GET", "/classrooms?per_page=100")] = (
+                200,
+                [{"id": 1, "name": "py", "archived": False}],
+                {"Link": f'<{server.url}/classrooms?per_page=100&page=2>; rel="next"'},
+            )
+            server.routes[("GET", "/classrooms?per_page=100&page=2")] = (
+                200, [{"id": 2, "name": "js", "archived": False}], {}
+            )
+            client = GitHubHTTPClient(server.url, "secret")
+            try:
+                result = await client.run(["classroom", "list", "--json", "id,name,title"])
+                again = await client.run(["classroom", "list", "--json", "id,name,title"])
+            finally:
+                await client.aclose()
+
+        assert result["success"]
+        assert json.loads(result["stdout"]) == [
+            {"id": 1, "name": "py", "title": "py"},
+            {"id": 2, "name": "js", "title": "js"},
+        ]
+        assert again == result
+        assert len(server.requests) == 4
+        assert len({request["port"] for request in server.requests}) == 1
+        assert all(r["authorization"] == "Bearer secret" for r in server.requests)
+
+    @pytest.mark.asyncio
+    async def test_accepted_assignments_and_errors(self):
+        """Test accepted assignments parse like gh's and errors read like gh's"""
+        accepted = [{
+            "id": 7,
+            "students": [{"login": "alice"}],
+            "repository": {"full_name": "org/hw1-alice", "html_url": "https://github.com/org/hw1-alice"},
+        }]
+        limiter = GitHubRateLimiter(rate=10)
+        with fake_github_server() as server:
+            server.routes[("GET", "/assignments/5/accepted_assignments?per_page=100")] = (
+                200, accepted, {}
+            )
+            server.routes[("GET", "/assignments/6")] = (
+                404,
+                {"message": "Not Found"},
+                {"x-ratelimit-remaining": "42", "x-ratelimit-reset": "9999999999",
+                 "x-ratelimit-resource": "core"},
+            )
+            client = GitHubHTTPClient(server.url, "secret")
+            try:
+                with patch('exercise_checker_mcp.classroom_mcp_server.gh_rate_limiter', limiter):
+                    listed = await client.run([
+                        "classroom", "accepted-assignments", "--assignment-id", "5",
+                        "--json", "id,students,repository",
+                    ])
+                    missing = await client.run(["api", "assignments/6"])
+            finally:
+                await client.aclose()
+
+        assert parse_student_repos(json.loads(listed["stdout"])) == [{
+            "name": "hw1-alice",
+            "full_name": "org/hw1-alice",
+            "clone_url": "https://github.com/org/hw1-alice.git",
+        }]
+        assert not missing["success"]
+        assert missing["stderr"] == "gh: Not Found (HTTP 404)"
+        assert limiter.quota_known("core")
+
+    @pytest.mark.asyncio
+    async def test_unchanged_listing_is_revalidated_with_etag(self):
+        """Test that repeated queries are conditional and 304s are served from memory"""
+        with fake_github_server() as server:
+            server.routes[("GET", "/classrooms/1/assignments?per_page=100")] = (
+                200, [{"id": 5, "title": "HW1", "slug": "hw1"}], {"ETag": '"v1"'}
+            )
+            args = ["classroom", "list-assignments", "--classroom-id", "1", "--json", "id,title,name"]
+            client = GitHubHTTPClient(server.url, "secret")
+            try:
+                first = await client.run(args)
+                second = await client.run(args)
+                server.routes[("GET", "/classrooms/1/assignments?per_page=100")] = (
+                    200, [{"id": 6, "title": "HW2", "slug": "hw2"}], {"ETag": '"v2"'}
+                )
+                changed = await client.run(args)
+            finally:
+                await client.aclose()
+
+        assert json.loads(first["stdout"]) == [{"id": 5, "title": "HW1", "name": "hw1"}]
+        assert second == first
+        assert json.loads(changed["stdout"])[0]["id"] == 6
+        assert [r["if_none_match"] for r in server.requests] == [None, '"v1"', '"v1"']
+        assert client.metrics == {"requests": 3, "not_modified": 1}
+
+    @pytest.mark.asyncio
+    async def test_graphql_partial_errors_keep_data(self):
+        """Test that GraphQL errors fail the call but keep the partial data like gh"""
+        payload = {
+            "data": {"r0": None},
+            "errors": [{"path": ["r0"], "message": "Could not resolve to a Repository"}],
+        }
+        with fake_github_server() as server:
+            server.routes[("POST", "/graphql")] = (200, payload, {})
+            client = GitHubHTTPClient(server.url, "secret")
+            try:
+                result = await client.run(["api", "graphql", "-f", "query=query { viewer { login } }"])
+            finally:
+                await client.aclose()
+
+        assert not result["success"]
+        assert json.loads(result["stdout"]) == payload
+        assert "Could not resolve" in result["stderr"]
+        assert json.loads(server.requests[0]["body"]) == {"query": "query { viewer { login } }"}
+
+    @pytest.mark.asyncio
+    async def test_enterprise_server_graphql_endpoint(self):
+        """Test that a GHES /api/v3 root sends GraphQL to /api/graphql and REST under /api/v3"""
+        with fake_github_server() as server:
+            server.routes[("POST", "/api/graphql")] = (200, {"data": {"viewer": {"login": "me"}}}, {})
+            server.routes[("GET", "/api/v3/classrooms?per_page=100")] = (200, [], {})
+            client = GitHubHTTPClient(f"{server.url}/api/v3/", "secret")
+            try:
+                result = await client.run(["api", "graphql", "-f", "query=query { viewer { login } }"])
+                listing = await client.run(["classroom", "list", "--json", "id,name"])
+            finally:
+                await client.aclose()
+
+        assert result["success"]
+        assert listing["success"]
+        assert [r["path"] for r in server.requests] == ["/api/graphql", "/api/v3/classrooms?per_page=100"]
+
+    @pytest.mark.asyncio
+    async def test_backend_serves_known_commands_and_falls_back_to_gh(self, monkeypatch):
+        """Test that the http backend answers gh queries and leaves others to gh"""
+        monkeypatch.setenv("GH_TOKEN", "secret")
+        monkeypatch.setattr("exercise_checker_mcp.classroom_mcp_server.GH_BACKEND", "http")
+        with fake_github_server() as server:
+            monkeypatch.setattr("exercise_checker_mcp.classroom_mcp_server.GH_API_URL", server.url)
+            server.routes[("GET", "/classrooms?per_page=100")] = (200, [], {})
+            try:
+                with patch('exercise_checker_mcp.classroom_mcp_server.run_command_async',
+                           new_callable=AsyncMock) as mock_run:
+                    mock_run.return_value = {"success": True, "stdout": "ok", "stderr": "", "returncode": 0}
+                    listed = await run_gh_command_async(["classroom", "list", "--json", "id,name,title"])
+                    other = await run_gh_command_async(["repo", "view", "org/repo"])
+            finally:
+                await close_gh_http_client()
+
+        assert listed["stdout"] == "[]"
+        assert other["stdout"] == "ok"
+        mock_run.assert_awaited_once()
+        assert mock_run.call_args[0][0] == ["gh", "repo", "view", "org/repo"]
+
+
+class TestPrefetch:
+    """Test speculative fetching of the next workflow step's data"""
+
+    def setup_method(self):
+        user_sessions.clear()
+        gh_cache.invalidate()
+        pr_prefetch_cache.invalidate()
+
+    @pytest.mark.asyncio
+    async def test_listing_classrooms_prefetches_assignments(self, monkeypatch):
+        """Test that selecting a classroom reuses the prefetched assignment listing"""
+        monkeypatch.setattr("exercise_checker_mcp.classroom_mcp_server.PREFETCH_ENABLED", True)
+        classrooms = [{"id": 1, "name": "py", "title": "Python"}, {"id": 2, "name": "js", "title": "JS"}]
+        assignments = [{"id": 5, "title": "HW1", "name": "hw1", "deadline": None}]
+        calls = []
+
+        async def fake_gh(args, **kwargs):
+            calls.append(args[:4])
+            await asyncio.sleep(0.01)
+            payload = classrooms if args[1] == "list" else assignments
+            return {"success": True, "stdout": json.dumps(payload), "stderr": "", "returncode": 0}
+
+        with patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async',
+                   side_effect=fake_gh):
+            await handle_start_workflow("grader")
+            result = await handle_select_classroom(2, "grader")
+
+        assert "HW1" in result.content[0].text
+        # Each classroom's assignments are listed once; the selection joins
+        # the prefetch of its listing rather than repeating it
+        assert sorted(calls[1:]) == [
+            ["classroom", "list-assignments", "--classroom-id", "1"],
+            ["classroom", "list-assignments", "--classroom-id", "2"],
+        ]
+
+    @pytest.mark.asyncio
+    async def test_interactive_call_does_not_wait_on_bulk_prefetch(self):
+        """Test that joining a bulk prefetch re-issues the query at interactive priority"""
+        release_bulk = asyncio.Event()
+        priorities = []
+
+        async def fake_gh(args, priority="interactive", **kwargs):
+            priorities.append(priority)
+            if priority == "bulk":
+                await release_bulk.wait()
+            return {"success": True, "stdout": "[]", "stderr": "", "returncode": 0}
+
+        args = ["classroom", "list-assignments", "--classroom-id", "1", "--json", "id,title,name,deadline"]
+        with patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async',
+                   side_effect=fake_gh):
+            prefetch = asyncio.ensure_future(run_gh_command_cached(args, priority="bulk"))
+            await asyncio.sleep(0)
+            result = await asyncio.wait_for(run_gh_command_cached(args), timeout=1)
+            assert result["success"]
+            assert not prefetch.done()
+            release_bulk.set()
+            await prefetch
+
+        assert priorities == ["bulk", "interactive"]
+
+    @pytest.mark.asyncio
+    async def test_select_student_uses_prefetched_pull_requests_once(self, tmp_path):
+        """Test that prefetched open pull requests answer the next selection only"""
+        session = get_or_create_session("grader")
+        session.cloned_repos = [{"name": "student1-repo", "path": str(tmp_path),
+                                 "full_name": "classroom/student1-repo", "status": "cloned"}]
+        prs = {"classroom/student1-repo": [make_pr(1)]}
+
+        with patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async',
+                   side_effect=fake_graphql(prs, page_size=100)) as mock_run_gh:
+            await prefetch_pull_requests(["classroom/student1-repo"])
+            assert mock_run_gh.call_args[1]["priority"] == "bulk"
+            first = await handle_select_student(1, "grader")
+            assert mock_run_gh.call_count == 1
+            await handle_select_student(1, "grader")
+
+        assert "PR 1" in first.content[0].text
+        assert mock_run_gh.call_count == 2
+
+
+class TestBackgroundJobs:
+    """Test cloning in background jobs"""
+
+    def setup_method(self):
+        """Clear user_sessions before each test"""
+        user_sessions.clear()
+
+    def listing(self, names):
+        return {
+            "success": True,
+            "stdout": json.dumps([{"repository": {"full_name": f"classroom/{name}"}} for name in names]),
+            "stderr": "",
+            "returncode": 0
+        }
+
+    @pytest.mark.asyncio
+    async def test_background_clone_reports_partial_results(self, tmp_path, monkeypatch):
+        """Test that finished repos are usable while the rest are still cloning"""
+        monkeypatch.chdir(tmp_path)
+        session = get_or_create_session("test_session")
+        session.assignments = [{"id": 789, "title": "Docker Exercise", "name": "docker-exercise"}]
+        release_slow = asyncio.Event()
+
+        async def fake_git(cmd, **kwargs):
+            if cmd[1] == "clone":
+                if "slow-repo" in cmd[-1]:
+                    await release_slow.wait()
+                Path(cmd[-1], ".git").mkdir(parents=True)
+            return {"success": True, "stdout": "abc\n", "stderr": "", "returncode": 0}
+
+        with patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async',
+                   new_callable=AsyncMock, return_value=self.listing(["fast-repo", "slow-repo"])), \
+             patch('exercise_checker_mcp.classroom_mcp_server.run_command_async', side_effect=fake_git):
+            result = await handle_select_assignment(1, "test_session", background=True)
+            job_id = next(iter(session.jobs))
+            assert f"background job {job_id}" in result.content[0].text
+
+            for _ in range(50):
+                if session.jobs[job_id].completed == 1:
+                    break
+                await asyncio.sleep(0.01)
+
+            status = await handle_job_status(job_id, "test_session")
+            assert "running" in status.content[0].text
+            assert "Progress: 1 of 2" in status.content[0].text
+            assert session.cloned_repos[0]["status"] == "cloned"
+            pending = await handle_select_student(None, "test_session", "slow-repo")
+            assert "still being cloned" in pending.content[0].text
+
+            release_slow.set()
+            await session.jobs[job_id].task
+
+        status = await handle_job_status(job_id, "test_session")
+        assert "completed" in status.content[0].text
+        assert "Successfully cloned 2 of 2" in status.content[0].text
+        assert session.current_step == "selecting_student"
+
+    @pytest.mark.asyncio
+    async def test_cancel_background_clone(self, tmp_path, monkeypatch):
+        """Test cancelling a clone job marks unfinished repos"""
+        monkeypatch.chdir(tmp_path)
+        session = get_or_create_session("test_session")
+        session.assignments = [{"id": 789, "title": "Docker Exercise", "name": "docker-exercise"}]
+
+        async def hanging_git(cmd, **kwargs):
+            await asyncio.Event().wait()
+
+        with patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async',
+                   new_callable=AsyncMock, return_value=self.listing(["stuck-repo"])), \
+             patch('exercise_checker_mcp.classroom_mcp_server.run_command_async', side_effect=hanging_git):
+            await handle_select_assignment(1, "test_session", background=True)
+            job_id = next(iter(session.jobs))
+            await asyncio.sleep(0.01)
+            result = await handle_cancel_job(job_id, "test_session")
+
+        assert "cancelled" in result.content[0].text
+        assert session.jobs[job_id].status == "cancelled"
+        assert session.cloned_repos[0]["status"] == "failed"
+        assert session.cloned_repos[0]["error"] == "clone cancelled"
+        again = await handle_cancel_job(job_id, "test_session")
+        assert "already finished" in again.content[0].text
+
+    @pytest.mark.asyncio
+    async def test_clone_job_keeps_session_to_its_assignment(self, tmp_path, monkeypatch):
+        """Test that a second clone waits for the job and a stale job leaves the session alone"""
+        monkeypatch.setattr("exercise_checker_mcp.classroom_mcp_server.WORKSPACE_ROOT", str(tmp_path))
+        session = get_or_create_session("test_session")
+        session.assignments = [{"id": 1, "title": "HW1", "name": "hw1"},
+                               {"id": 2, "title": "HW2", "name": "hw2"}]
+        release = asyncio.Event()
+
+        async def slow_git(cmd, **kwargs):
+            if cmd[1] == "clone":
+                await release.wait()
+                Path(cmd[-1], ".git").mkdir(parents=True)
+            return {"success": True, "stdout": "abc\n", "stderr": "", "returncode": 0}
+
+        with patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async',
+                   new_callable=AsyncMock, return_value=self.listing(["a1"])), \
+             patch('exercise_checker_mcp.classroom_mcp_server.run_command_async', side_effect=slow_git):
+            await handle_select_assignment(1, "test_session", background=True)
+            job = next(iter(session.jobs.values()))
+            refused = await handle_select_assignment(2, "test_session")
+            assert "still running" in refused.content[0].text
+            assert session.selected_assignment["id"] == 1
+
+            # The assignment changes under the job, e.g. from a restored session
+            session.selected_assignment = session.assignments[1]
+            session.cloned_repos = []
+            release.set()
+            await job.task
+
+        assert job.status == "completed"
+        assert "no longer the selected assignment" in job.result
+        assert session.cloned_repos == []
+        assert (assignment_workspace("test_session", 1) / "a1" / ".git").exists()
+
+    @pytest.mark.asyncio
+    async def test_job_status_lists_and_rejects_unknown_jobs(self):
+        """Test listing jobs and asking about a job that does not exist"""
+        empty = await handle_job_status(None, "test_session")
+        unknown = await handle_job_status("nope", "test_session")
+
+        assert "No background jobs" in empty.content[0].text
+        assert "Unknown job: nope" in unknown.content[0].text
+
+
+def make_workspace(root, session_id, assignment_id, size_bytes, last_used):
+    """Create an assignment workspace with a manifest recording its size and last use"""
+    workspace = root / session_id / str(assignment_id)
+    (workspace / "student1-repo").mkdir(parents=True)
+    save_sync_manifest(sync_manifest_path(workspace), {
+        "last_used": last_used,
+        "repos": {"student1-repo": {"sha": "abc123", "size_bytes": size_bytes}},
+    })
+    return workspace
+
+
+class TestWorkspaceGC:
+    """Test workspace size tracking and least-recently-used cleanup"""
+
+    def setup_method(self):
+        """Clear user_sessions before each test"""
+        user_sessions.clear()
+
+    def test_list_workspaces_orders_least_recently_used_first(self, tmp_path):
+        """Test that workspaces are described from their manifests, oldest first"""
+        make_workspace(tmp_path, "a", 1, 100, "2024-01-02T00:00:00")
+        make_workspace(tmp_path, "b", 2, 200, "2024-01-01T00:00:00")
+
+        workspaces = list_workspaces(tmp_path)
+
+        assert [(w["session"], w["assignment"], w["size_bytes"]) for w in workspaces] == [("b", "2", 200), ("a", "1", 100)]
+
+    def test_collect_garbage_evicts_until_within_quota(self, tmp_path):
+        """Test that the oldest unprotected workspaces are removed until the quota fits"""
+        oldest = make_workspace(tmp_path, "a", 1, 100, "2024-01-01T00:00:00")
+        protected = make_workspace(tmp_path, "b", 2, 100, "2024-01-02T00:00:00")
+        older = make_workspace(tmp_path, "c", 3, 100, "2024-01-03T00:00:00")
+        newest = make_workspace(tmp_path, "d", 4, 100, "2024-01-04T00:00:00")
+
+        removed = collect_workspace_garbage(200, {str(protected)}, tmp_path)
+
+        assert [w["path"] for w in removed] == [oldest, older]
+        assert not oldest.exists() and not (tmp_path / "a").exists()
+        assert protected.exists() and newest.exists()
+
+    def test_collect_garbage_counts_mirrors_and_check_cache(self, tmp_path):
+        """Test that shared caches count toward the quota and borrowed mirrors are kept"""
+        protected = make_workspace(tmp_path, "a", 1, 100, "2024-01-02T00:00:00")
+        old = make_workspace(tmp_path, "b", 2, 100, "2024-01-01T00:00:00")
+        borrowed = tmp_path / ".mirrors" / "org_template-a.git"
+        unused = tmp_path / ".mirrors" / "org_template-b.git"
+        for mirror in (borrowed, unused):
+            (mirror / "objects").mkdir(parents=True)
+            (mirror / "objects" / "pack").write_bytes(b"x" * 500)
+        info = protected / "student1-repo" / ".git" / "objects" / "info"
+        info.mkdir(parents=True)
+        (info / "alternates").write_text(f"{borrowed / 'objects'}\n")
+        cache_file = tmp_path / ".check_cache" / "2.json"
+        cache_file.parent.mkdir()
+        cache_file.write_text("{}")
+
+        removed = collect_workspace_garbage(0, {str(protected)}, tmp_path)
+
+        assert [item["kind"] for item in removed] == ["workspace", "mirror", "check_cache"]
+        assert not old.exists() and not unused.exists() and not cache_file.exists()
+        assert protected.exists() and borrowed.exists()
+
+    @pytest.mark.asyncio
+    async def test_reclaim_keeps_workspaces_of_sessions_in_a_tool_call(self, tmp_path, monkeypatch):
+        """Test that a session running a tool call under its lock keeps its workspaces"""
+        monkeypatch.setattr("exercise_checker_mcp.classroom_mcp_server.WORKSPACE_ROOT", str(tmp_path))
+        checking = make_workspace(tmp_path, "checker", 1, 1024, "2024-01-01T00:00:00")
+        idle = make_workspace(tmp_path, "idle", 1, 1024, "2024-01-02T00:00:00")
+
+        async with session_locks.hold("checker"):
+            result = await handle_workspace_usage(reclaim=True, quota_mb=0)
+
+        assert "Removed 1 least recently used workspaces" in result.content[0].text
+        assert checking.exists() and not idle.exists()
+
+    @pytest.mark.asyncio
+    async def test_workspace_usage_reports_and_reclaims(self, tmp_path, monkeypatch):
+        """Test that the workspace_usage tool reports sizes and reclaims space on request"""
+        monkeypatch.setattr("exercise_checker_mcp.classroom_mcp_server.WORKSPACE_ROOT", str(tmp_path))
+        old = make_workspace(tmp_path, "grader", 1, 3 * 1024 * 1024, "2024-01-01T00:00:00")
+        recent = make_workspace(tmp_path, "grader", 2, 1024 * 1024, "2024-01-02T00:00:00")
+
+        report = await handle_workspace_usage(quota_mb=2)
+        assert "Total: 4.0 MB of 2.0 MB quota" in report.content[0].text
+        assert old.exists()
+
+        result = await handle_workspace_usage(reclaim=True, quota_mb=2)
+        assert "Removed 1 least recently used workspaces, reclaiming 3.0 MB" in result.content[0].text
+        assert not old.exists() and recent.exists()
+
+    @pytest.mark.asyncio
+    async def test_reset_session_removes_workspace(self, tmp_path, monkeypatch):
+        """Test that resetting a session deletes its cloned repositories"""
+        monkeypatch.setattr("exercise_checker_mcp.classroom_mcp_server.WORKSPACE_ROOT", str(tmp_path))
+        get_or_create_session("grader")
+        mine = make_workspace(tmp_path, "grader", 1, 1024, "2024-01-01T00:00:00")
+        other = make_workspace(tmp_path, "other", 1, 1024, "2024-01-01T00:00:00")
+
+        result = await handle_reset_session("grader")
+
+        assert "Removed 1 assignment workspaces" in result.content[0].text
+        assert not mine.exists()
+        assert other.exists()
+
+
 class TestToolCallHandler:
     """Test the main tool call handler"""
     
     def setup_method(self):
-        """Clear user_sessions before each test"""
+        """Clear user_sessions and cached gh listings before each test"""
         user_sessions.clear()
+        gh_cache.invalidate()
     
     @pytest.mark.asyncio
     async def test_handle_call_tool_start_workflow(self):
@@ -310,7 +2509,7 @@ class TestToolCallHandler:
             
             result = await handle_call_tool("start_classroom_workflow", {"session_id": "test"})
             
-            mock_handler.assert_called_once_with("test")
+            mock_handler.assert_called_once_with("test", False, 1, 50, "text")
             assert result == mock_result
     
     @pytest.mark.asyncio
@@ -326,9 +2525,18 @@ class TestToolCallHandler:
                 "session_id": "test"
             })
             
-            mock_handler.assert_called_once_with(1, "test")
+            mock_handler.assert_called_once_with(1, "test", False, 1, 50, "text")
             assert result == mock_result
     
+    @pytest.mark.asyncio
+    async def test_handle_call_tool_rejects_unknown_format(self):
+        """Test that an unsupported output format is reported instead of dispatched"""
+        with patch('exercise_checker_mcp.classroom_mcp_server.handle_start_workflow') as mock_handler:
+            result = await handle_call_tool("start_classroom_workflow", {"format": "xml"})
+
+        mock_handler.assert_not_called()
+        assert "Unknown format 'xml'" in result.content[0].text
+
     @pytest.mark.asyncio
     async def test_handle_call_tool_unknown(self):
         """Test calling an unknown tool"""
@@ -339,13 +2547,15 @@ class TestIntegration:
     """Integration tests for the complete workflow"""
     
     def setup_method(self):
-        """Clear user_sessions before each test"""
+        """Clear user_sessions and cached gh listings before each test"""
         user_sessions.clear()
+        gh_cache.invalidate()
     
     @pytest.mark.asyncio
-    @patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command')
-    async def test_complete_workflow(self, mock_run_gh):
+    @patch('exercise_checker_mcp.classroom_mcp_server.run_gh_command_async', new_callable=AsyncMock)
+    async def test_complete_workflow(self, mock_run_gh, tmp_path, monkeypatch):
         """Test a complete workflow from start to finish"""
+        monkeypatch.chdir(tmp_path)
         # Mock all GitHub CLI calls
         mock_run_gh.side_effect = [
             # Classroom list
@@ -366,10 +2576,19 @@ class TestIntegration:
                 "stderr": "",
                 "returncode": 0
             },
-            # Clone repositories
+            # Accepted assignment listing
+            {
+                "success": True,
+                "stdout": json.dumps([
+                    {"repository": {"full_name": "classroom/student-repo"}}
+                ]),
+                "stderr": "",
+                "returncode": 0
+            },
+            # Assignment details naming the template repository
             {
                 "success": True,
-                "stdout": "",
+                "stdout": json.dumps({"id": 789, "starter_code_repository": {"full_name": "classroom/docker-template"}}),
                 "stderr": "",
                 "returncode": 0
             }
@@ -384,12 +2603,9 @@ class TestIntegration:
         assert "Selected Classroom: Python Programming 2025" in result2.content[0].text
         
         # Test assignment selection
-        with patch('pathlib.Path.iterdir') as mock_iterdir:
-            mock_repo = Mock()
-            mock_repo.name = "student-repo"
-            mock_repo.is_dir.return_value = True
-            mock_repo.absolute.return_value = Path("/tmp/student-repo")
-            mock_iterdir.return_value = [mock_repo]
+        with patch('exercise_checker_mcp.classroom_mcp_server.run_command_async',
+                   new_callable=AsyncMock) as mock_command:
+            mock_command.return_value = {"success": True, "stdout": "", "stderr": "", "returncode": 0}
             
             result3 = await handle_select_assignment(1, "test_session")
             assert "Selected Assignment: Docker Exercise" in result3.content[0].text